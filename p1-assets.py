@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""Hämtar dashboardens JavaScript-bibliotek till static/vendor, så att sidan fungerar utan CDN.
+
+    python p1-assets.py            # hämtar de bibliotek som saknas
+    python p1-assets.py --force    # hämtar om alla
+
+Versionerna står i VENDOR_ASSETS i p1-server.py. Servern lägger innehållshashen i filnamnen och
+komprimerar filerna när den startar, så inget mer behöver byggas. Starta om servern efteråt.
+"""
+import argparse, hashlib, os, sys, urllib.request
+from p1_loader import load_server
+
+def main(args):
+    srv = load_server()
+    vendor = os.path.join(srv.STATIC_DIR, "vendor")
+    os.makedirs(vendor, exist_ok=True)
+    failed = 0
+    for fn, url in srv.VENDOR_ASSETS.items():
+        path = os.path.join(vendor, fn)
+        if os.path.exists(path) and not args.force:
+            print(f"  {fn}: finns redan")
+            continue
+        try:
+            with urllib.request.urlopen(url, timeout=30) as r: body = r.read()
+        except OSError as e:
+            print(f"  {fn}: {url} gick inte att hämta ({e})", file=sys.stderr)
+            failed += 1
+            continue
+        with open(path + ".tmp", "wb") as f: f.write(body)
+        os.replace(path + ".tmp", path)  # en halvt nedladdad fil ska aldrig serveras
+        print(f"  {fn}: {len(body)} byte, sha256 {hashlib.sha256(body).hexdigest()[:16]}")
+    if failed: sys.exit(f"{failed} bibliotek saknas och laddas från CDN:en tills vidare")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Hämta dashboardens bibliotek till static/vendor")
+    ap.add_argument("--force", action="store_true", help="hämta om även de som redan finns")
+    main(ap.parse_args())
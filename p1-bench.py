@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""Benchmarks för P1 Monitor.
+
+    python p1-bench.py telegram            # tolkningstid per DSMR-telegram (fixtures/telegrams)
+    python p1-bench.py analytics --days 365  # periodstatistik: SQLite mot DuckDB (pip install duckdb)
+    python p1-bench.py generate --size year --out bench-year.db   # syntetisk databas (day, month, year, 5y eller antal dygn)
+    python p1-bench.py run --db bench-year.db --out before.json   # tidtar endpoints och insamlingsvarvet
+    python p1-bench.py compare before.json after.json
+    python p1-bench.py coldstart --db bench-year.db --runs 5   # start -> lyssnar -> redo -> första dashboardsvaret
+    python p1-bench.py ws --clients 2000 --duration 120 --pid $(pgrep -f p1-server.py)   # /ws-klienter mot en körande server
+"""
+import argparse, asyncio, base64, glob, json, os, platform, random, sqlite3, statistics, struct, subprocess, sys, tempfile, time, timeit, urllib.parse, urllib.request
+from datetime import date, datetime, timedelta, timezone
+from p1_loader import load_server
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SIZES = {"day": 1, "month": 30, "year": 365, "5y": 1826}
+
+# Typiskt svar från /api/v1/data, som jämförelse mot telegramtolkningen
+SAMPLE_JSON = json.dumps({
+    "wifi_ssid": "Hemma", "wifi_strength": 100, "smr_version": 50, "meter_model": "Sagemcom T211", "unique_id": "00112233445566778899AABBCCDDEEFF",
+    "active_tariff": 1, "total_power_import_kwh": 12345.678, "total_power_import_t1_kwh": 12345.678, "total_power_export_kwh": 0.0, "total_power_export_t1_kwh": 0.0,
+    "active_power_w": 1384, "active_power_l1_w": 282, "active_power_l2_w": 101, "active_power_l3_w": 1001,
+    "active_voltage_l1_v": 230.4, "active_voltage_l2_v": 231.2, "active_voltage_l3_v": 229.8,
+    "active_current_a": 6.2, "active_current_l1_a": 1.3, "active_current_l2_a": 0.5, "active_current_l3_a": 4.4,
+    "voltage_sag_l1_count": 1, "voltage_sag_l2_count": 1, "voltage_sag_l3_count": 1, "voltage_swell_l1_count": 0, "voltage_swell_l2_count": 0, "voltage_swell_l3_count": 0,
+    "any_power_fail_count": 4, "long_power_fail_count": 1, "total_gas_m3": None, "gas_timestamp": None, "external": [],
+})
+
+def best_us(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+def bench_telegram(args):
+    srv = load_server()
+    print(f"{'fixture':<28}{'bytes':>7}{'parse µs':>11}{'varav crc µs':>14}")
+    for path in sorted(glob.glob(os.path.join(HERE, "fixtures", "telegrams", "*.txt"))):
+        raw = open(path, "rb").read()
+        srv.parse_telegram(raw)  # kastar om fixturen är trasig
+        body = raw[raw.find(b"/"):raw.rfind(b"!") + 1]
+        parse = best_us(lambda: srv.parse_telegram(raw), args.n)
+        crc = best_us(lambda: srv.crc16(body), args.n)
+        print(f"{os.path.basename(path):<28}{len(raw):>7}{parse:>11.1f}{crc:>14.1f}")
+    js = best_us(lambda: srv.parse_json_data(json.loads(SAMPLE_JSON)), args.n)
+    print(f"{'json /api/v1/data':<28}{len(SAMPLE_JSON):>7}{js:>11.1f}{'-':>14}")
+
+def _price_day(rnd):
+    """96 kvartspriser med morgon- och kvällstopp, i serverns format ("HH:MM" -> SEK/kWh)."""
+    base = rnd.uniform(0.2, 1.2)
+    return {f"{h:02d}:{q:02d}": round(base * (1.6 if h in (7, 8, 17, 18, 19) else 0.7 if h < 6 else 1.0) + rnd.uniform(-0.05, 0.05), 4) for h in range(24) for q in (0, 15, 30, 45)}
+
+def generate_db(srv, path, days, interval=10, seed=1, end=None):
+    """Syntetisk p1.db: dygnsprofil med spikar, tre faser, monoton mätarställning, avbrott,
+    enstaka glitchar i mätarställningen och daily_prices för varje dag. Returnerar antal rader."""
+    srv.init_db(path)
+    rnd = random.Random(seed)
+    end = end or datetime.now(timezone.utc).replace(microsecond=0)
+    t, kwh, n = end - timedelta(days=days), 10000.0, 0
+    day_s = 86400 // interval
+    with sqlite3.connect(path) as conn:
+        day = t.date()
+        while day <= end.date():
+            conn.execute("INSERT OR REPLACE INTO daily_prices (date_str, json_data) VALUES (?, ?)", (day.isoformat(), json.dumps(_price_day(rnd))))
+            day += timedelta(days=1)
+        while t < end:
+            rows, outage = [], rnd.randrange(day_s) if rnd.random() < 0.3 else -1
+            outage_end = outage + rnd.randint(1, 7200) // interval  # upp till två timmar utan svar
+            for i in range(day_s):
+                t += timedelta(seconds=interval, microseconds=rnd.randrange(1000000) - t.microsecond)
+                if t >= end: break
+                if outage <= i < outage_end: continue
+                h = t.hour + t.minute / 60
+                w = 250 + 900 * (h > 17) * (h < 22) + 400 * (6 < h < 8) + (2000 if rnd.random() < 0.01 else 0) + rnd.randint(0, 300)
+                kwh += w * interval / 3.6e6
+                p1 = int(w * rnd.uniform(0.2, 0.5)); p2 = int((w - p1) * rnd.uniform(0.2, 0.6)); p3 = w - p1 - p2
+                glitch = rnd.random() < 1e-5  # mätaren svarar ibland 0 för ställningen
+                rows.append([srv.to_utc_str(t), w, 0.0 if glitch else round(kwh, 3), round(rnd.gauss(230, 1.5), 1), round(rnd.gauss(230, 1.5), 1), round(rnd.gauss(230, 1.5), 1),
+                             round(p1 / 230, 2), round(p2 / 230, 2), round(p3 / 230, 2), 0.0, 1 if 6 <= t.hour < 22 else 2, p1, p2, p3])
+            conn.executemany(srv.INSERT_SQL, rows)
+            n += len(rows)
+    return n
+
+def bench_generate(args):
+    srv = load_server()
+    days = SIZES.get(args.size, None) or int(args.size)
+    end = datetime.fromisoformat(args.end).replace(tzinfo=timezone.utc) if args.end else None
+    if os.path.exists(args.out): sys.exit(f"{args.out} finns redan")
+    t0 = time.perf_counter()
+    n = generate_db(srv, args.out, days, args.interval, args.seed, end)
+    print(f"{args.out}: {n} rader över {days} dygn på {time.perf_counter() - t0:.1f} s")
+
+class _CannedSession:
+    """Svarar som /api/v1/data utan nätverk, så att insamlingsvarvet kan tidtas isolerat."""
+    def __init__(self): self.kwh = 20000.0
+    def get(self, url, timeout=None):
+        self.kwh += 0.003
+        return self
+    def json(self): return dict(json.loads(SAMPLE_JSON), total_power_import_kwh=round(self.kwh, 3))
+
+def _timed(fn, repeat):
+    fn()  # uppvärmning
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter(); fn(); times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+    return {"median_ms": round(statistics.median(times), 3), "min_ms": round(times[0], 3), "p95_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))], 3), "n": repeat}
+
+def bench_run(args):
+    srv = load_server()
+    meter = {"id": "bench", "ip": "-", "elomrade": srv.ELOMRADE, "db": args.db, "mode": "json"}
+    srv.METERS[meter["id"]] = meter
+    srv.init_db(args.db)
+    with sqlite3.connect(args.db) as conn:
+        rows, first, last = conn.execute("SELECT COUNT(*), MIN(measured_at), MAX(measured_at) FROM p1_measurements").fetchone()
+    if not rows: sys.exit(f"{args.db} saknar mätdata")
+    last_day = date.fromisoformat(last[:10])
+    month_end = last_day.replace(day=1) - timedelta(days=1)
+    year_start = max(date.fromisoformat(first[:10]), last_day - timedelta(days=364))
+    c = srv.app.test_client()
+    def get(url):
+        def run():
+            srv._results.clear(); srv._bodies.clear()  # mät beräkningen, inte cachen
+            r = c.get(url + "&meter=bench")
+            assert r.status_code == 200, (url, r.status_code)
+            for _ in r.response: pass
+        return run
+    cases = {
+        "history_last_day": get(f"/api/history?date={last_day}"),
+        "history_month_end": get(f"/api/history?date={month_end}"),
+        "series_1h": get("/api/series?hours=1"),
+        "series_24h": get("/api/series?hours=24"),
+        "aggregate_year": get(f"/api/aggregate?from={year_start}&to={last_day}&bucket=month"),
+        "export_csv_day": get(f"/api/export.csv?from={last_day}&to={last_day}"),
+        "period_stats_month": lambda: srv.calculate_period_stats(datetime.combine(month_end.replace(day=1), datetime.min.time()), datetime.combine(month_end, datetime.min.time()), meter),
+    }
+    srv._poll_local.session = _CannedSession()
+    cases["collector_tick"] = lambda: srv.poll_meter(meter)  # sist, eftersom den skriver till filen
+    results = {}
+    for name, fn in cases.items():
+        if args.only and name not in args.only.split(","): continue
+        results[name] = _timed(fn, args.repeat)
+        print(f"{name:<22}{results[name]['median_ms']:>10.1f} ms (min {results[name]['min_ms']:.1f}, p95 {results[name]['p95_ms']:.1f})")
+    try: commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True).stdout.strip()
+    except OSError: commit = None
+    out = {"commit": commit, "python": platform.python_version(), "machine": platform.machine(), "db": {"path": args.db, "rows": rows, "first": first, "last": last}, "repeat": args.repeat, "results": results}
+    if args.out:
+        with open(args.out, "w") as f: json.dump(out, f, indent=1)
+        print(f"-> {args.out}")
+
+def bench_compare(args):
+    a, b = (json.load(open(p)) for p in (args.base, args.new))
+    print(f"{'':<22}{a['commit'] or 'base':>12}{b['commit'] or 'new':>12}{'':>8}")
+    for name in a["results"]:
+        if name not in b["results"]: continue
+        x, y = a["results"][name]["median_ms"], b["results"][name]["median_ms"]
+        print(f"{name:<22}{x:>10.1f}ms{y:>10.1f}ms{y / x if x else 0:>8.2f}x")
+
+def bench_analytics(args):
+    srv = load_server()
+    d = tempfile.mkdtemp(prefix="p1-bench-")
+    meter = {"id": "bench", "ip": "-", "elomrade": srv.ELOMRADE, "db": os.path.join(d, "bench.db"), "mode": "json"}
+    t0 = time.perf_counter()
+    n = generate_db(srv, meter["db"], args.days, args.interval)
+    print(f"{n} sampel över {args.days} dygn genererade på {time.perf_counter() - t0:.1f} s ({d})")
+    end = datetime.now(timezone.utc)
+    srv.METERS[meter["id"]] = meter
+    start = end - timedelta(days=args.days)
+    t0 = time.perf_counter(); sq = srv.calculate_period_stats(start, end, meter); t_sq = time.perf_counter() - t0
+    print(f"{'SQLite':<10}{t_sq:>9.2f} s  {sq}")
+    try:
+        duck = srv.DuckStore(meter, srv.store(meter))
+    except ImportError:
+        sys.exit("duckdb saknas (pip install duckdb)")
+    t0 = time.perf_counter(); duck.catch_up(); duck.ready = True
+    print(f"{'ikapp':<10}{time.perf_counter() - t0:>9.2f} s")
+    srv.analytics[meter["id"]] = duck
+    t0 = time.perf_counter(); du = srv.calculate_period_stats(start, end, meter); t_du = time.perf_counter() - t0
+    print(f"{'DuckDB':<10}{t_du:>9.2f} s  {du}  ({t_sq / t_du:.0f}x)")
+
+# --- WebSocket-last ---
+# Många klienter i en asyncio-loop med en minimal WebSocket-klient, så att lastverktyget självt
+# tar lite CPU på samma maskin. Fördröjningen räknas från samplets measured_at (serverns tid direkt
+# efter mätaranropet) till att ramen tagits emot, alltså insättning + utskick + nätverk.
+def _pct(xs, q): return round(xs[min(len(xs) - 1, int(len(xs) * q))], 2) if xs else None
+
+def _proc_sample(pid):
+    """(CPU-sekunder, RSS i MB) för processen, eller None om den inte finns."""
+    try:
+        with open(f"/proc/{pid}/stat") as f: fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status") as f: rss = next(int(l.split()[1]) for l in f if l.startswith("VmRSS:"))
+    except (OSError, StopIteration): return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK"), rss / 1024
+
+def _scrape(url, name):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as r: text = r.read().decode()
+    except OSError: return None
+    return sum(float(l.rsplit(" ", 1)[1]) for l in text.splitlines() if l.startswith(name + "{") or l.startswith(name + " "))
+
+def _frame_time(fmt):
+    """(opkod, ram) -> measured_at för formatet klienterna prenumererar på (?format=)."""
+    binary = None
+    if fmt == "msgpack":
+        import msgpack  # pip install msgpack, behövs bara för format=msgpack
+        binary = msgpack.unpackb
+    def at(op, data):
+        msg = json.loads(data) if op == 1 else binary(data) if binary else None
+        # array och msgpack är listor i fältordningen, där measured_at alltid ligger först.
+        # resume- och felmeddelanden är JSON-objekt i alla format
+        if isinstance(msg, list): return msg[0] if msg else None
+        return msg.get("measured_at") if isinstance(msg, dict) else None
+    return at
+
+async def _ws_client(host, port, path, client, frame_time):
+    t0 = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    key = base64.b64encode(os.urandom(16)).decode()
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n".encode())
+    head = await reader.readuntil(b"\r\n\r\n")
+    if b" 101 " not in head.split(b"\r\n", 1)[0]: raise ConnectionError(head.split(b"\r\n", 1)[0].decode())
+    client["connected"], client["connect_ms"] = time.time(), (time.perf_counter() - t0) * 1000
+    try:
+        while True:
+            b0, b1 = await reader.readexactly(2)
+            n = b1 & 0x7F
+            if n == 126: n = struct.unpack(">H", await reader.readexactly(2))[0]
+            elif n == 127: n = struct.unpack(">Q", await reader.readexactly(8))[0]
+            data = await reader.readexactly(n)
+            op = b0 & 0x0F
+            if op == 8: break
+            if op == 9:  # ping -> maskerad pong
+                mask = os.urandom(4)
+                writer.write(bytes([0x8A, 0x80 | n]) + mask + bytes(c ^ mask[i % 4] for i, c in enumerate(data)))
+            elif op in (1, 2):
+                t = time.time()
+                at = frame_time(op, data)
+                if at: client["frames"][at] = (t - datetime.fromisoformat(at.replace("Z", "+00:00")).timestamp()) * 1000
+    finally:
+        writer.close()
+
+async def _ws_load(args):
+    u = urllib.parse.urlsplit(args.url)
+    path = (u.path or "/ws") + (f"?{u.query}" if u.query else "")
+    http = f"http://{u.hostname}:{u.port or 80}"
+    frame_time = _frame_time(urllib.parse.parse_qs(u.query).get("format", ["json"])[0])
+    clients = [{"frames": {}, "connected": None, "connect_ms": None, "error": None} for _ in range(args.clients)]
+    dropped_before = _scrape(http + "/metrics", "p1_fanout_dropped_total")
+    async def run(c, delay):
+        await asyncio.sleep(delay)
+        try: await _ws_client(u.hostname, u.port or 80, path, c, frame_time)
+        except (OSError, asyncio.IncompleteReadError, ValueError) as e: c["error"] = type(e).__name__ if c["connected"] else f"anslutning: {e}"
+    tasks = [asyncio.create_task(run(c, args.ramp * i / args.clients)) for i, c in enumerate(clients)]
+    start, timeline, prev = time.time(), [], _proc_sample(args.pid) if args.pid else None
+    t_prev, seen_prev = time.time(), 0
+    while time.time() - start < args.duration:
+        await asyncio.sleep(args.report)
+        now, cur = time.time(), _proc_sample(args.pid) if args.pid else None
+        since = datetime.fromtimestamp(t_prev, timezone.utc).isoformat().replace("+00:00", "Z")
+        lat = sorted(v for c in clients for at, v in c["frames"].items() if at >= since)
+        seen = sum(len(c["frames"]) for c in clients)
+        row = {"t": round(now - start, 1), "connected": sum(1 for c in clients if c["connected"] and not c["error"]), "frames_s": round((seen - seen_prev) / (now - t_prev), 1), "p50_ms": _pct(lat, 0.5), "p99_ms": _pct(lat, 0.99)}
+        if cur and prev: row.update(cpu_pct=round((cur[0] - prev[0]) / (now - t_prev) * 100, 1), rss_mb=round(cur[1], 1))
+        timeline.append(row); prev, t_prev, seen_prev = cur, now, seen
+        print("  ".join(f"{k} {v}" for k, v in row.items()), flush=True)
+    for t in tasks: t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return clients, timeline, start, dropped_before, _scrape(http + "/metrics", "p1_fanout_dropped_total")
+
+def bench_ws(args):
+    try:  # tusentals sockets kräver fler fildeskriptorer än standardgränsen
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < args.clients + 64: resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, args.clients + 1024), hard))
+    except (ImportError, ValueError, OSError): pass
+    clients, timeline, start, d0, d1 = asyncio.run(_ws_load(args))
+    # Förväntade ramar: alla sampel som någon klient fått efter att den sista anslutit
+    ok = [c for c in clients if c["connected"]]
+    ready = datetime.fromtimestamp(max((c["connected"] for c in ok), default=start), timezone.utc).isoformat().replace("+00:00", "Z")
+    expected = set(at for c in ok for at in c["frames"] if at > ready)
+    missing = sum(len(expected - c["frames"].keys()) for c in ok)
+    lat = sorted(v for c in ok for v in c["frames"].values())
+    connect = sorted(c["connect_ms"] for c in ok)
+    res = {"clients": args.clients, "connected": len(ok), "failed": sum(1 for c in clients if not c["connected"]), "errors": sorted({c["error"] for c in clients if c["error"]}),
+           "frames": len(lat), "samples_after_ramp": len(expected), "drop_rate": round(missing / (len(expected) * len(ok)), 5) if expected and ok else None,
+           "server_dropped": d1 - d0 if d0 is not None and d1 is not None else None,
+           "latency_ms": {"p50": _pct(lat, 0.5), "p90": _pct(lat, 0.9), "p99": _pct(lat, 0.99), "p999": _pct(lat, 0.999), "max": round(lat[-1], 2) if lat else None},
+           "connect_ms": {"p50": _pct(connect, 0.5), "p99": _pct(connect, 0.99)}}
+    print(json.dumps(res, indent=1))
+    if args.out:
+        with open(args.out, "w") as f: json.dump({"url": args.url, "duration_s": args.duration, **res, "timeline": timeline}, f, indent=1)
+        print(f"-> {args.out}")
+
+def _get(url, timeout=30):
+    """(status, ms) för ett GET, status None om servern inte svarar."""
+    t0 = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as r: r.read(); status = r.status
+    except urllib.error.HTTPError as e: status = e.code
+    except OSError: return None, None
+    return status, (time.perf_counter() - t0) * 1000
+
+def _ready(base, deadline):
+    """Väntar på 200 från /readyz; False om det inte kommer före deadline (t.ex. en äldre server utan /readyz)."""
+    while _get(base + "/readyz", 1)[0] != 200:
+        if time.perf_counter() > deadline: return False
+        time.sleep(0.01)
+    return True
+
+def bench_coldstart(args):
+    """Startar p1-server.py mot databasen och mäter tiden till /healthz, /readyz och första
+    svaret för dagens dashboard (/ och /api/history). Mätaren pekar på en stängd port och
+    priserna tas ur databasen, så inget går ut på nätet."""
+    db = os.path.abspath(args.db)
+    if not os.path.exists(db): sys.exit(f"{db} finns inte")
+    base = args.url.rstrip("/")
+    if _get(base + "/healthz", 1)[0]: sys.exit(f"Något svarar redan på {base}")
+    work = tempfile.mkdtemp(prefix="p1-coldstart-")
+    with open(os.path.join(work, "meters.json"), "w") as f: json.dump([{"id": "bench", "ip": "127.0.0.1:9", "db": db}], f)
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import importlib.util as u; s = u.spec_from_file_location('p1', {os.path.join(HERE, 'p1-server.py')!r}); s.loader.exec_module(u.module_from_spec(s))"], cwd=work, check=True)
+    import_ms = (time.perf_counter() - t0) * 1000
+    runs = []
+    for i in range(args.runs):
+        t0 = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, os.path.join(HERE, "p1-server.py")], cwd=work, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        ms = lambda: round((time.perf_counter() - t0) * 1000, 1)
+        try:
+            while not _get(base + "/healthz", 1)[0]:
+                if proc.poll() is not None: sys.exit("Servern avslutades under uppstarten")
+                time.sleep(0.005)
+            run = {"listen_ms": ms()}
+            if args.wait_ready: run["ready_ms"] = _ready(base, t0 + args.timeout) and ms()
+            page = _get(base + "/")[1]
+            status, hist = _get(f"{base}/api/history?date={datetime.now(timezone.utc).date()}&meter=bench")
+            if status != 200: sys.exit(f"/api/history svarade {status}")
+            run |= {"index_ms": round(page, 1), "history_ms": round(hist, 1), "first_response_ms": ms()}
+            if not args.wait_ready: run["ready_ms"] = _ready(base, t0 + args.timeout) and ms()
+            runs.append(run)
+            print(f"[{i + 1}/{args.runs}] " + "  ".join(f"{k} {v:.0f}" if v is not False else f"{k} -" for k, v in run.items()))
+        finally:
+            proc.terminate(); proc.wait()
+        while _get(base + "/healthz", 0.2)[0]: time.sleep(0.05)
+    os.remove(os.path.join(work, "meters.json")); os.rmdir(work)
+    res = {"db": db, "import_ms": round(import_ms, 1), "wait_ready": args.wait_ready, **{k: round(statistics.median(r[k] for r in runs), 1) if all(r[k] is not False for r in runs) else None for k in runs[0]}}
+    print(json.dumps(res, indent=1))
+    if args.out:
+        with open(args.out, "w") as f: json.dump(res | {"runs": runs}, f, indent=1)
+        print(f"-> {args.out}")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmarks för P1 Monitor")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("telegram", help="tolkningstid per DSMR-telegram")
+    p.add_argument("--n", type=int, default=2000, help="antal tolkningar per mätning")
+    p.set_defaults(func=bench_telegram)
+    p = sub.add_parser("analytics", help="periodstatistik över syntetisk data, SQLite mot DuckDB")
+    p.add_argument("--days", type=int, default=365)
+    p.add_argument("--interval", type=int, default=10, help="sekunder mellan sampel")
+    p.set_defaults(func=bench_analytics)
+    p = sub.add_parser("generate", help="bygg en syntetisk p1.db")
+    p.add_argument("--size", default="month", help="day, month, year, 5y eller antal dygn")
+    p.add_argument("--out", required=True)
+    p.add_argument("--interval", type=int, default=10, help="sekunder mellan sampel")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--end", help="sista tidpunkt (UTC, ISO 8601); standard är nu")
+    p.set_defaults(func=bench_generate)
+    p = sub.add_parser("run", help="tidta endpoints och insamlingsvarvet mot en databas")
+    p.add_argument("--db", required=True)
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--only", help="kommaseparerade fall")
+    p.add_argument("--out", help="skriv resultatet som JSON")
+    p.set_defaults(func=bench_run)
+    p = sub.add_parser("compare", help="jämför två resultatfiler")
+    p.add_argument("base"); p.add_argument("new")
+    p.set_defaults(func=bench_compare)
+    p = sub.add_parser("coldstart", help="tid från start till första snabba dashboardsvaret")
+    p.add_argument("--db", required=True)
+    p.add_argument("--url", default="http://127.0.0.1:8000", help="där servern lyssnar (PORT)")
+    p.add_argument("--runs", type=int, default=3)
+    p.add_argument("--wait-ready", action="store_true", help="vänta på /readyz innan dashboarden hämtas")
+    p.add_argument("--timeout", type=float, default=120, help="sekunder att vänta på /readyz")
+    p.add_argument("--out", help="skriv resultatet som JSON")
+    p.set_defaults(func=bench_coldstart)
+    p = sub.add_parser("ws", help="många samtidiga /ws-klienter: fördröjning, tappade ramar, serverns CPU/RSS")
+    p.add_argument("--url", default="ws://127.0.0.1:8000/ws", help="med query, t.ex. ?meter=sim0&fields=active_power_w")
+    p.add_argument("--clients", type=int, default=500)
+    p.add_argument("--duration", type=float, default=60, help="sekunder")
+    p.add_argument("--ramp", type=float, default=5, help="sekunder att öppna alla anslutningar på")
+    p.add_argument("--pid", type=int, help="serverns process-id för CPU och RSS (Linux)")
+    p.add_argument("--report", type=float, default=1, help="sekunder mellan rader i tidsserien")
+    p.add_argument("--out", help="skriv resultat och tidsserie som JSON")
+    p.set_defaults(func=bench_ws)
+    args = ap.parse_args()
+    args.func(args)
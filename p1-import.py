@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Snabbimport av historik till en mätares databas.
+
+    python p1-import.py --meter hem homewizard-2025.csv legacy/p1.db
+    python p1-import.py --db p1-stuga.db --tz utc p1_stuga_*.csv
+
+Källor är CSV (exporter från HomeWizard-appen eller /api/export.csv) och SQLite-filer med
+p1_measurements, från legacy/-servrarna eller den här servern (även packade timchunkar).
+Allt läses strömmande i stora batchar till en tillfällig tabell där dubbletter försvinner,
+både inom källorna och mot det som redan finns (rådata, chunkar och nedsamplade dygn).
+Resten skrivs i tidsordning i en transaktion per fil. Index, packning (CHUNK_AFTER_DAYS) och
+gallring (RETENTION_TIERS) görs en gång efteråt. Stoppa servern under importen, annars
+får insamlingen vänta på skrivlåset.
+"""
+import argparse, csv, os, re, sqlite3, sys, tempfile, time
+from datetime import datetime, timezone
+from p1_loader import load_server
+
+BATCH = 50000
+
+# Kolumnnamn i källorna, jämförda utan versaler och andra tecken än a-z0-9. Flera källkolumner
+# till samma mål summeras (HomeWizard-appen delar upp mätarställningen per tariff).
+TIME_ALIASES = {"ts", "time", "timestamp", "measuredat", "datetime", "date", "tid", "datum"}
+ALIASES = {
+    "importt1kwh": "total_import_kwh", "importt2kwh": "total_import_kwh", "importkwh": "total_import_kwh", "totalpowerimportkwh": "total_import_kwh",
+    "exportt1kwh": "total_export_kwh", "exportt2kwh": "total_export_kwh", "exportkwh": "total_export_kwh", "totalpowerexportkwh": "total_export_kwh",
+    "powerw": "active_power_w", "activepowerw": "active_power_w", "effektw": "active_power_w",
+    "l1w": "active_power_l1_w", "l2w": "active_power_l2_w", "l3w": "active_power_l3_w",
+    "activevoltagel1v": "voltage_l1_v", "activevoltagel2v": "voltage_l2_v", "activevoltagel3v": "voltage_l3_v",
+}
+
+def _key(name): return re.sub(r"[^a-z0-9]", "", name.lower())
+
+def read_sqlite(srv, path):
+    """Batchar av (tidsstämpel, *MEASUREMENT_COLUMNS) ur p1_measurements och p1_chunks."""
+    with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as conn:
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "p1_measurements" in tables:
+            have = {r[1] for r in conn.execute("PRAGMA table_info(p1_measurements)")}
+            cur = conn.execute(f"SELECT measured_at, {', '.join(c if c in have else 'NULL' for c in srv.MEASUREMENT_COLUMNS)} FROM p1_measurements")
+            while batch := cur.fetchmany(BATCH):
+                yield [r if r[0].endswith("Z") else (srv.to_utc_str(srv.parse_utc(r[0]).replace(tzinfo=timezone.utc)),) + r[1:] for r in batch if r[0]]
+        if "p1_chunks" in tables:
+            conn.row_factory = sqlite3.Row
+            cols = ["measured_at"] + srv.MEASUREMENT_COLUMNS
+            batch = []
+            for chunk in conn.execute("SELECT * FROM p1_chunks"):
+                batch += [tuple(p[c] for c in cols) for p in srv.decode_chunk(dict(chunk), cols)]
+                if len(batch) >= BATCH: yield batch; batch = []
+            if batch: yield batch
+        if "p1_rollups" in tables and conn.execute("SELECT 1 FROM p1_rollups LIMIT 1").fetchone():
+            print(f"  {path}: nedsamplade perioder (p1_rollups) importeras inte", file=sys.stderr)
+
+def read_csv(srv, path, zone):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        head = f.read(8192); f.seek(0)
+        try: dialect = csv.Sniffer().sniff(head, delimiters=",;\t")
+        except csv.Error: dialect = csv.excel
+        rows = csv.reader(f, dialect)
+        header = [_key(h) for h in next(rows)]
+        names = {c.replace("_", ""): c for c in srv.MEASUREMENT_COLUMNS}
+        t = next((i for i, h in enumerate(header) if h in TIME_ALIASES), None)
+        targets = [(i, names.get(h) or ALIASES.get(h)) for i, h in enumerate(header) if i != t]
+        targets = [(i, c) for i, c in targets if c]
+        if t is None or not targets: raise ValueError(f"{path}: hittar ingen tidskolumn eller inga kända mätvärden i {header}")
+        pos = {c: n for n, c in enumerate(srv.MEASUREMENT_COLUMNS, 1)}
+        comma = dialect.delimiter != ","
+        batch, empty = [], [None] * (len(srv.MEASUREMENT_COLUMNS) + 1)
+        for r in rows:
+            if len(r) <= t or not r[t]: continue
+            dt = datetime.fromisoformat(r[t].strip())
+            out = empty[:]
+            out[0] = srv.to_utc_str((dt if dt.tzinfo else dt.replace(tzinfo=zone)).astimezone(timezone.utc))
+            for i, c in targets:
+                v = r[i].strip() if i < len(r) else ""
+                if v: out[pos[c]] = (out[pos[c]] or 0.0) + float(v.replace(",", ".") if comma else v)
+            batch.append(out)
+            if len(batch) >= BATCH: yield batch; batch = []
+        if batch: yield batch
+
+def is_sqlite(path):
+    with open(path, "rb") as f: return f.read(16) == b"SQLite format 3\x00"
+
+def main(args):
+    srv = load_server()
+    if args.db: meter = {"id": "import", "ip": "-", "elomrade": srv.ELOMRADE, "db": args.db, "mode": "json"}
+    elif (args.meter or srv.DEFAULT_METER) in srv.METERS: meter = srv.METERS[args.meter or srv.DEFAULT_METER]
+    else: sys.exit(f"Okänd mätare {args.meter!r}, finns: {', '.join(srv.METERS)}")
+    if args.tz == "utc": zone = timezone.utc
+    elif args.tz == "local": zone = None
+    else:
+        from zoneinfo import ZoneInfo
+        zone = ZoneInfo(args.tz)
+    cols = ["measured_at"] + srv.MEASUREMENT_COLUMNS
+    t0, read = time.perf_counter(), 0
+    tmp = tempfile.mkdtemp(prefix="p1-import-")
+    staging = os.path.join(tmp, "staging.db")
+    try:
+        with sqlite3.connect(staging) as st:
+            st.execute("PRAGMA journal_mode = OFF"); st.execute("PRAGMA synchronous = OFF")
+            st.execute(f"CREATE TABLE staging (measured_at TEXT PRIMARY KEY, {', '.join(c + ' REAL' for c in srv.MEASUREMENT_COLUMNS)}) WITHOUT ROWID")
+            insert = f"INSERT OR IGNORE INTO staging VALUES ({', '.join('?' * len(cols))})"  # första källan vinner vid samma tidsstämpel
+            for path in args.sources:
+                n = 0
+                for batch in (read_sqlite(srv, path) if is_sqlite(path) else read_csv(srv, path, zone)):
+                    st.executemany(insert, batch); n += len(batch)
+                print(f"  {path}: {n} rader")
+                read += n
+            unique = st.execute("SELECT COUNT(*) FROM staging").fetchone()[0]
+
+        # Bort med det som redan finns, i basfilen och alla månadsfiler
+        srv.init_db(meter["db"])
+        for path in srv.storage_paths(meter):
+            with srv.db_connect(path) as conn:
+                conn.execute("ATTACH DATABASE ? AS s", (staging,))
+                conn.execute("DELETE FROM s.staging WHERE measured_at IN (SELECT measured_at FROM main.p1_measurements)")
+                conn.execute("DELETE FROM s.staging WHERE substr(measured_at, 1, 13) IN (SELECT substr(hour_start, 1, 13) FROM main.p1_chunks)")
+                conn.execute("DELETE FROM s.staging WHERE substr(measured_at, 1, 10) IN (SELECT DISTINCT substr(bucket_start, 1, 10) FROM main.p1_rollups)")
+                conn.commit()
+                conn.execute("DETACH DATABASE s")
+
+        with sqlite3.connect(staging) as st:
+            first, last, new = st.execute("SELECT MIN(measured_at), MAX(measured_at), COUNT(*) FROM staging").fetchone()
+            months = [m for (m,) in st.execute("SELECT DISTINCT substr(measured_at, 1, 7) FROM staging")] if srv.PARTITION_MONTHLY else [None]
+        for month in months:
+            path = srv.write_path(meter, month) if month else meter["db"]
+            lo, hi = (month, month + "-99") if month else ("", "~")
+            with srv.db_connect(path) as conn:
+                conn.execute("PRAGMA cache_size = -200000")
+                conn.execute("ATTACH DATABASE ? AS s", (staging,))
+                n = conn.execute("SELECT COUNT(*) FROM s.staging WHERE measured_at >= ? AND measured_at < ?", (lo, hi)).fetchone()[0]
+                # Vid en stor import i en liten fil går det fortare att bygga om indexet efteråt
+                rebuild = n > conn.execute("SELECT COUNT(*) FROM p1_measurements").fetchone()[0]
+                with conn:
+                    if rebuild: conn.execute("DROP INDEX IF EXISTS idx_measured_at")
+                    conn.execute(f"INSERT INTO p1_measurements ({', '.join(cols)}) SELECT {', '.join(cols)} FROM s.staging WHERE measured_at >= ? AND measured_at < ? ORDER BY measured_at", (lo, hi))
+                    if rebuild: conn.execute("CREATE INDEX IF NOT EXISTS idx_measured_at ON p1_measurements(measured_at)")
+                conn.execute("DETACH DATABASE s")
+        if new:
+            with srv.db_connect(meter["db"]) as conn:  # sammanfattningarna för de dygnen stämmer inte längre (p1-rebuild.py)
+                conn.execute("ATTACH DATABASE ? AS s", (staging,))
+                conn.execute("DELETE FROM p1_daily WHERE day IN (SELECT DISTINCT substr(measured_at, 1, 10) FROM s.staging)")
+                conn.commit()
+                conn.execute("DETACH DATABASE s")
+    finally:
+        for f in os.listdir(tmp): os.remove(os.path.join(tmp, f))
+        os.rmdir(tmp)
+    dt = time.perf_counter() - t0
+    print(f"{read} rader lästa, {read - unique} dubbletter i källorna, {unique - new} fanns redan, {new} nya" + (f" ({first} – {last})" if new else ""))
+    print(f"{dt:.1f} s, {read / dt * 60 / 1e6:.1f} miljoner rader/min")
+    if not new: return
+    if srv.CHUNK_AFTER_DAYS: print(f"Packning: {srv.compact_old_data(meter)} timmar")
+    if srv.RETENTION_TIERS: srv.apply_retention(meter, pause=0); print("Gallring klar")
+    duck = os.path.splitext(meter["db"])[0] + ".duckdb"
+    if os.path.exists(duck):  # kopian läser bara ikapp framåt, så den byggs om vid nästa start
+        os.remove(duck); print(f"{duck} borttagen, byggs om när servern startar")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Importera historik från CSV och äldre databaser")
+    ap.add_argument("sources", nargs="+", help="CSV- eller SQLite-filer")
+    ap.add_argument("--meter", default=None, help="mätar-id ur meters.json (standard: första mätaren)")
+    ap.add_argument("--db", help="importera till den här databasfilen i stället")
+    ap.add_argument("--tz", default="Europe/Stockholm", help="tidszon för CSV-tider utan offset: utc, local eller ett zonnamn")
+    main(ap.parse_args())
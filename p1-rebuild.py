@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Bygger om dygnssammanfattningarna (p1_daily: kWh, kostnad, medel- och maxeffekt per dygn).
+
+    python p1-rebuild.py --meter hem                       # all historik, en process per kärna
+    python p1-rebuild.py --meter hem --from 2025-01-01 --refetch-prices
+    python p1-rebuild.py --meter hem --days 2              # bara de senaste dygnen, t.ex. från cron
+
+Intervallet delas i månader som räknas i en ProcessPoolExecutor med skrivskyddade
+anslutningar. Huvudprocessen skriver varje månad i en transaktion tillsammans med en
+markering i p1_rebuild_progress, så en avbruten körning fortsätter där den slutade
+(--restart börjar om). Priserna hämtas i förväg, så arbetarna bara läser.
+Till sist ombeds en körande server (--server) att glömma priser och cachade svar för intervallet.
+"""
+import argparse, json, os, sys, time, urllib.error, urllib.request
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta, timezone
+from p1_loader import load_server
+
+srv = None
+
+def _init_worker():
+    global srv
+    if srv is None: srv = load_server()
+
+def build_month(meter, first, last):
+    """Körs i en arbetsprocess: {datum: (kWh, kostnad, medel-W, max-W)} för first..last."""
+    st = srv.SqliteStore(meter, readonly=True)
+    return first, srv.summarize_days(st, first, last, lambda ds: st.load_prices(ds) or {})
+
+def main(args):
+    global srv
+    srv = load_server()
+    meter = srv.METERS.get(args.meter or srv.DEFAULT_METER) or sys.exit(f"Okänd mätare {args.meter!r}, finns: {', '.join(srv.METERS)}")
+    srv.init_db(meter["db"])
+    st = srv.store(meter)
+    yesterday = datetime.now(timezone.utc).date() - timedelta(days=1)  # bara avslutade dygn
+    first_ts = st.first_timestamp()
+    if not first_ts: sys.exit("Ingen mätdata")
+    first = date.fromisoformat(args.start) if args.start else yesterday - timedelta(days=args.days - 1) if args.days else date.fromisoformat(first_ts[:10])
+    last = min(date.fromisoformat(args.end) if args.end else yesterday, yesterday)
+    if last < first: sys.exit("Inga avslutade dygn i intervallet")
+
+    with st.connect() as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS p1_rebuild_progress (month TEXT PRIMARY KEY, first TEXT, last TEXT, done_at TEXT)")
+        if args.restart: conn.execute("DELETE FROM p1_rebuild_progress")
+        done = {r[0] for r in conn.execute("SELECT month FROM p1_rebuild_progress WHERE first = ? AND last = ?", (first.isoformat(), last.isoformat()))}
+        stale = conn.execute("SELECT COUNT(*) FROM p1_rebuild_progress WHERE first != ? OR last != ?", (first.isoformat(), last.isoformat())).fetchone()[0]
+        if stale: conn.execute("DELETE FROM p1_rebuild_progress WHERE first != ? OR last != ?", (first.isoformat(), last.isoformat()))
+    todo = [(a, b) for a, b in srv.month_spans(first, last) if a.isoformat()[:7] not in done]
+    if done: print(f"Fortsätter avbruten körning: {len(done)} av {len(done) + len(todo)} månader klara")
+
+    # Priserna hämtas här, så att arbetarna bara behöver läsa daily_prices
+    t0 = time.perf_counter()
+    if args.refetch_prices:  # bara månaderna som återstår; de klara fick nya priser i förra körningen
+        with st.connect() as conn:
+            for a, b in todo: conn.execute("DELETE FROM daily_prices WHERE date_str >= ? AND date_str <= ?", (a.isoformat(), b.isoformat()))
+        srv.price_cache.clear()
+    missing = 0
+    for a, b in todo:
+        for i in range((b - a).days + 1):
+            if len(srv.get_prices_for_date(a + timedelta(days=i), meter)) < 96: missing += 1
+    if missing: print(f"Varning: {missing} dygn saknar fullständiga priser och får kostnad 0 för de kvartarna", file=sys.stderr)
+    print(f"{len(todo)} månader, {first} – {last}, {args.workers} processer (priser klara på {time.perf_counter() - t0:.1f} s)")
+
+    t0, n_days = time.perf_counter(), 0
+    total_days = sum((b - a).days + 1 for a, b in todo)
+    with ProcessPoolExecutor(args.workers, initializer=_init_worker) as pool:
+        futures = [pool.submit(build_month, meter, a, b) for a, b in todo]
+        for i, fut in enumerate(as_completed(futures), 1):
+            a, days = fut.result()
+            b = next(y for x, y in todo if x == a)
+            now = srv.to_utc_str(datetime.now(timezone.utc))
+            with st.connect() as conn:  # en transaktion per månad, med markeringen
+                conn.execute("DELETE FROM p1_daily WHERE day >= ? AND day <= ?", (a.isoformat(), b.isoformat()))
+                conn.executemany("INSERT INTO p1_daily (day, kwh, cost, avg_power_w, max_power_w, built_at) VALUES (?, ?, ?, ?, ?, ?)", [(ds, *v, now) for ds, v in days.items() if v[2] is not None])
+                conn.execute("INSERT OR REPLACE INTO p1_rebuild_progress VALUES (?, ?, ?, ?)", (a.isoformat()[:7], first.isoformat(), last.isoformat(), now))
+            n_days += (b - a).days + 1
+            dt = time.perf_counter() - t0
+            kwh, cost = sum(v[0] for v in days.values()), sum(v[1] for v in days.values())
+            print(f"[{i}/{len(todo)}] {a.isoformat()[:7]}  {kwh:9.1f} kWh {cost:9.2f} kr   {n_days / dt:6.1f} dygn/s, {(total_days - n_days) / (n_days / dt):5.0f} s kvar", flush=True)
+    with st.connect() as conn: conn.execute("DELETE FROM p1_rebuild_progress")
+    print(f"Klart: {n_days} dygn på {time.perf_counter() - t0:.1f} s")
+    notify(srv, meter, first, last, args.server or f"http://127.0.0.1:{srv.PORT}")
+
+def notify(srv, meter, first, last, server):
+    """Ber en körande server glömma priser och cachade svar för intervallet (/admin/invalidate)."""
+    url = f"{server.rstrip('/')}/admin/invalidate?meter={meter['id']}&from={first}&to={last}"
+    req = urllib.request.Request(url, method="POST", headers={"Authorization": f"Bearer {srv.ADMIN_TOKEN}"} if srv.ADMIN_TOKEN else {})
+    try:
+        with urllib.request.urlopen(req, timeout=10) as r: print(f"Servern uppdaterad: {json.loads(r.read())}")
+    except urllib.error.HTTPError as e: print(f"Varning: {server} svarade {e.code} på /admin/invalidate; starta om servern för att se de nya värdena", file=sys.stderr)
+    except OSError: print(f"Ingen server på {server}; nya värden syns när den startar")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Bygg om dygnssammanfattningarna parallellt")
+    ap.add_argument("--meter", help="mätar-id ur meters.json (standard: första mätaren)")
+    ap.add_argument("--from", dest="start", help="första dygn (standard: första mätdatan)")
+    ap.add_argument("--to", dest="end", help="sista dygn (standard: i går)")
+    ap.add_argument("--days", type=int, help="bara de senaste N avslutade dygnen")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--refetch-prices", action="store_true", help="hämta om priserna för intervallet först")
+    ap.add_argument("--server", help="körande server att meddela (standard: http://127.0.0.1:PORT)")
+    ap.add_argument("--restart", action="store_true", help="börja om i stället för att fortsätta en avbruten körning")
+    main(ap.parse_args())
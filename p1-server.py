@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
-import json, sqlite3, threading, queue, time, requests, logging, socket, os
-from datetime import datetime, timedelta, timezone
-from flask import Flask, Response, request, jsonify, render_template_string, cli
-from flask_sock import Sock
+import json, sqlite3, threading, queue, time, logging, socket, os, re, sys, zlib, operator, struct, glob, csv, tempfile, gzip, hashlib, random, mimetypes
+from urllib.parse import quote
+from array import array
+from bisect import bisect_left
+from itertools import accumulate, chain, count as count_from, repeat
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from flask import Flask, Response, request, cli, abort, stream_with_context, g
 
 # --- Tysta ner terminalen ---
 cli.show_server_banner = lambda *args: None 
@@ -14,15 +19,208 @@ P1_IP = "192.168.2.141"
 DB_PATH = "p1.db"
 ELOMRADE = "SE3"
 PORT = 8000
-current_prices = {}
+POLL_INTERVAL = 10
+POLL_WORKERS = 16          # max antal samtidiga mätaranrop
+INGEST_MODE = "json"       # "json" (/api/v1/data) eller "telegram" (rått DSMR-telegram via /api/v1/telegram)
+STORAGE_MODE = "full"      # "full" sparar varje sampel, "deadband" bara ändringar (se DEADBANDS)
+DEADBANDS = {"active_power_w": 5, "active_power_l1_w": 5, "active_power_l2_w": 5, "active_power_l3_w": 5,
+             "active_current_l1_a": 0.1, "active_current_l2_a": 0.1, "active_current_l3_a": 0.1,
+             "voltage_l1_v": 0.5, "voltage_l2_v": 0.5, "voltage_l3_v": 0.5, "active_tariff": 0}
+HEARTBEAT_S = 300          # deadband: längsta tid mellan två sparade rader
+CHUNK_AFTER_DAYS = None    # t.ex. 30: rader äldre än så packas till komprimerade timchunkar
+RETENTION_TIERS = []       # t.ex. [(30, 60), (365, 900)]: äldre än 30 dygn -> 1-minutsvärden, äldre än 365 dygn -> kvartsvärden
+PARTITION_MONTHLY = False  # mätdata i en fil per månad (p1.2026-10.db) som ATTACH:as vid behov
+PARTITION_KEEP_MONTHS = None  # t.ex. 24: äldre månadsfiler tas bort
+ANALYTICS_BACKEND = None   # "duckdb": långa statistikfrågor går mot en DuckDB-kopia (pip install duckdb)
+ANALYTICS_MIN_DAYS = 7     # kortare perioder räknas direkt mot SQLite
+ARCHIVE_RAW = False        # True: varje rått svar från mätaren sparas packat i <db>.raw.db (se /admin/replay)
+PRICE_API_URL = "https://www.elprisetjustnu.se/api/v1/prices/{year}/{month_day}_{area}.json"  # p1-sim.py kan ersätta den
+METERS_PATH = "meters.json"  # valfri lista: [{"id": "stuga", "ip": "10.0.0.5", "elomrade": "SE4"}, ...]
+current_prices = {}        # elområde -> {"HH:MM": pris}
+price_cache = {}           # (elområde, datum) -> kompletta dygnspriser
+
+def load_meters():
+    if os.path.exists(METERS_PATH):
+        with open(METERS_PATH, encoding="utf-8") as f: raw = json.load(f)
+    else:
+        raw = [{"id": "hem", "ip": P1_IP, "elomrade": ELOMRADE, "db": DB_PATH}]
+    meters = {}
+    for m in raw:
+        mid = str(m["id"])
+        if not re.fullmatch(r"[A-Za-z0-9_-]+", mid): raise ValueError(f"Ogiltigt mätar-id: {mid!r}")
+        meters[mid] = {"id": mid, "ip": m["ip"], "elomrade": m.get("elomrade", ELOMRADE), "db": m.get("db") or f"p1-{mid}.db", "mode": m.get("mode", INGEST_MODE)}
+    return meters
+
+METERS = load_meters()  # trådar itererar över list(METERS.values()); uppspelningar ligger i replay_meters
+DEFAULT_METER = next(iter(METERS))
 
 def get_price_key(dt_obj):
     minute = (dt_obj.minute // 15) * 15
     return f"{dt_obj.hour:02d}:{minute:02d}"
 
+# --- Mätvärden ---
+# Enkla räknare och histogram i Prometheus textformat på /metrics. En observation är en
+# bisect och två additioner under ett lås, så det märks inte i insamlingen.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+_metrics, _metrics_lock = {}, threading.Lock()  # (namn, etiketter) -> [buckets, antal per bucket, summa, antal] eller [värde]
+METRIC_HELP = {
+    "p1_poll_seconds": ("histogram", "Tid för anropet till P1-mätaren"),
+    "p1_insert_seconds": ("histogram", "Tid för att skriva sampel till SQLite"),
+    "p1_fanout_seconds": ("histogram", "Tid för att lägga ett sampel på alla prenumeranters köer"),
+    "http_request_seconds": ("histogram", "Svarstid per endpoint"),
+    "http_response_bytes": ("histogram", "Svarsstorlek per endpoint (strömmade svar räknas inte)"),
+    "p1_price_fetch_total": ("counter", "Prisuppslag per källa och utfall"),
+    "p1_swallowed_errors_total": ("counter", "Undantag som fångats och ignorerats, per ställe"),
+    "p1_fanout_dropped_total": ("counter", "Sampel som inte fick plats i en långsam klients kö"),
+    "p1_report_jobs_total": ("counter", "Rapportjobb per utfall (queued, reused, done, error, cancelled)"),
+    "p1_report_seconds": ("histogram", "Körtid per rapportjobb"),
+}
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    h = _metrics.get(key)
+    if h is None: h = _metrics.setdefault(key, [buckets, [0] * (len(buckets) + 1), 0.0, 0])
+    with _metrics_lock:
+        h[1][bisect_left(h[0], value)] += 1
+        h[2] += value
+        h[3] += 1
+
+def count(name, n=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    c = _metrics.get(key)
+    if c is None: c = _metrics.setdefault(key, [0])
+    with _metrics_lock: c[0] += n
+
+def swallowed(site):
+    """För `except:` som inte ska stoppa tråden men ändå ska synas."""
+    count("p1_swallowed_errors_total", site=site)
+
+def _labels(pairs, extra=()):
+    pairs = list(pairs) + list(extra)
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+def render_metrics(extra):
+    """extra: [(namn, typ, hjälptext, [(etiketter, värde), ...]), ...] som räknas fram vid anropet."""
+    out, seen = [], set()
+    with _metrics_lock: items = sorted(((k, [v[0], list(v[1]), v[2], v[3]] if len(v) > 1 else list(v)) for k, v in _metrics.items()), key=operator.itemgetter(0))
+    for (name, labels), v in items:
+        if name not in seen:
+            kind, text = METRIC_HELP.get(name, ("untyped", name))
+            out += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+            seen.add(name)
+        if len(v) == 1:
+            out.append(f"{name}{_labels(labels)} {v[0]}")
+            continue
+        buckets, counts, total, n = v
+        for le, c in zip(list(buckets) + ["+Inf"], accumulate(counts)):
+            out.append(f"{name}_bucket{_labels(labels, [('le', le)])} {c}")
+        out += [f"{name}_sum{_labels(labels)} {total}", f"{name}_count{_labels(labels)} {n}"]
+    for name, kind, text, values in extra:
+        out += [f"# HELP {name} {text}", f"# TYPE {name} {kind}"]
+        out += [f"{name}{_labels(sorted(labels.items()))} {val}" for labels, val in values]
+    return "\n".join(out) + "\n"
+
+# --- Profilering ---
+# Avstängt som standard och går att slå på under drift via /admin/profiling:
+#  * sample=0.05 låter en tråd ta stackprov var PROFILE_INTERVAL_S under 5 % av anropen;
+#    /admin/profile ger kollapsade stackar för flamegraph.pl/speedscope.
+#  * slow_ms=50 tidtar alla SQLite-frågor på nya anslutningar och sparar de långsamma med
+#    EXPLAIN QUERY PLAN; /admin/slow-queries visar dem.
+PROFILE_SAMPLE_RATE = 0.0
+PROFILE_INTERVAL_S = 0.005
+SLOW_QUERY_MS = None
+ADMIN_TOKEN = None  # utan token tillåts /admin/* bara från localhost, vilket bakom en lokal proxy betyder alla
+slow_queries = deque(maxlen=200)
+_profiled, _stacks = {}, {}  # tråd-id -> endpoint, kollapsad stack -> antal prov
+_sampler = None
+slow_log = logging.getLogger("p1.slowsql")
+
+def _sample_stacks():
+    while PROFILE_SAMPLE_RATE > 0:
+        time.sleep(PROFILE_INTERVAL_S)
+        if not _profiled: continue
+        frames = sys._current_frames()
+        for tid, ep in list(_profiled.items()):
+            f, parts = frames.get(tid), []
+            while f is not None:
+                parts.append(f"{os.path.basename(f.f_code.co_filename)}:{f.f_code.co_name}")
+                f = f.f_back
+            if not parts: continue
+            key = ep + ";" + ";".join(reversed(parts))
+            if key in _stacks or len(_stacks) < 20000: _stacks[key] = _stacks.get(key, 0) + 1
+
+def set_profiling(sample=None, slow_ms=None):
+    global PROFILE_SAMPLE_RATE, SLOW_QUERY_MS, _sampler
+    if sample is not None: PROFILE_SAMPLE_RATE = min(1.0, max(0.0, sample))
+    if slow_ms is not None: SLOW_QUERY_MS = slow_ms if slow_ms > 0 else None
+    if PROFILE_SAMPLE_RATE > 0 and (_sampler is None or not _sampler.is_alive()):
+        _sampler = threading.Thread(target=_sample_stacks, daemon=True, name="p1-profiler")
+        _sampler.start()
+
+class TimedCursor(sqlite3.Cursor):
+    """Räknar tiden i execute och i hämtningen av raderna (som sker lat vid iteration). När
+    gränsen passeras loggas frågan, och posten uppdateras sedan med den totala tiden."""
+    _t, _sql, _args, _done, _entry = 0.0, "", (), True, None
+
+    def _add(self, t0):
+        self._t += time.perf_counter() - t0
+        if self._entry is not None: self._entry["ms"] = round(self._t * 1000, 1)
+        elif not self._done and SLOW_QUERY_MS and self._t * 1000 >= SLOW_QUERY_MS:
+            self._done = True
+            try: plan = [r[-1] for r in sqlite3.Connection.execute(self.connection, "EXPLAIN QUERY PLAN " + self._sql, self._args)]
+            except sqlite3.Error: plan = []
+            self._entry = {"at": to_utc_str(datetime.now(timezone.utc)), "ms": round(self._t * 1000, 1), "sql": " ".join(self._sql.split()), "args": repr(self._args)[:200], "plan": plan}
+            slow_queries.append(self._entry)
+            slow_log.warning("långsam fråga (>= %s ms): %s", SLOW_QUERY_MS, self._entry["sql"])
+
+    def execute(self, sql, args=()):
+        self._t, self._sql, self._args, self._done, self._entry = 0.0, sql, args, False, None
+        t0 = time.perf_counter()
+        try: return super().execute(sql, args)
+        finally: self._add(t0)
+
+    def executemany(self, sql, seq):
+        self._t, self._sql, self._args, self._done, self._entry = 0.0, sql, (), True, None  # ingen plan för skrivningar
+        t0 = time.perf_counter()
+        try: return super().executemany(sql, seq)
+        finally:
+            ms = (time.perf_counter() - t0) * 1000
+            if SLOW_QUERY_MS and ms >= SLOW_QUERY_MS: slow_queries.append({"at": to_utc_str(datetime.now(timezone.utc)), "ms": round(ms, 1), "sql": " ".join(sql.split()), "args": "executemany", "plan": []})
+
+    def __next__(self):
+        t0 = time.perf_counter()
+        try: return super().__next__()
+        finally: self._add(t0)
+
+    def fetchone(self):
+        t0 = time.perf_counter()
+        try: return super().fetchone()
+        finally: self._add(t0)
+
+    def fetchall(self):
+        t0 = time.perf_counter()
+        try: return super().fetchall()
+        finally: self._add(t0)
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor): return super().cursor(factory)
+    def execute(self, sql, args=()): return self.cursor().execute(sql, args)
+    def executemany(self, sql, seq): return self.cursor().executemany(sql, seq)
+
 # --- Databas ---
-def init_db():
-    with sqlite3.connect(DB_PATH) as conn:
+BASE_COLUMNS = ["active_power_w", "total_import_kwh", "voltage_l1_v", "voltage_l2_v", "voltage_l3_v", "active_current_l1_a", "active_current_l2_a", "active_current_l3_a"]
+EXTRA_COLUMNS = ["total_export_kwh", "active_tariff", "active_power_l1_w", "active_power_l2_w", "active_power_l3_w"]
+MEASUREMENT_COLUMNS = BASE_COLUMNS + EXTRA_COLUMNS
+INSERT_SQL = f"INSERT INTO p1_measurements (measured_at, {', '.join(MEASUREMENT_COLUMNS)}) VALUES ({', '.join('?' * (len(MEASUREMENT_COLUMNS) + 1))})"
+
+def init_db(db_path=DB_PATH):
+    with db_connect(db_path) as conn:
+        # auto_vacuum måste sättas innan första tabellen skapas; befintliga databaser konverteras
+        # (en gång, med VACUUM) bara om gallring är påslagen
+        if conn.execute("PRAGMA page_count").fetchone()[0] == 0: conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        elif RETENTION_TIERS and conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL"); conn.execute("VACUUM")
         conn.execute("""CREATE TABLE IF NOT EXISTS p1_measurements (
             id INTEGER PRIMARY KEY AUTOINCREMENT, 
             measured_at TEXT, 
@@ -34,17 +232,713 @@ def init_db():
             date_str TEXT PRIMARY KEY,
             json_data TEXT)""")
         conn.execute("CREATE INDEX IF NOT EXISTS idx_measured_at ON p1_measurements(measured_at)")
+        conn.execute(f"CREATE TABLE IF NOT EXISTS p1_chunks (hour_start TEXT PRIMARY KEY, n INTEGER, codec TEXT, ts BLOB, {', '.join(c + ' BLOB' for c in BASE_COLUMNS)})")
+        conn.execute(f"CREATE TABLE IF NOT EXISTS p1_rollups (bucket_start TEXT, bucket_s INTEGER, n INTEGER, energy_kwh REAL, {', '.join(c + ' REAL' for c in BASE_COLUMNS)}, PRIMARY KEY (bucket_start, bucket_s))")
+        conn.execute("CREATE TABLE IF NOT EXISTS p1_daily (day TEXT PRIMARY KEY, kwh REAL, cost REAL, avg_power_w REAL, max_power_w REAL, built_at TEXT)")
+        for table, kind in (("p1_measurements", "REAL"), ("p1_chunks", "BLOB"), ("p1_rollups", "REAL")):
+            have = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+            for col in EXTRA_COLUMNS:
+                if col not in have: conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {kind}")
+
+def to_utc_str(dt): return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+def parse_utc(s): return datetime.fromisoformat(s.replace("Z", "+00:00"))
+
+def day_bounds(d):
+    """Strängintervall som täcker alla tidsstämplar för ett UTC-datum, även de med decimaler i första sekunden."""
+    ds = d if isinstance(d, str) else d.strftime('%Y-%m-%d')
+    return ds + "T00:00:00", ds + "T23:59:60"
+
+def price_slot(dt):
+    """(lokalt datum, kvart) – den enhet som kostnaden fördelas på."""
+    local = dt.astimezone()
+    return local.date(), get_price_key(local)
+
+# --- Månadspartitioner ---
+# Med PARTITION_MONTHLY skrivs mätdata till en fil per månad bredvid mätarens databas. Läsningar
+# ATTACH:ar bara de månader intervallet överlappar (basfilen läses alltid, för data från tiden
+# före partitioneringen). Stängda månader öppnas skrivskyddat, och som immutable när inget
+# underhållsjobb längre kan ändra dem, så SQLite slipper låsning och ändringskontroller.
+_ready_dbs = set()
+_MAX_ATTACHED = 8  # SQLite tillåter 10 som standard
+
+def db_connect(path):
+    return sqlite3.connect(path, uri=True, factory=TimedConnection if SLOW_QUERY_MS else sqlite3.Connection)
+
+def partition_path(meter, month):
+    base, ext = os.path.splitext(meter["db"])
+    return f"{base}.{month}{ext or '.db'}"
+
+def partition_months(meter):
+    base, ext = os.path.splitext(meter["db"])
+    found = (re.fullmatch(r"\d{4}-\d{2}", p[len(base) + 1:-len(ext or '.db')]) for p in glob.glob(f"{glob.escape(base)}.*{ext or '.db'}"))
+    return sorted(m.group(0) for m in found if m)
+
+def storage_paths(meter):
+    """Alla filer som kan innehålla mätdata för mätaren, äldst först efter basfilen."""
+    return [meter["db"]] + [partition_path(meter, m) for m in partition_months(meter)]
+
+def write_path(meter, ts):
+    if not PARTITION_MONTHLY: return meter["db"]
+    path = partition_path(meter, ts[:7])
+    if path not in _ready_dbs:
+        init_db(path)
+        _ready_dbs.add(path)
+    return path
+
+def _months(start_str, end_str):
+    y, m = int(start_str[:4]), int(start_str[5:7])
+    end = (end_str or to_utc_str(datetime.now(timezone.utc)))[:7]
+    while f"{y:04d}-{m:02d}" <= end:
+        yield f"{y:04d}-{m:02d}"
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+
+def _sealed(month):
+    """Sant när inget komprimerings- eller gallringsjobb längre kan skriva i månaden."""
+    horizon = max([CHUNK_AFTER_DAYS or 0] + [d for d, _ in RETENTION_TIERS]) + 1
+    y, m = int(month[:4]), int(month[5:7])
+    month_end = datetime(y + m // 12, m % 12 + 1, 1, tzinfo=timezone.utc)
+    return month_end + timedelta(days=horizon) < datetime.now(timezone.utc)
+
+def _schemas(conn, meter, start_str, end_str):
+    """Schemanamn att läsa från för intervallet; ATTACH:ar månadsfiler efter hand."""
+    yield "main"
+    if not PARTITION_MONTHLY or meter is None: return
+    current = to_utc_str(datetime.now(timezone.utc))[:7]
+    for month in _months(start_str, end_str):
+        path = partition_path(meter, month)
+        if not os.path.exists(path): continue
+        alias = "m" + month.replace("-", "_")
+        attached = [r[1] for r in conn.execute("PRAGMA database_list") if r[1] not in ("main", "temp")]
+        if alias not in attached:
+            for old in attached[:max(0, len(attached) - _MAX_ATTACHED + 1)]: conn.execute(f"DETACH DATABASE {old}")
+            uri = "file:" + quote(os.path.abspath(path))
+            if month < current: uri += "?mode=ro" + ("&immutable=1" if _sealed(month) else "")
+            conn.execute(f"ATTACH DATABASE ? AS {alias}", (uri,))
+        yield alias
+
+def drop_old_partitions(meter):
+    """Att gallra bort en månad är bara att ta bort dess fil."""
+    now = datetime.now(timezone.utc)
+    y, m = divmod(now.year * 12 + now.month - 1 - PARTITION_KEEP_MONTHS, 12)
+    cutoff = f"{y:04d}-{m + 1:02d}"
+    for month in partition_months(meter):
+        if month < cutoff:
+            os.remove(partition_path(meter, month))
+            _ready_dbs.discard(partition_path(meter, month))
+
+# --- Deadband-lagring ---
+# I deadband-läge sparas ett sampel bara om något värde rört sig mer än sitt deadband sedan
+# senast sparade rad, eller om HEARTBEAT_S har gått. Första och sista sampel i varje priskvart
+# sparas alltid, liksom båda sidor av ett mätarhopp, så att kWh-differenserna per kvart och
+# dygn (och därmed kostnaden) blir exakt desamma som med full lagring.
+_deadband = {}  # mätar-id -> {"last": (dt, slot, row), "prev": (dt, ts, slot, row, sparad)}
+
+def _kwh_glitch(a, b):
+    if a is None or b is None: return a is not b
+    return not 0 <= b - a < 50
+
+def _outside_deadband(last, row):
+    for col, band in DEADBANDS.items():
+        a, b = last.get(col), row.get(col)
+        if (a is None) != (b is None) or (a is not None and abs(b - a) > band): return True
+    return False
+
+def deadband_filter(meter_id, now_dt, now_str, row):
+    """Nytt sampel -> lista av (tidsstämpel, rad) som ska sparas."""
+    slot = price_slot(now_dt)
+    st = _deadband.get(meter_id)
+    if st is None:
+        _deadband[meter_id] = {"last": (now_dt, slot, row), "prev": (now_dt, now_str, slot, row, True)}
+        return [(now_str, row)]
+    out = []
+    p_dt, p_ts, p_slot, p_row, p_saved = st["prev"]
+    glitch = _kwh_glitch(p_row["total_import_kwh"], row["total_import_kwh"])
+    if not p_saved and (p_slot != slot or glitch):
+        out.append((p_ts, p_row))
+        st["last"] = (p_dt, p_slot, p_row)
+    l_dt, l_slot, l_row = st["last"]
+    save = l_slot != slot or glitch or (now_dt - l_dt).total_seconds() >= HEARTBEAT_S or _outside_deadband(l_row, row)
+    if save:
+        out.append((now_str, row))
+        st["last"] = (now_dt, slot, row)
+    st["prev"] = (now_dt, now_str, slot, row, save)
+    return out
+
+def _fill_steps(rows):
+    """Återskapar en stegserie med POLL_INTERVAL mellan punkterna där deadband-läget hoppat över
+    sampel. Luckor längre än HEARTBEAT_S är riktiga avbrott och lämnas orörda."""
+    out, prev_dt = [], None
+    step, max_gap = timedelta(seconds=POLL_INTERVAL), timedelta(seconds=HEARTBEAT_S + POLL_INTERVAL)
+    for r in rows:
+        dt = parse_utc(r["measured_at"])
+        if prev_dt is not None and step * 1.5 < dt - prev_dt <= max_gap:
+            t, base = prev_dt + step, out[-1]
+            while t < dt - step / 2:
+                out.append({**base, "id": None, "measured_at": to_utc_str(t)})
+                t += step
+        out.append(r)
+        prev_dt = dt
+    return out
+
+# --- Komprimerad långtidslagring ---
+# Gamla rader packas per timme till en rad i p1_chunks med en blob per kolumn. Tidsstämplar
+# (mikrosekunder) och värden som går att skala exakt till heltal (W, 0,1 V, 0,001 kWh ...)
+# lagras som heltalsdeltan, övriga som XOR mot föregående double (Gorilla-idén). Deltana
+# förskjuts till >= 0, packas i minsta möjliga bytebredd och byteplanen läggs efter varandra
+# innan zstd (om modulen finns) eller zlib komprimerar. Avkodningen är förlustfri.
+try:
+    import zstandard
+    _CODECS = {"zstd": (zstandard.ZstdCompressor(level=19).compress, zstandard.ZstdDecompressor().decompress)}
+except ImportError:
+    _CODECS = {}
+_CODECS["zlib"] = (lambda b: zlib.compress(b, 9), zlib.decompress)
+CHUNK_CODEC = "zstd" if "zstd" in _CODECS else "zlib"
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_XOR = 255
+_HEAD = struct.Struct("<BqqB")  # typ, första värdet, förskjutning, bytebredd
+_WIDTHS = {1: "B", 2: "H", 4: "I", 8: "Q"}
+
+def _le(a):
+    if sys.byteorder == "big": a.byteswap()
+    return a
+
+def _pack(kind, ints, compress, op=operator.sub):
+    d = list(map(op, ints[1:], ints[:-1]))
+    lo = min(d, default=0)
+    top = max(d, default=0) - lo
+    width = next(w for w in (1, 2, 4, 8) if top < 256 ** w)
+    b = _le(array(_WIDTHS[width], map(operator.sub, d, repeat(lo)))).tobytes()
+    planes = b"".join(b[i::width] for i in range(width))
+    return _HEAD.pack(kind, ints[0] if ints else 0, lo, width) + compress(planes)
+
+def _unpack(blob, decompress, n):
+    kind, first, lo, width = _HEAD.unpack_from(blob)
+    planes, b = decompress(blob[_HEAD.size:]), bytearray((n - 1) * width)
+    for i in range(width): b[i::width] = planes[i * (n - 1):(i + 1) * (n - 1)]
+    a = array(_WIDTHS[width]); a.frombytes(b)
+    return kind, chain([first], map(operator.add, _le(a), repeat(lo)))
+
+def _encode_col(values, compress):
+    if all(v is None for v in values): return None
+    for dec in range(7):
+        f = 10 ** dec
+        try: ints = [round(v * f) for v in values]
+        except TypeError: break  # None finns -> XOR-kodning (None blir NaN)
+        if all(i / f == v for i, v in zip(ints, values)) and max(map(abs, ints), default=0) < 2 ** 53:
+            return _pack(dec, ints, compress)
+    bits = array("q", _le(array("d", (float("nan") if v is None else v for v in values))).tobytes())
+    return _pack(_XOR, _le(bits).tolist(), compress, operator.xor)
+
+def _decode_col(blob, decompress, n):
+    kind, deltas = _unpack(blob, decompress, n)
+    if kind == _XOR:
+        return [None if v != v else v for v in array("d", array("q", accumulate(deltas, operator.xor)).tobytes())]
+    return list(map(operator.truediv, accumulate(deltas), repeat(10 ** kind)))
+
+def encode_chunk(rows, codec=CHUNK_CODEC):
+    """Rader (sorterade på tid) -> {kolumn: blob} för en rad i p1_chunks."""
+    compress = _CODECS[codec][0]
+    us = [(parse_utc(r["measured_at"]) - _EPOCH) // timedelta(microseconds=1) for r in rows]
+    out = {"n": len(rows), "codec": codec, "ts": _pack(0, us, compress)}
+    for col in MEASUREMENT_COLUMNS: out[col] = _encode_col([r[col] for r in rows], compress)
+    return out
+
+def _stamps(us):
+    """Mikrosekunder inom en och samma timme -> tidsstämplar i samma format som insamlingen skriver."""
+    base = us[0] - us[0] % 3_600_000_000 if us else 0
+    prefix = to_utc_str(_EPOCH + timedelta(microseconds=base))[:14]  # "YYYY-MM-DDTHH:", samma för hela chunken
+    stamps = []
+    for s, frac in map(divmod, map(operator.sub, us, repeat(base)), repeat(1_000_000)):
+        stamps.append(f"{prefix}{s // 60:02d}:{s % 60:02d}.{frac:06d}Z" if frac else f"{prefix}{s // 60:02d}:{s % 60:02d}Z")
+    return stamps
+
+def decode_chunk(chunk, columns):
+    """En rad från p1_chunks (dict) -> mätpunkter med de efterfrågade kolumnerna."""
+    decompress, n = _CODECS[chunk["codec"]][1], chunk["n"]
+    cols = {"id": [None] * n, "measured_at": _stamps(list(accumulate(_unpack(chunk["ts"], decompress, n)[1])))}
+    for c in columns:
+        if c not in cols: cols[c] = _decode_col(chunk[c], decompress, n) if chunk[c] is not None else [None] * n
+    return [dict(zip(columns, vals)) for vals in zip(*(cols[c] for c in columns))]
+
+def compact_hour(conn, hour):
+    """Flyttar en timmes rader ("YYYY-MM-DDTHH") från p1_measurements in i dess chunk (en transaktion)."""
+    cols = ["measured_at"] + MEASUREMENT_COLUMNS
+    with conn:
+        # hour + ":60" ligger efter varje giltig tidsstämpel i timmen, oavsett decimaler
+        # Befintlig chunk för timmen slås ihop med de nya raderna; nedsamplade hinkar får inte följa med
+        rows = read_points(conn, None, hour, hour + ":60", cols, steps=False, rollups=False)
+        conn.execute(f"INSERT OR REPLACE INTO p1_chunks (hour_start, {', '.join(['n', 'codec', 'ts'] + MEASUREMENT_COLUMNS)}) VALUES ({', '.join('?' * (len(MEASUREMENT_COLUMNS) + 4))})",
+                     [hour + ":00:00Z"] + list(encode_chunk(rows).values()))
+        conn.execute("DELETE FROM p1_measurements WHERE measured_at >= ? AND measured_at < ?", (hour, hour + ":60"))
+
+def compact_old_data(meter):
+    cutoff = to_utc_str((datetime.now(timezone.utc) - timedelta(days=CHUNK_AFTER_DAYS)).replace(minute=0, second=0, microsecond=0))
+    done = 0
+    for path in storage_paths(meter):
+        with db_connect(path) as conn:
+            hours = [h for (h,) in conn.execute("SELECT DISTINCT substr(measured_at, 1, 13) FROM p1_measurements WHERE measured_at < ?", (cutoff,))]
+            for h in hours: compact_hour(conn, h)
+        done += len(hours)
+    return done
+
+def compaction_scheduler():
+    while True:
+        for m in list(METERS.values()):
+            try: compact_old_data(m)
+            except: swallowed("compaction")
+        time.sleep(3600)
+
+# --- Rådataarkiv ---
+# Med ARCHIVE_RAW sparas varje rått svar från mätaren (JSON, eller {"telegram": text}) i
+# <db>.raw.db, först som en rad i p1_raw och efter timmens slut packat i p1_raw_chunks.
+# Packningen delar upp svaren per nyckel: tal kodas som kolumnerna i p1_chunks (deltan med
+# bytebredd efter behov), övrigt som en komprimerad JSON-lista. Nycklar som saknas i vissa
+# svar noteras i schemat, så avkodningen ger tillbaka exakt samma dictar.
+def raw_path(meter): return os.path.splitext(meter["db"])[0] + ".raw.db"
+
+def raw_connect(meter):
+    path = raw_path(meter)
+    conn = db_connect(path)
+    if path not in _ready_dbs:
+        conn.execute("CREATE TABLE IF NOT EXISTS p1_raw (measured_at TEXT PRIMARY KEY, body TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS p1_raw_chunks (hour_start TEXT PRIMARY KEY, n INTEGER, codec TEXT, ts BLOB, schema TEXT, data BLOB)")
+        _ready_dbs.add(path)
+    return conn
+
+def archive_raw(meter, ts, payload):
+    with raw_connect(meter) as conn: conn.execute("INSERT OR REPLACE INTO p1_raw VALUES (?, ?)", (ts, json.dumps(payload, separators=(",", ":"))))
+
+def encode_raw_hour(items, codec=CHUNK_CODEC):
+    """[(tidsstämpel, dict), ...] (sorterade) -> (n, codec, ts, schema, data) för p1_raw_chunks."""
+    compress = _CODECS[codec][0]
+    schema, blobs = [], []
+    for k in dict.fromkeys(k for _, p in items for k in p):
+        vals = [p.get(k) for _, p in items]
+        missing = [i for i, (_, p) in enumerate(items) if k not in p]
+        nums = [v for v in vals if v is not None]
+        kind = "json"
+        if nums and all(type(v) in (int, float) for v in nums): kind = "int" if all(type(v) is int for v in nums) else "num"
+        blob = _encode_col(vals, compress) if kind != "json" else compress(json.dumps(vals, separators=(",", ":")).encode())
+        schema.append([k, kind, missing, len(blob)])
+        blobs.append(blob)
+    us = [(parse_utc(ts) - _EPOCH) // timedelta(microseconds=1) for ts, _ in items]
+    return len(items), codec, _pack(0, us, compress), json.dumps(schema, separators=(",", ":")), b"".join(blobs)
+
+def decode_raw_chunk(n, codec, ts, schema, data):
+    decompress = _CODECS[codec][1]
+    out, pos = [{} for _ in range(n)], 0
+    for k, kind, missing, size in json.loads(schema):
+        blob, pos = data[pos:pos + size], pos + size
+        vals = json.loads(decompress(blob)) if kind == "json" else _decode_col(blob, decompress, n)
+        if kind == "int": vals = [None if v is None else int(v) for v in vals]
+        skip = set(missing)
+        for i, v in enumerate(vals):
+            if i not in skip: out[i][k] = v
+    return list(zip(_stamps(list(accumulate(_unpack(ts, decompress, n)[1]))), out))
+
+def pack_raw(meter):
+    """Packar alla avslutade timmar i p1_raw, en transaktion per timme."""
+    current = to_utc_str(datetime.now(timezone.utc))[:13]
+    with raw_connect(meter) as conn:
+        hours = [h for (h,) in conn.execute("SELECT DISTINCT substr(measured_at, 1, 13) FROM p1_raw WHERE measured_at < ?", (current,))]
+        for h in hours:
+            with conn:
+                items = [(ts, json.loads(b)) for ts, b in conn.execute("SELECT measured_at, body FROM p1_raw WHERE measured_at >= ? AND measured_at < ? ORDER BY measured_at", (h, h + ":60"))]
+                old = conn.execute("SELECT n, codec, ts, schema, data FROM p1_raw_chunks WHERE hour_start = ?", (h + ":00:00Z",)).fetchone()
+                if old: items = sorted(dict(decode_raw_chunk(*old) + items).items())  # sena rader för en redan packad timme
+                conn.execute("INSERT OR REPLACE INTO p1_raw_chunks VALUES (?, ?, ?, ?, ?, ?)", (h + ":00:00Z",) + encode_raw_hour(items))
+                conn.execute("DELETE FROM p1_raw WHERE measured_at >= ? AND measured_at < ?", (h, h + ":60"))
+    return len(hours)
+
+def raw_payloads(meter, start_str, end_str):
+    """(tidsstämpel, rått svar) i tidsordning för intervallet, en timme i taget."""
+    if not os.path.exists(raw_path(meter)): return
+    with raw_connect(meter) as conn:
+        for row in conn.execute("SELECT n, codec, ts, schema, data FROM p1_raw_chunks WHERE hour_start >= ? AND hour_start <= ? ORDER BY hour_start", (start_str[:13], end_str)).fetchall():
+            yield from (x for x in decode_raw_chunk(*row) if start_str <= x[0] <= end_str)
+        for ts, body in conn.execute("SELECT measured_at, body FROM p1_raw WHERE measured_at >= ? AND measured_at <= ? ORDER BY measured_at", (start_str, end_str)).fetchall():
+            yield ts, json.loads(body)
+
+def raw_scheduler():
+    while True:
+        for m in list(METERS.values()):
+            try:
+                if os.path.exists(raw_path(m)): pack_raw(m)
+            except: swallowed("archive")
+        time.sleep(600)
+
+def read_points(conn, meter, start_str, end_str=None, columns=None, steps=True, rollups=True):
+    """Mätpunkter i [start, end] som dictar, oavsett lagringsläge. Bara de partitioner och
+    chunkar som överlappar intervallet, och bara de efterfrågade kolumnerna, avkodas.
+    Nedsamplade perioder (RETENTION_TIERS) ger en punkt per hink."""
+    names = list(columns or ["id", "measured_at"] + MEASUREMENT_COLUMNS)
+    rng = "measured_at >= ?" + (" AND measured_at <= ?" if end_str else "")
+    args = [start_str] + ([end_str] if end_str else [])
+    chunk_cols = ["n", "codec", "ts"] + [c for c in names if c in MEASUREMENT_COLUMNS]
+    sel = ", ".join("bucket_start" if c == "measured_at" else "NULL" if c == "id" else c for c in names)
+    rows, rolled = [], []
+    for db in _schemas(conn, meter, start_str, end_str):
+        chunked = []
+        cur = conn.execute(f"SELECT {', '.join(chunk_cols)} FROM {db}.p1_chunks WHERE hour_start >= ?" + (" AND hour_start <= ?" if end_str else "") + " ORDER BY hour_start",
+                           [start_str[:13]] + args[1:])
+        for ch in cur:
+            for r in decode_chunk(dict(zip(chunk_cols, ch)), names):
+                if r["measured_at"] >= start_str and (not end_str or r["measured_at"] <= end_str): chunked.append(r)
+        cur = conn.execute(f"SELECT {', '.join(names)} FROM {db}.p1_measurements WHERE {rng} ORDER BY measured_at ASC", args)
+        for part in (chunked, [dict(zip(names, r)) for r in cur]):
+            if rows and part and part[0]["measured_at"] < rows[-1]["measured_at"]:
+                rows = sorted(rows + part, key=operator.itemgetter("measured_at"))
+            else:
+                rows += part
+        if rollups:
+            cur = conn.execute(f"SELECT {sel} FROM {db}.p1_rollups WHERE bucket_start >= ?" + (" AND bucket_start <= ?" if end_str else "") + " ORDER BY bucket_start", args)
+            rolled += [dict(zip(names, r)) for r in cur]
+    if STORAGE_MODE == "deadband" and meter is not None:
+        st = _deadband.get(meter["id"])
+        if st and not st["prev"][4]:
+            _, p_ts, _, p_row, _ = st["prev"]
+            if p_ts >= start_str and (not end_str or p_ts <= end_str) and (not rows or p_ts > rows[-1]["measured_at"]):
+                rows.append({k: p_row.get(k) for k in names} | {"id": None, "measured_at": p_ts})
+        if steps: rows = _fill_steps(rows)
+    if rolled: rows = sorted(rolled + rows, key=operator.itemgetter("measured_at")) if rows else rolled
+    return rows
+
+def iter_points(conn, meter, start_str, end_str, columns=None, steps=True):
+    """Som read_points men i omgångar om ett UTC-dygn, så att minnet inte växer med intervallet."""
+    d, last, prev = date.fromisoformat(start_str[:10]), date.fromisoformat(end_str[:10]), None  # slutgränsen kan vara "T23:59:60"
+    while d <= last:
+        lo, hi = day_bounds(d)
+        rows = read_points(conn, meter, max(lo, start_str), min(hi, end_str), columns, steps=False)
+        if steps and STORAGE_MODE == "deadband" and rows:
+            rows = _fill_steps([prev] + rows)[1:] if prev else _fill_steps(rows)
+        if rows:
+            prev = rows[-1]
+            yield rows
+        d += timedelta(days=1)
+
+def ts_price_key(ts, cache):
+    """Priskvart för en tidsstämpel; cache per minut eftersom tidszonsomräkningen är det dyra."""
+    k = cache.get(ts[:16])
+    if k is None: k = cache[ts[:16]] = get_price_key(parse_utc(ts).astimezone())
+    return k
+
+def slot_energy(conn, meter, start_str, end_str):
+    """kWh per priskvart ("HH:MM", lokal tid) i intervallet. Rådata räknas som mätardifferenser
+    mellan på varandra följande punkter, nedsamplad data bidrar med sin lagrade energi."""
+    out, keys = {}, {}
+    def key(ts): return ts_price_key(ts, keys)
+    rows = read_points(conn, meter, start_str, end_str, ["measured_at", "total_import_kwh"], steps=False, rollups=False)
+    for i in range(1, len(rows)):
+        v1, v2 = rows[i]['total_import_kwh'], rows[i-1]['total_import_kwh']
+        if v1 is not None and v2 is not None:
+            diff = v1 - v2
+            if 0 < diff < 50:
+                k = key(rows[i]['measured_at'])
+                out[k] = out.get(k, 0.0) + diff
+    for db in _schemas(conn, meter, start_str, end_str):
+        for ts, e in conn.execute(f"SELECT bucket_start, energy_kwh FROM {db}.p1_rollups WHERE bucket_start >= ? AND bucket_start <= ?", (start_str, end_str)):
+            if e:
+                k = key(ts)
+                out[k] = out.get(k, 0.0) + e
+    return out
+
+# --- Nedsampling och gallring ---
+# Hela UTC-dygn äldre än en nivås gräns slås ihop till hinkar om bucket_s sekunder, ett dygn per
+# transaktion. Varje hink sparar medelvärden, senaste mätarställning och exakt den energi som
+# rådatan hade bidragit med, så kostnader och kWh blir desamma som före nedsamplingen.
+def _check_tiers():
+    """Hinkarna måste gå jämnt upp i priskvarten, annars kan en hink spänna över två priser.
+    Körs vid start och vid varje gallring, eftersom verktygen kan ändra RETENTION_TIERS."""
+    for _, bucket_s in RETENTION_TIERS:
+        if 900 % bucket_s: raise ValueError(f"RETENTION_TIERS: hinkstorleken {bucket_s} s går inte jämnt upp i en kvart (900 s)")
+_check_tiers()
+
+def _bucket_key(ts, bucket_s):
+    sec = int(ts[14:16]) * 60 + int(ts[17:19])
+    sec -= sec % bucket_s
+    return f"{ts[:14]}{sec // 60:02d}:{sec % 60:02d}Z"
+
+def downsample_day(conn, day, bucket_s):
+    lo, hi = day_bounds(day)
+    names = ["measured_at"] + MEASUREMENT_COLUMNS
+    src = []  # (tid, antal sampel, energi, värden)
+    cur = conn.execute(f"SELECT bucket_start, n, energy_kwh, {', '.join(MEASUREMENT_COLUMNS)} FROM p1_rollups WHERE bucket_start >= ? AND bucket_start <= ? AND bucket_s <= ?", (lo, hi, bucket_s))
+    for r in cur: src.append((r[0], r[1], r[2] or 0.0, dict(zip(MEASUREMENT_COLUMNS, r[3:]))))
+    prev = None
+    for p in read_points(conn, None, lo, hi, names, steps=False, rollups=False):
+        v1, v2 = p["total_import_kwh"], prev["total_import_kwh"] if prev else None
+        src.append((p["measured_at"], 1, v1 - v2 if v1 is not None and v2 is not None and 0 < v1 - v2 < 50 else 0.0, p))
+        prev = p
+    if not src: return 0
+    src.sort(key=operator.itemgetter(0))
+    buckets = {}
+    for ts, n, e, vals in src: buckets.setdefault(_bucket_key(ts, bucket_s), []).append((n, e, vals))
+    out = []
+    for b, items in buckets.items():
+        row = {"bucket_start": b, "bucket_s": bucket_s, "n": sum(n for n, _, _ in items), "energy_kwh": sum(e for _, e, _ in items)}
+        for c in MEASUREMENT_COLUMNS:
+            if c in ("total_import_kwh", "total_export_kwh", "active_tariff"):
+                row[c] = next((v[c] for _, _, v in reversed(items) if v[c] is not None), None)
+            else:
+                pairs = [(n, v[c]) for n, _, v in items if v[c] is not None]
+                row[c] = sum(n * x for n, x in pairs) / sum(n for n, _ in pairs) if pairs else None
+        out.append(row)
+    cols = ["bucket_start", "bucket_s", "n", "energy_kwh"] + MEASUREMENT_COLUMNS
+    with conn:
+        conn.execute("DELETE FROM p1_rollups WHERE bucket_start >= ? AND bucket_start <= ? AND bucket_s <= ?", (lo, hi, bucket_s))
+        conn.execute("DELETE FROM p1_measurements WHERE measured_at >= ? AND measured_at <= ?", (lo, hi))
+        conn.execute("DELETE FROM p1_chunks WHERE hour_start >= ? AND hour_start <= ?", (lo, hi))
+        conn.executemany(f"INSERT INTO p1_rollups ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})", [[r[c] for c in cols] for r in out])
+    return len(src)
+
+def apply_retention(meter, pause=0.05):
+    _check_tiers()
+    now = datetime.now(timezone.utc)
+    for path in storage_paths(meter):
+        _apply_retention_file(path, now, pause)
+
+def _apply_retention_file(path, now, pause):
+    with db_connect(path) as conn:
+        for days, bucket_s in RETENTION_TIERS:
+            cutoff = (now - timedelta(days=days)).strftime('%Y-%m-%d')
+            todo = sorted({d for (d,) in conn.execute(
+                "SELECT substr(measured_at, 1, 10) FROM p1_measurements WHERE measured_at < ? "
+                "UNION SELECT substr(hour_start, 1, 10) FROM p1_chunks WHERE hour_start < ? "
+                "UNION SELECT substr(bucket_start, 1, 10) FROM p1_rollups WHERE bucket_start < ? AND bucket_s < ?", (cutoff, cutoff, cutoff, bucket_s))})
+            for day in todo:
+                downsample_day(conn, day, bucket_s)
+                conn.execute("PRAGMA incremental_vacuum(2000)")
+                time.sleep(pause)  # släpp skrivlåset så insamlingen aldrig väntar länge
+
+def retention_scheduler():
+    while True:
+        for m in list(METERS.values()):
+            try:
+                if RETENTION_TIERS: apply_retention(m)
+                if PARTITION_MONTHLY and PARTITION_KEEP_MONTHS: drop_old_partitions(m)
+            except: swallowed("retention")
+        time.sleep(3600)
+
+# --- Lagring ---
+# All SQL mot en mätares data går via SqliteStore, som alltid tar emot insamlingen.
+# Med ANALYTICS_BACKEND = "duckdb" matas dessutom en kolumnorienterad kopia asynkront från
+# samma sampel, och långa statistikfrågor (calculate_period_stats, /api/aggregate) går dit.
+class SqliteStore:
+    def __init__(self, meter, readonly=False):
+        self.meter, self.readonly = meter, readonly
+
+    def connect(self):
+        return db_connect("file:" + quote(os.path.abspath(self.meter["db"])) + "?mode=ro" if self.readonly else self.meter["db"])
+
+    def insert(self, samples):
+        """[(tidsstämpel, rad), ...] -> p1_measurements (rätt månadsfil vid partitionering)."""
+        # En deadband-batch kan spänna över ett månadsskifte (det sparade föregående samplet
+        # skrivs tillsammans med det nya), så varje månad får sin egen fil
+        months = {}
+        for ts, r in samples: months.setdefault(ts[:7] if PARTITION_MONTHLY else None, []).append([ts] + [r[c] for c in MEASUREMENT_COLUMNS])
+        for rows in months.values():
+            with db_connect(write_path(self.meter, rows[0][0])) as conn: conn.executemany(INSERT_SQL, rows)
+
+    def points(self, start_str, end_str=None, columns=None, steps=True):
+        with self.connect() as conn: return read_points(conn, self.meter, start_str, end_str, columns, steps)
+
+    def iter_points(self, start_str, end_str, columns=None, steps=True):
+        with self.connect() as conn: yield from iter_points(conn, self.meter, start_str, end_str, columns, steps)
+
+    def day_energy(self, first, last):
+        """{datum: {kvart: kWh}} för alla UTC-dygn first..last (date-objekt)."""
+        out, d = {}, first
+        with self.connect() as conn:
+            while d <= last:
+                out[d.isoformat()] = slot_energy(conn, self.meter, *day_bounds(d))
+                d += timedelta(days=1)
+        return out
+
+    def day_power(self, first, last):
+        """{datum: (medel-W, max-W)} för alla UTC-dygn first..last. En nedsamplad hink väger som
+        de n sampel den ersatt, så medeleffekten blir densamma som före nedsamplingen."""
+        out, d = {}, first
+        with self.connect() as conn:
+            while d <= last:
+                lo, hi = day_bounds(d)
+                w = [(1, p["active_power_w"]) for p in read_points(conn, self.meter, lo, hi, ["measured_at", "active_power_w"], steps=False, rollups=False) if p["active_power_w"] is not None]
+                for db in _schemas(conn, self.meter, lo, hi):
+                    w += conn.execute(f"SELECT n, active_power_w FROM {db}.p1_rollups WHERE bucket_start >= ? AND bucket_start <= ? AND active_power_w IS NOT NULL", (lo, hi)).fetchall()
+                if w: out[d.isoformat()] = (sum(n * x for n, x in w) / sum(n for n, _ in w), max(x for _, x in w))
+                d += timedelta(days=1)
+        return out
+
+    def energy_points(self, start_str, end_str):
+        """(tid, rad, energi) i tidsordning: rådata med mätardifferens inom dygnet, hinkar med lagrad energi."""
+        cols = ["measured_at"] + MEASUREMENT_COLUMNS
+        with self.connect() as conn:
+            raw = read_points(conn, self.meter, start_str, end_str, cols, steps=False, rollups=False)
+            out, prev = [], None
+            for p in raw:
+                v1, v2 = p["total_import_kwh"], prev["total_import_kwh"] if prev and prev["measured_at"][:10] == p["measured_at"][:10] else None
+                out.append((p["measured_at"], p, v1 - v2 if v1 is not None and v2 is not None and 0 < v1 - v2 < 50 else 0.0))
+                prev = p
+            for db in _schemas(conn, self.meter, start_str, end_str):
+                cur = conn.execute(f"SELECT bucket_start, energy_kwh, n, {', '.join(MEASUREMENT_COLUMNS)} FROM {db}.p1_rollups WHERE bucket_start >= ? AND bucket_start <= ?", (start_str, end_str))
+                out += [(r[0], dict(zip(MEASUREMENT_COLUMNS, r[3:]), n=r[2]), r[1] or 0.0) for r in cur]  # n: antal sampel hinken ersätter
+        out.sort(key=operator.itemgetter(0))
+        return out
+
+    def first_timestamp(self):
+        with self.connect() as conn:
+            found = []
+            for db in _schemas(conn, self.meter, "0000", None):
+                for sql in ("SELECT MIN(measured_at) FROM {}.p1_measurements", "SELECT MIN(hour_start) FROM {}.p1_chunks", "SELECT MIN(bucket_start) FROM {}.p1_rollups"):
+                    v = conn.execute(sql.format(db)).fetchone()[0]
+                    if v: found.append(v)
+        return min(found) if found else None
+
+    def load_prices(self, ds):
+        with self.connect() as conn:
+            res = conn.execute("SELECT json_data FROM daily_prices WHERE date_str = ?", (ds,)).fetchone()
+        return json.loads(res[0]) if res else None
+
+    def save_prices(self, ds, prices):
+        with db_connect(self.meter["db"]) as conn:
+            conn.execute("INSERT OR REPLACE INTO daily_prices (date_str, json_data) VALUES (?, ?)", (ds, json.dumps(prices)))
+
+    def daily_rows(self, first, last):
+        """{datum: (kWh, kostnad, medel-W, max-W)} ur p1_daily för first..last."""
+        with self.connect() as conn:
+            return {r[0]: r[1:] for r in conn.execute("SELECT day, kwh, cost, avg_power_w, max_power_w FROM p1_daily WHERE day >= ? AND day <= ?", (first.isoformat(), last.isoformat()))}
+
+    def save_daily(self, rows):
+        """[(datum, kWh, kostnad, medel-W, max-W, byggd), ...] -> p1_daily. Dygn som redan finns behålls."""
+        with db_connect(self.meter["db"]) as conn:
+            conn.executemany("INSERT OR IGNORE INTO p1_daily (day, kwh, cost, avg_power_w, max_power_w, built_at) VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def count(self, start_str, end_str, raw=False):
+        """Antal mätpunkter i [start, end] (en per nedsamplad hink), med raw=True antal svar i rådataarkivet."""
+        if not raw: return sum(map(len, self.iter_points(start_str, end_str, ["measured_at"], steps=False)))
+        with raw_connect(self.meter) as conn:
+            return (conn.execute("SELECT SUM(n) FROM p1_raw_chunks WHERE hour_start >= ? AND hour_start <= ?", (start_str[:13], end_str)).fetchone()[0] or 0) + \
+                conn.execute("SELECT COUNT(*) FROM p1_raw WHERE measured_at >= ? AND measured_at <= ?", (start_str, end_str)).fetchone()[0]
+
+class DuckStore:
+    """Kolumnorienterad kopia av mätdatan i <db>.duckdb. Varje rad bär sitt UTC-datum, sin
+    priskvart och sin energi, så kWh och kostnad blir samma summor som SQLite-vägen ger."""
+    def __init__(self, meter, source):
+        import duckdb
+        self.meter, self.source = meter, source
+        self.path = os.path.splitext(meter["db"])[0] + ".duckdb"
+        self.con = duckdb.connect(self.path)
+        schema = f"samples (measured_at VARCHAR, utc_day DATE, price_key VARCHAR, energy_kwh DOUBLE, {', '.join(c + ' DOUBLE' for c in MEASUREMENT_COLUMNS)}, n DOUBLE)"
+        self.con.execute(f"CREATE TABLE IF NOT EXISTS {schema}")
+        if "n" not in {r[0] for r in self.con.execute("DESCRIBE samples").fetchall()}:  # äldre kopia utan vikter: byggs om
+            self.con.execute("DROP TABLE samples")
+            self.con.execute(f"CREATE TABLE {schema}")
+        self.q = queue.Queue(maxsize=100000)
+        self.ready, self._last, self._keys = False, None, {}
+
+    def feed(self, ts, row):
+        try: self.q.put_nowait((ts, row))
+        except queue.Full: self.ready = False  # ikapp-läsningen tar hand om luckan
+
+    def _append(self, con, items):
+        # DuckDB:s parameterbindning från Python är långsam; en CSV-batch via read_csv är snabb
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", newline="", delete=False) as f:
+            w = csv.writer(f)
+            for ts, row, e in items: w.writerow([ts, ts[:10], ts_price_key(ts, self._keys), e] + [row[c] for c in MEASUREMENT_COLUMNS] + [row.get("n") or 1])
+        try:
+            types = ", ".join(f"'{c}': 'DOUBLE'" for c in ["energy_kwh"] + MEASUREMENT_COLUMNS + ["n"])
+            con.execute(f"INSERT INTO samples SELECT * FROM read_csv('{f.name}', header=false, columns={{'measured_at': 'VARCHAR', 'utc_day': 'DATE', 'price_key': 'VARCHAR', {types}}})")
+        finally:
+            os.remove(f.name)
+
+    def catch_up(self):
+        """Läser in allt som saknas från SQLite, ett dygn i taget; senaste dygnet läses om helt."""
+        con = self.con.cursor()
+        last = con.execute("SELECT MAX(measured_at) FROM samples").fetchone()[0] or self.source.first_timestamp()
+        if not last: return None
+        day, today = date.fromisoformat(last[:10]), datetime.now(timezone.utc).date()
+        con.execute("DELETE FROM samples WHERE utc_day >= ?", (day,))
+        while day <= today:
+            items = self.source.energy_points(*day_bounds(day))
+            if items: self._append(con, items)
+            day += timedelta(days=1)
+        last = con.execute("SELECT MAX(measured_at), arg_max(total_import_kwh, measured_at) FROM samples").fetchone()
+        self._last = last if last[0] else None
+        return self._last and self._last[0]
+
+    def run(self):
+        while True:
+            try:
+                upto = self.catch_up()
+                self.ready = True
+                con = self.con.cursor()
+                while self.ready:
+                    items = [self.q.get()]
+                    time.sleep(1)  # samla ihop det som hinner komma
+                    while not self.q.empty() and len(items) < 10000: items.append(self.q.get_nowait())
+                    batch = []
+                    for ts, row in items:
+                        if upto and ts <= upto: continue
+                        v1, prev = row["total_import_kwh"], self._last
+                        v2 = prev[1] if prev and prev[0][:10] == ts[:10] else None
+                        batch.append((ts, row, v1 - v2 if v1 is not None and v2 is not None and 0 < v1 - v2 < 50 else 0.0))
+                        self._last = (ts, v1)
+                    if batch: self._append(con, batch)
+            except:
+                self.ready = False
+                swallowed("analytics")
+            time.sleep(10)
+
+    def day_energy(self, first, last):
+        out = {}
+        for d, k, e in self.con.cursor().execute("SELECT utc_day, price_key, SUM(energy_kwh) FROM samples WHERE utc_day BETWEEN ? AND ? GROUP BY ALL", (first, last)).fetchall():
+            out.setdefault(d.isoformat(), {})[k] = e
+        return out
+
+    def day_power(self, first, last):
+        rows = self.con.cursor().execute("SELECT utc_day, SUM(n * active_power_w) / SUM(n), MAX(active_power_w) FROM samples WHERE utc_day BETWEEN ? AND ? AND active_power_w IS NOT NULL GROUP BY ALL", (first, last)).fetchall()
+        return {d.isoformat(): (a, m) for d, a, m in rows}
+
+    # p1_daily och rådataarkivet finns bara i SQLite
+    def daily_rows(self, first, last): return self.source.daily_rows(first, last)
+    def save_daily(self, rows): self.source.save_daily(rows)
+
+    def count(self, start_str, end_str, raw=False):
+        if raw: return self.source.count(start_str, end_str, raw=True)
+        return self.con.cursor().execute("SELECT COUNT(*) FROM samples WHERE measured_at >= ? AND measured_at <= ?", (start_str, end_str)).fetchone()[0]
+
+_stores, analytics = {}, {}
+
+def store(meter):
+    st = _stores.get(meter["id"])
+    if st is None: st = _stores[meter["id"]] = SqliteStore(meter)
+    return st
+
+def stats_store(meter, days):
+    """Lagret som ska svara på en statistikfråga över `days` dygn."""
+    a = analytics.get(meter["id"])
+    return a if a is not None and a.ready and days >= ANALYTICS_MIN_DAYS else store(meter)
+
+def start_analytics():
+    if ANALYTICS_BACKEND != "duckdb": return
+    for m in list(METERS.values()):
+        a = analytics[m["id"]] = DuckStore(m, store(m))
+        threading.Thread(target=a.run, daemon=True).start()
 
 # --- Elpris-motor ---
-def get_prices_for_date(date_obj):
-    ds = date_obj.strftime('%Y-%m-%d')
-    with sqlite3.connect(DB_PATH) as conn:
-        res = conn.execute("SELECT json_data FROM daily_prices WHERE date_str = ?", (ds,)).fetchone()
-        if res:
-            p_data = json.loads(res[0])
-            if len(p_data) >= 96: return p_data
+def get_prices_for_date(date_obj, meter=None):
+    meter = meter or METERS[DEFAULT_METER]
+    area, ds = meter["elomrade"], date_obj.strftime('%Y-%m-%d')
+    if (area, ds) in price_cache:
+        count("p1_price_fetch_total", source="cache", outcome="ok")
+        return price_cache[(area, ds)]
+    p_data = store(meter).load_prices(ds)
+    if p_data and len(p_data) >= 96:
+        count("p1_price_fetch_total", source="db", outcome="ok")
+        price_cache[(area, ds)] = p_data
+        return p_data
     try:
-        url = f"https://www.elprisetjustnu.se/api/v1/prices/{date_obj.year}/{date_obj.strftime('%m-%d')}_{ELOMRADE}.json"
+        import requests  # först här: requests och urllib3 tar en bra stund att importera på en Pi
+        url = PRICE_API_URL.format(year=date_obj.year, month_day=date_obj.strftime('%m-%d'), area=area)
         r = requests.get(url, timeout=10)
         if r.status_code == 200:
             raw_data = r.json()
@@ -58,131 +952,1005 @@ def get_prices_for_date(date_obj):
                     h = h_key.split(':')[0]
                     for m in ["00", "15", "30", "45"]: new_p[f"{h}:{m}"] = val
                 prices = new_p
-            with sqlite3.connect(DB_PATH) as conn:
-                conn.execute("INSERT OR REPLACE INTO daily_prices (date_str, json_data) VALUES (?, ?)", (ds, json.dumps(prices)))
+            store(meter).save_prices(ds, prices)
+            if len(prices) >= 96: price_cache[(area, ds)] = prices
+            count("p1_price_fetch_total", source="api", outcome="ok")
             return prices
-    except: pass
+        count("p1_price_fetch_total", source="api", outcome=f"http_{r.status_code}")
+    except:
+        count("p1_price_fetch_total", source="api", outcome="error")
+        swallowed("price_fetch")
     return {}
 
 def elpris_scheduler():
     global current_prices
     while True:
-        try: current_prices = get_prices_for_date(datetime.now())
-        except: pass
+        areas = {}
+        for m in list(METERS.values()): areas.setdefault(m["elomrade"], m)
+        for area, m in areas.items():
+            try: current_prices = {**current_prices, area: get_prices_for_date(datetime.now(), m)}
+            except: swallowed("elpris_scheduler")
         time.sleep(3600)
 
-def calculate_period_stats(start_dt, end_dt):
-    total_cost, total_kwh = 0.0, 0.0
-    curr = start_dt.replace(hour=0, minute=0, second=0)
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        while curr <= end_dt:
-            prices = get_prices_for_date(curr)
-            ds, de = curr.strftime('%Y-%m-%dT00:00:00Z'), curr.strftime('%Y-%m-%dT23:59:59Z')
-            rows = conn.execute("SELECT measured_at, total_import_kwh FROM p1_measurements WHERE measured_at BETWEEN ? AND ? ORDER BY measured_at ASC", (ds, de)).fetchall()
-            for i in range(1, len(rows)):
-                v1, v2 = rows[i]['total_import_kwh'], rows[i-1]['total_import_kwh']
-                if v1 is not None and v2 is not None:
-                    diff = v1 - v2
-                    if 0 < diff < 50:
-                        dt = datetime.fromisoformat(rows[i]['measured_at'].replace("Z", "+00:00")).astimezone()
-                        total_cost += diff * prices.get(get_price_key(dt), 0)
-                        total_kwh += diff
-            curr += timedelta(days=1)
-    return round(total_cost, 2), round(total_kwh, 2)
-
-app = Flask(__name__)
-sock = Sock(app)
-subscribers = set()
+def calculate_period_stats(start_dt, end_dt, meter=None, unsettled=None):
+    meter = meter or METERS[DEFAULT_METER]
+    days = daily_totals(meter, start_dt.date(), end_dt.date(), power=False, unsettled=unsettled).values()
+    return round(sum(d[1] for d in days), 2), round(sum(d[0] for d in days), 2)
+
+# --- Dygnssammanfattningar ---
+# p1_daily håller kWh, kostnad och medel-/maxeffekt per avslutat UTC-dygn. Ett avslutat dygn med
+# kompletta priser sparas första gången det räknas (av uppstarten eller en fråga); p1-rebuild.py
+# bygger om tabellen, t.ex. efter rättade priser. Övriga dygn räknas direkt från mätdatan.
+def last_closed_day():
+    """Senaste avslutade UTC-dygnet, med marginal för ett sampel som är på väg in."""
+    return (datetime.now(timezone.utc) - timedelta(seconds=2 * POLL_INTERVAL)).date() - timedelta(days=1)
+
+def save_closed_days(meter, first, last):
+    """Sparar avslutade dygn first..last som saknas i p1_daily, om dygnets priser är kompletta.
+    Priskorrigeringar går via p1-rebuild.py eller /admin/invalidate."""
+    have = store(meter).daily_rows(first, last)
+    todo = [d for d in (first + timedelta(days=i) for i in range((last - first).days + 1)) if d.isoformat() not in have]
+    if not todo: return 0
+    def prices(ds): return get_prices_for_date(date.fromisoformat(ds), meter)
+    days = summarize_days(stats_store(meter, (todo[-1] - todo[0]).days + 1), todo[0], todo[-1], prices)
+    now = to_utc_str(datetime.now(timezone.utc))
+    # Dygn utan sampel sparas inte: en nolla i p1_daily skulle gå före data som importeras senare.
+    # Priserna slås bara upp för dygn med data, så långa tomma intervall inte ger prisanrop
+    rows = [(ds, *v, now) for ds, v in days.items() if ds not in have and v[2] is not None and len(prices(ds)) >= 96]
+    store(meter).save_daily(rows)
+    return len(rows)
+
+def summarize_days(st, first, last, prices_for, power=True):
+    """{datum: (kWh, kostnad, medel-W, max-W)} räknat från lagret st."""
+    energy, pw = st.day_energy(first, last), st.day_power(first, last) if power else {}
+    out = {}
+    for ds in sorted(set(energy) | set(pw)):
+        prices, slots = prices_for(ds), energy.get(ds, {})
+        out[ds] = (sum(slots.values()), sum(kwh * prices.get(pk, 0) for pk, kwh in slots.items())) + pw.get(ds, (None, None))
+    return out
+
+def daily_totals(meter, first, last, power=True, unsettled=None):
+    """{datum: (kWh, kostnad, medel-W, max-W)}. Avslutade dygn sparas först i p1_daily (save_closed_days).
+    Dygn med data som ändå räknats direkt, pågående eller utan kompletta priser, läggs i mängden
+    unsettled: deras kostnad är inte slutgiltig, så svar som bygger på dem ska inte cachas länge."""
+    closed = min(last, last_closed_day())
+    if first <= closed: save_closed_days(meter, first, closed)
+    out = store(meter).daily_rows(first, last)
+    missing = [first + timedelta(days=i) for i in range((last - first).days + 1) if (first + timedelta(days=i)).isoformat() not in out]
+    if missing:
+        st = stats_store(meter, (missing[-1] - missing[0]).days + 1)
+        for ds, v in summarize_days(st, missing[0], missing[-1], lambda ds: get_prices_for_date(date.fromisoformat(ds), meter), power).items():
+            if ds in out: continue
+            out[ds] = v
+            if unsettled is not None and (v[0] or v[2] is not None): unsettled.add(ds)
+    return dict(sorted(out.items()))
+
+app = Flask(__name__, static_folder=None)  # /static/ hanteras nedan, med innehållshashar
+
+def ws_route_lazy(path):
+    """Som flask_socks @sock.route, men flask_sock och simple_websocket importeras först vid
+    första WebSocket-anslutningen i stället för vid uppstart."""
+    def decorator(f):
+        view = []
+        def route(*args, **kwargs):
+            if not view:
+                from flask_sock import Sock
+                class Capture:  # Sock.route registrerar vyn på bp; här behålls den bara
+                    def route(self, path, **kw): return view.append
+                Sock().route(path, bp=Capture())(f)
+            return view[0](*args, **kwargs)
+        return app.route(path, websocket=True, endpoint=f.__name__)(route)
+    return decorator
+subscribers = {}  # mätar-id -> set av köer
+# De senaste livesamplen per mätare, så att en klient som tappat anslutningen kan ta igen luckan
+WS_REPLAY_SAMPLES = 360
+recent, _evicted = {}, {}  # mätar-id -> deque, mätar-id -> tid för senast bortputtade sampel
+_pub_lock = threading.Lock()
+
+def publish(meter_id, p):
+    with _pub_lock:
+        buf = recent.setdefault(meter_id, deque(maxlen=WS_REPLAY_SAMPLES))
+        if len(buf) == buf.maxlen: _evicted[meter_id] = buf[0]["measured_at"]
+        buf.append(p)
+        subs = list(subscribers.get(meter_id, ()))
+    for q in subs:
+        try: q.put_nowait(p)
+        except queue.Full: count("p1_fanout_dropped_total", meter=meter_id)
+
+def subscribe(meter_id, q, since=None):
+    """Registrerar kön och returnerar (missade sampel efter since, om luckan är större än bufferten)."""
+    with _pub_lock:
+        subscribers.setdefault(meter_id, set()).add(q)
+        if since is None: return [], False
+        buf = recent.get(meter_id, ())
+        # bufferten är komplett från sitt äldsta sampel; vad som låg före det vet vi bara om något puttats ut
+        floor = _evicted.get(meter_id) or (buf[0]["measured_at"] if buf else None)
+        return [p for p in buf if p["measured_at"] > since], floor is None or since < floor
+_poll_local = threading.local()
+
+# --- DSMR-telegram ---
+# Bara de OBIS-koder vi lagrar finns i mönstret, så övriga rader hoppas över direkt av regex-motorn.
+TELEGRAM_OBIS = {
+    b"1-0:1.8.0": "import", b"1-0:1.8.1": "import_t1", b"1-0:1.8.2": "import_t2",
+    b"1-0:2.8.0": "export", b"1-0:2.8.1": "export_t1", b"1-0:2.8.2": "export_t2",
+    b"0-0:96.14.0": "tariff", b"1-0:1.7.0": "power_in_kw", b"1-0:2.7.0": "power_out_kw",
+    b"1-0:32.7.0": "v1", b"1-0:52.7.0": "v2", b"1-0:72.7.0": "v3",
+    b"1-0:31.7.0": "c1", b"1-0:51.7.0": "c2", b"1-0:71.7.0": "c3",
+    b"1-0:21.7.0": "p1_in", b"1-0:41.7.0": "p2_in", b"1-0:61.7.0": "p3_in",
+    b"1-0:22.7.0": "p1_out", b"1-0:42.7.0": "p2_out", b"1-0:62.7.0": "p3_out",
+}
+_TELEGRAM_RE = re.compile(rb"\n(" + b"|".join(re.escape(k) for k in TELEGRAM_OBIS) + rb")\((-?[0-9.]+)")
+
+def _crc16_table():
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8): crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+_CRC16 = _crc16_table()
+_CRC16_WIDE = None  # 64k-tabell som tar två byte per uppslag, byggs vid första anropet
+
+def crc16(data):
+    """CRC-16/ARC (poly 0xA001) enligt DSMR, över allt från '/' till och med '!'."""
+    global _CRC16_WIDE
+    if _CRC16_WIDE is None:
+        t = _CRC16
+        _CRC16_WIDE = [(r >> 8) ^ t[r & 0xFF] for r in ((x >> 8) ^ t[x & 0xFF] for x in range(65536))]
+    wide, crc, n = _CRC16_WIDE, 0, len(data) & ~1
+    words = array("H", data[:n])
+    if sys.byteorder == "big": words.byteswap()
+    for w in words: crc = wide[crc ^ w]
+    if n < len(data): crc = (crc >> 8) ^ _CRC16[(crc ^ data[-1]) & 0xFF]
+    return crc
+
+def parse_telegram(raw):
+    """Rått DSMR-telegram (bytes) -> kolumnvärden. CRC:n kontrolleras om telegrammet har en (DSMR 4+)."""
+    start, end = raw.find(b"/"), raw.rfind(b"!")
+    if start < 0 or end < start: raise ValueError("Ofullständigt telegram")
+    crc = raw[end + 1:end + 5].strip()
+    if crc and int(crc, 16) != crc16(raw[start:end + 1]): raise ValueError("CRC-fel i telegram")
+    v = {TELEGRAM_OBIS[k]: float(x) for k, x in _TELEGRAM_RE.findall(raw, start, end)}
+    def pair(a, b): return round(v[a] + v.get(b, 0.0), 3) if a in v else None
+    def net_w(a, b): return round((v[a] - v.get(b, 0.0)) * 1000) if a in v else None
+    tariff = v.get("tariff")
+    return {
+        "active_power_w": net_w("power_in_kw", "power_out_kw"),
+        "total_import_kwh": v["import"] if "import" in v else pair("import_t1", "import_t2"),
+        "voltage_l1_v": v.get("v1"), "voltage_l2_v": v.get("v2"), "voltage_l3_v": v.get("v3"),
+        "active_current_l1_a": v.get("c1"), "active_current_l2_a": v.get("c2"), "active_current_l3_a": v.get("c3"),
+        "total_export_kwh": v["export"] if "export" in v else pair("export_t1", "export_t2"),
+        "active_tariff": int(tariff) if tariff is not None else None,
+        "active_power_l1_w": net_w("p1_in", "p1_out"), "active_power_l2_w": net_w("p2_in", "p2_out"), "active_power_l3_w": net_w("p3_in", "p3_out"),
+    }
+
+def parse_json_data(r):
+    return {
+        "active_power_w": r.get("active_power_w", 0), "total_import_kwh": r.get("total_power_import_kwh") or r.get("total_import_kwh"),
+        "voltage_l1_v": r.get("active_voltage_l1_v", 0), "voltage_l2_v": r.get("active_voltage_l2_v", 0), "voltage_l3_v": r.get("active_voltage_l3_v", 0),
+        "active_current_l1_a": r.get("active_current_l1_a", 0), "active_current_l2_a": r.get("active_current_l2_a", 0), "active_current_l3_a": r.get("active_current_l3_a", 0),
+        "total_export_kwh": r.get("total_power_export_kwh"), "active_tariff": r.get("active_tariff"),
+        "active_power_l1_w": r.get("active_power_l1_w"), "active_power_l2_w": r.get("active_power_l2_w"), "active_power_l3_w": r.get("active_power_l3_w"),
+    }
+
+def poll_meter(meter):
+    try:
+        session = getattr(_poll_local, "session", None)
+        if session is None:
+            import requests
+            session = _poll_local.session = requests.Session()
+        t0 = time.perf_counter()
+        r = session.get(f"http://{meter['ip']}/api/v1/{'telegram' if meter['mode'] == 'telegram' else 'data'}", timeout=5)
+        r.raise_for_status()  # ett felsvar får inte sparas som en rad med nollor
+        raw = {"telegram": r.content.decode("latin-1")} if meter["mode"] == "telegram" else r.json()
+        row = parse_raw(raw)
+        observe("p1_poll_seconds", time.perf_counter() - t0, meter=meter["id"])
+        now_dt = datetime.now(timezone.utc)
+        now_str = now_dt.isoformat().replace("+00:00", "Z")
+        if ARCHIVE_RAW:
+            try: archive_raw(meter, now_str, raw)
+            except: swallowed("archive")
+        ingest(meter, now_dt, now_str, row)
+    except: swallowed("poll")
+
+def parse_raw(raw):
+    return parse_telegram(raw["telegram"].encode("latin-1")) if "telegram" in raw else parse_json_data(raw)
+
+def ingest(meter, now_dt, now_str, row):
+    """Ett tolkat sampel -> lagring, analyskopia och liveklienter. Används av insamlingen och uppspelningen."""
+    t1 = time.perf_counter()
+    to_store = deadband_filter(meter["id"], now_dt, now_str, row) if STORAGE_MODE == "deadband" else [(now_str, row)]
+    if to_store:
+        store(meter).insert(to_store)
+        observe("p1_insert_seconds", time.perf_counter() - t1, meter=meter["id"])
+    if meter["id"] in analytics: analytics[meter["id"]].feed(now_str, row)
+    invalidate(meter["id"])
+    c1, c2, c3 = row["active_current_l1_a"] or 0, row["active_current_l2_a"] or 0, row["active_current_l3_a"] or 0
+    p = {"meter_id": meter["id"], "measured_at": now_str, "active_power_w": row["active_power_w"], "voltage_l1_v": row["voltage_l1_v"], "voltage_l2_v": row["voltage_l2_v"], "voltage_l3_v": row["voltage_l3_v"], "active_current_l1_a": c1, "active_current_l2_a": c2, "active_current_l3_a": c3, "total_current_a": sum([c1, c2, c3]), "price_sek_kwh": current_prices.get(meter["elomrade"], {}).get(get_price_key(datetime.now()), 0)}
+    t2 = time.perf_counter()
+    publish(meter["id"], p)
+    observe("p1_fanout_seconds", time.perf_counter() - t2, meter=meter["id"])
 
 def collector_loop():
+    # En gemensam, begränsad trådpool pollar alla mätare; en mätare som fortfarande
+    # väntar på svar hoppas över i nästa varv i stället för att köas på hög.
+    pool = ThreadPoolExecutor(max_workers=max(1, min(POLL_WORKERS, len(METERS))), thread_name_prefix="p1-poll")
+    busy, lock = set(), threading.Lock()
+    def done(mid):
+        with lock: busy.discard(mid)
     while True:
-        try:
-            r = requests.get(f"http://{P1_IP}/api/v1/data", timeout=5).json()
-            now_dt = datetime.now(timezone.utc)
-            now_str = now_dt.isoformat().replace("+00:00", "Z")
-            v1, v2, v3 = r.get("active_voltage_l1_v", 0), r.get("active_voltage_l2_v", 0), r.get("active_voltage_l3_v", 0)
-            c1, c2, c3 = r.get("active_current_l1_a", 0), r.get("active_current_l2_a", 0), r.get("active_current_l3_a", 0)
-            vals = [now_str, r.get("active_power_w", 0), r.get("total_power_import_kwh") or r.get("total_import_kwh"), v1, v2, v3, c1, c2, c3]
-            with sqlite3.connect(DB_PATH) as conn:
-                conn.execute("INSERT INTO p1_measurements (measured_at, active_power_w, total_import_kwh, voltage_l1_v, voltage_l2_v, voltage_l3_v, active_current_l1_a, active_current_l2_a, active_current_l3_a) VALUES (?,?,?,?,?,?,?,?,?)", vals)
-            p = {"measured_at": now_str, "active_power_w": vals[1], "voltage_l1_v": v1, "voltage_l2_v": v2, "voltage_l3_v": v3, "active_current_l1_a": c1, "active_current_l2_a": c2, "active_current_l3_a": c3, "total_current_a": sum([c1, c2, c3]), "price_sek_kwh": current_prices.get(get_price_key(datetime.now()), 0)}
-            for q in list(subscribers): q.put_nowait(p)
-        except: pass
-        time.sleep(10)
+        t0 = time.monotonic()
+        for m in list(METERS.values()):
+            with lock:
+                if m["id"] in busy: continue
+                busy.add(m["id"])
+            pool.submit(poll_meter, m).add_done_callback(lambda f, mid=m["id"]: done(mid))
+        time.sleep(max(0.0, POLL_INTERVAL - (time.monotonic() - t0)))
+
+# --- HTTP-cache ---
+# JSON-svar får en ETag (hash av kroppen) och komprimeras enligt Accept-Encoding. Svar för
+# avslutade perioder ändras inte och cachas länge, både i webbläsaren och här som färdiga
+# bytes per kodning. Packning, gallring och borttagna partitioner ändrar gamla dygn, så
+# cachetiden räcker bara fram till nästa sådan gräns.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODERS = {"gzip": lambda b: gzip.compress(b, 6)}
+if brotli: ENCODERS["br"] = lambda b: brotli.compress(b, quality=5)
+YEAR_S = 365 * 86400
+BODY_CACHE_MAX = 256
+_bodies = {}  # nyckel -> {"etag", "expires", "data": {kodning: bytes}}
+
+def closed_ttl(last_day):
+    """Sekunder som data t.o.m. UTC-dygnet last_day är oförändrad, None om dygnet pågår."""
+    now, end = datetime.now(timezone.utc), datetime(last_day.year, last_day.month, last_day.day, tzinfo=timezone.utc) + timedelta(days=1)
+    if now < end + timedelta(seconds=2 * POLL_INTERVAL): return None
+    horizons = [CHUNK_AFTER_DAYS] + [days for days, _ in RETENTION_TIERS] + [PARTITION_KEEP_MONTHS and PARTITION_KEEP_MONTHS * 28]
+    ahead = [end + timedelta(days=h) for h in horizons if h and end + timedelta(days=h) > now]
+    return min(int((min(ahead) - now).total_seconds()), YEAR_S) if ahead else YEAR_S
+
+def _encoding():
+    accept = request.accept_encodings
+    return next((e for e in ("br", "gzip") if e in ENCODERS and accept[e]), "identity")
+
+def _send(entry, ttl):
+    data = entry["data"]
+    enc = _encoding() if len(data["identity"]) >= 1024 else "identity"  # små svar är inte värda att komprimera
+    body = data.get(enc)
+    if body is None: body = data[enc] = ENCODERS[enc](data["identity"])
+    etag = entry["etag"] + ("" if enc == "identity" else "-" + enc)
+    # Svag jämförelse: proxyer och komprimeringslager gör ofta om en stark ETag till W/"…"
+    if any(request.if_none_match.contains_weak(entry["etag"] + sfx) for sfx in ("", "-br", "-gzip")):
+        resp = Response(status=304)
+    else:
+        resp = Response(body, mimetype=entry.get("mimetype", "application/json"))
+        if enc != "identity": resp.headers["Content-Encoding"] = enc
+    resp.headers["ETag"] = f'"{etag}"'
+    resp.headers["Vary"] = "Accept-Encoding"
+    # immutable följer postens ursprungliga ttl; cacheträffar skickar bara den återstående tiden
+    resp.headers["Cache-Control"] = f"public, max-age={ttl}" + (", immutable" if (entry["ttl"] or 0) >= YEAR_S else "") if ttl else f"max-age={POLL_INTERVAL}, must-revalidate"
+    return resp
+
+def cached_json(key):
+    """Färdigt svar ur cachen för en avslutad period, annars None."""
+    entry = _bodies.get(key) if key else None
+    if entry and entry["expires"] > time.time():
+        cache_stats["http_hit"] += 1
+        return _send(entry, int(entry["expires"] - time.time()))
+    return None
+
+def json_entry(payload, ttl=None):
+    """ttl: sekunder som svaret gäller (avslutad period), None för pågående data."""
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    return {"etag": hashlib.blake2b(body, digest_size=12).hexdigest(), "ttl": ttl, "expires": time.time() + (ttl or 0), "data": {"identity": body}}
+
+def send_entry(entry, key=None):
+    if key and entry["ttl"]:
+        if len(_bodies) >= BODY_CACHE_MAX: _bodies.pop(next(iter(_bodies)))
+        _bodies[key] = entry
+    return _send(entry, entry["ttl"])
+
+def json_response(payload, ttl=None, key=None):
+    return send_entry(json_entry(payload, ttl), key)
+
+# --- Delade beräkningar ---
+# Samtidiga identiska anrop (alla skärmar som laddar om efter en omstart) delar en beräkning,
+# och resultatet återanvänds i RESULT_TTL sekunder eller tills mätaren fått ett nytt sampel.
+RESULT_TTL = 30
+RESULT_CACHE_MAX = 64
+cache_stats = {"hit": 0, "miss": 0, "shared": 0, "http_hit": 0}
+_results, _inflight, _generation = {}, {}, {}  # nyckel -> (tid, generation, värde), nyckel -> anrop, mätare -> generation
+_flight_lock = threading.Lock()
+
+def invalidate(meter_id):
+    with _flight_lock: _generation[meter_id] = _generation.get(meter_id, 0) + 1
+
+def single_flight(key, meter_id, fn):
+    with _flight_lock:
+        gen = _generation.get(meter_id, 0)
+        hit = _results.get(key)
+        if hit and hit[1] == gen and time.monotonic() - hit[0] < RESULT_TTL:
+            cache_stats["hit"] += 1
+            return hit[2]
+        call = _inflight.get(key)
+        leader = call is None
+        if leader: call = _inflight[key] = {"done": threading.Event()}
+        cache_stats["miss" if leader else "shared"] += 1
+    if not leader:
+        call["done"].wait()
+        if "error" in call: raise call["error"]
+        return call["value"]
+    try:
+        call["value"] = fn()
+        with _flight_lock:
+            if len(_results) >= RESULT_CACHE_MAX: _results.pop(next(iter(_results)))
+            _results[key] = (time.monotonic(), gen, call["value"])
+        return call["value"]
+    except Exception as e:
+        call["error"] = e
+        raise
+    finally:
+        with _flight_lock: _inflight.pop(key, None)
+        call["done"].set()
+
+def find_meter(mid): return METERS.get(mid) or replay_meters.get(mid)
+
+def meter_arg():
+    meter = find_meter(request.args.get("meter") or DEFAULT_METER)
+    if meter is None: abort(404)
+    return meter
+
+def since_arg():
+    """since= är en tidsstämpel, i praktiken "cursor" från förra svaret. Bara nyare punkter skickas."""
+    since = request.args.get("since") or None
+    if since:
+        try: parse_utc(since)
+        except ValueError: abort(400)
+    return since
+
+def points_since(meter, start_str, end_str, since):
+    lo = start_str
+    if since:
+        # i deadband-läget behövs sampel före since för att stegfyllnaden ska bli densamma
+        back = timedelta(seconds=HEARTBEAT_S + POLL_INTERVAL) if STORAGE_MODE == "deadband" else timedelta(0)
+        lo = max(start_str, to_utc_str(parse_utc(since) - back))
+    pts = store(meter).points(lo, end_str)
+    if since:
+        i = 0
+        while i < len(pts) and pts[i]["measured_at"] <= since: i += 1
+        pts = pts[i:]
+    return pts
+
+# --- Statiska filer ---
+# Dashboarden är ett HTML-skal (INDEX_HTML) plus filerna i static/. Vid första behovet (eller
+# i warmup()) läses filerna in, får innehållshashen i namnet (app.3f2a9c1e0b.js) och komprimeras
+# en gång med gzip och brotli på högsta nivå. Hashade namn ändras aldrig och cachas som immutable;
+# skalet byggs om med de namnen och serveras ur minnet. Biblioteken i static/vendor hämtas med
+# p1-assets.py, och de som saknas laddas från CDN:en som förut.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+VENDOR_ASSETS = {  # fil i static/vendor -> pinnad CDN-adress
+    "chart.js": "https://cdn.jsdelivr.net/npm/chart.js@4.4.1",
+    "date-fns.js": "https://cdn.jsdelivr.net/npm/date-fns@3.6.0",
+    "chartjs-adapter-date-fns.js": "https://cdn.jsdelivr.net/npm/chartjs-adapter-date-fns@3.0.0",
+    "chartjs-plugin-zoom.js": "https://cdn.jsdelivr.net/npm/chartjs-plugin-zoom@2.0.1",
+}
+_built, _built_lock = [], threading.Lock()  # [(hashat eller okänt namn -> post, skalets post)]
+
+def asset_entry(body, etag, ttl, mimetype):
+    data = {"identity": body, "gzip": gzip.compress(body, 9)}
+    if brotli: data["br"] = brotli.compress(body, quality=11)
+    return {"etag": etag, "ttl": ttl, "expires": 0, "data": data, "mimetype": mimetype}
+
+def build_assets():
+    with _built_lock:
+        if _built: return _built[0]
+        assets, urls = {}, {}
+        for root, _, files in os.walk(STATIC_DIR):
+            for fn in sorted(files):
+                if fn.startswith("."): continue
+                path = os.path.join(root, fn)
+                rel = os.path.relpath(path, STATIC_DIR).replace(os.sep, "/")
+                with open(path, "rb") as f: body = f.read()
+                h = hashlib.blake2b(body, digest_size=5).hexdigest()
+                stem, ext = os.path.splitext(rel)
+                entry = asset_entry(body, h, YEAR_S, mimetypes.guess_type(fn)[0] or "application/octet-stream")
+                assets[f"{stem}.{h}{ext}"] = entry
+                assets[rel] = dict(entry, ttl=None)  # ohashat namn: kort cache, för handskrivna länkar
+                urls[f"/static/{rel}"] = f"/static/{stem}.{h}{ext}"
+        for fn, cdn in VENDOR_ASSETS.items(): urls.setdefault(f"/static/vendor/{fn}", cdn)
+        html = re.sub(r'(src|href)="(/static/[^"]+)"', lambda m: f'{m[1]}="{urls.get(m[2], m[2])}"', INDEX_HTML).encode()
+        _built.append((assets, asset_entry(html, hashlib.blake2b(html, digest_size=12).hexdigest(), None, "text/html")))
+        return _built[0]
 
 @app.route("/")
-def index(): return render_template_string(INDEX_HTML)
+def index(): return _send(build_assets()[1], None)
+
+@app.route("/static/<path:name>")
+def static_file(name):
+    entry = build_assets()[0].get(name)
+    if entry is None: abort(404)
+    return _send(entry, entry["ttl"])
+
+@app.route("/api/meters")
+def api_meters():
+    return json_response({"default": DEFAULT_METER, "meters": [{"id": m["id"], "elomrade": m["elomrade"]} for m in list(METERS.values())]})
+
+# --- Uppstart ---
+# Första sidladdningen efter en omstart ska inte betala för kalla prisuppslag och en genomräkning
+# av hela månaden. warmup() bygger de statiska filerna, hämtar månadens priser och sparar
+# sammanfattningar för månadens avslutade dygn i p1_daily. Priser och sammanfattningar görs om
+# varje timme, så att nyss avslutade dygn kommer med.
+# /healthz svarar så fort servern lyssnar, /readyz med 200 först när första varvet är klart.
+WARMUP_INTERVAL = 3600
+started = time.monotonic()
+ready = threading.Event()
+warm_status = {}  # mätar-id -> {"prices": dygn med kompletta priser, "saved_days": nya dygn i p1_daily, "seconds": tid}
+
+def warm_meter(m):
+    """Ett uppvärmningsvarv för en mätare: månadens priser och avslutade dygn i p1_daily."""
+    t0 = time.perf_counter()
+    # Det avslutade dygnets månad, så att även månadens sista dygn sparas den 1:a
+    closed = last_closed_day()
+    first = closed.replace(day=1)
+    prices = sum(len(get_prices_for_date(first + timedelta(days=i), m)) >= 96 for i in range((closed - first).days + 2))
+    saved = save_closed_days(m, first, closed)
+    warm_status[m["id"]] = {"prices": prices, "saved_days": saved, "seconds": round(time.perf_counter() - t0, 3)}
+
+def warmup():
+    try: build_assets()
+    except: swallowed("assets")
+    while True:
+        for m in list(METERS.values()):
+            try: warm_meter(m)
+            except: swallowed("warmup")
+        ready.set()
+        time.sleep(WARMUP_INTERVAL)
+
+@app.route("/healthz")
+def healthz():
+    resp = json_response({"status": "ok", "uptime_s": round(time.monotonic() - started, 1)})
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+@app.route("/readyz")
+def readyz():
+    resp = json_response({"ready": ready.is_set(), "uptime_s": round(time.monotonic() - started, 1), "warmup": warm_status})
+    resp.headers["Cache-Control"] = "no-store"
+    if not ready.is_set(): resp.status_code = 503
+    return resp
+
+@app.before_request
+def _request_start():
+    g.t0 = time.perf_counter()
+    if PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        _profiled[threading.get_ident()] = request.url_rule.rule if request.url_rule else "other"
+
+@app.after_request
+def _request_done(resp):
+    _profiled.pop(threading.get_ident(), None)
+    ep = request.url_rule.rule if request.url_rule else "other"
+    observe("http_request_seconds", time.perf_counter() - g.t0, endpoint=ep)
+    if not resp.is_streamed: observe("http_response_bytes", resp.content_length or 0, SIZE_BUCKETS, endpoint=ep)
+    return resp
+
+@app.route("/metrics")
+def metrics():
+    with _pub_lock: subs = {mid: list(qs) for mid, qs in subscribers.items()}
+    extra = [
+        ("p1_subscribers", "gauge", "Anslutna live-klienter (WebSocket och SSE)", [({"meter": mid}, len(qs)) for mid, qs in subs.items()]),
+        ("p1_queue_depth_max", "gauge", "Största antal väntande sampel i en klients kö", [({"meter": mid}, max((q.qsize() for q in qs), default=0)) for mid, qs in subs.items()]),
+        ("p1_queue_depth_sum", "gauge", "Väntande sampel i alla klienters köer", [({"meter": mid}, sum(q.qsize() for q in qs)) for mid, qs in subs.items()]),
+        ("p1_replay_buffer_samples", "gauge", "Sampel i återuppspelningsbufferten", [({"meter": mid}, len(b)) for mid, b in recent.items()]),
+        ("p1_result_cache_total", "counter", "Resultatcachen (se /api/cache)", [({"outcome": k}, v) for k, v in cache_stats.items()]),
+        ("p1_report_jobs", "gauge", "Rapportjobb per status", [({"status": st}, n) for st, n in Counter(j["status"] for j in list(jobs.values())).items()]),
+    ]
+    return Response(render_metrics(extra), mimetype="text/plain; version=0.0.4")
+
+def admin_only():
+    if ADMIN_TOKEN: ok = request.headers.get("Authorization") == f"Bearer {ADMIN_TOKEN}" or request.args.get("token") == ADMIN_TOKEN
+    else: ok = request.remote_addr in ("127.0.0.1", "::1")
+    if not ok: abort(403)
+
+@app.route("/admin/profiling", methods=["GET", "POST"])
+def admin_profiling():
+    """GET visar läget. POST ?sample=0..1 och/eller ?slow_ms=N (0 stänger av) ändrar det direkt."""
+    admin_only()
+    if request.method == "POST": set_profiling(request.args.get("sample", type=float), request.args.get("slow_ms", type=float))
+    return json_response({"sample": PROFILE_SAMPLE_RATE, "slow_ms": SLOW_QUERY_MS, "stacks": len(_stacks), "slow_queries": len(slow_queries)})
+
+@app.route("/admin/profile")
+def admin_profile():
+    """Kollapsade stackar ("endpoint;fil:funktion;... antal"), ?reset=1 nollställer."""
+    admin_only()
+    out = "".join(f"{k} {v}\n" for k, v in sorted(_stacks.items()))
+    if request.args.get("reset") == "1": _stacks.clear()
+    return Response(out, mimetype="text/plain")
+
+@app.route("/admin/slow-queries")
+def admin_slow_queries():
+    admin_only()
+    out = list(slow_queries)
+    if request.args.get("reset") == "1": slow_queries.clear()
+    return json_response({"threshold_ms": SLOW_QUERY_MS, "queries": out[::-1]})
+
+# --- Uppspelning ---
+# Arkivet (ARCHIVE_RAW) spelas upp genom samma ingest() som insamlingen, in i en egen mätare
+# <id>-replay med egen databas, och tolkas med dagens kod och inställningar (t.ex. nya kolumner
+# eller STORAGE_MODE). Mätaren ligger utanför METERS: den syns inte i mätarlistan och pollas,
+# värms och gallras inte, men nås med ?meter=<id>-replay (gränssnittet, /ws) så länge servern kör.
+replays, replay_meters = {}, {}  # uppspelningsmätarens id -> förlopp, mätare
+
+def replay(meter, target, start_str, end_str, speed):
+    """speed=60 spelar upp en timme per minut, 0 så fort det går. Tidsstämplarna behålls."""
+    st, prev, t_prev = replays[target["id"]], None, time.monotonic()
+    try:
+        for ts, raw in raw_payloads(meter, start_str, end_str):
+            if st["stop"]: break
+            dt = parse_utc(ts)
+            if speed and prev is not None:
+                wait = (dt - prev).total_seconds() / speed - (time.monotonic() - t_prev)
+                if wait > 0: time.sleep(wait)
+            prev, t_prev = dt, time.monotonic()
+            try: ingest(target, dt, ts, parse_raw(raw))
+            except: swallowed("replay")
+            st["done"], st["at"] = st["done"] + 1, ts
+    finally: st["running"] = False
+
+@app.route("/admin/replay", methods=["GET", "POST", "DELETE"])
+def admin_replay():
+    """POST ?meter=&from=&to=&speed= startar en uppspelning, GET visar förloppet, DELETE avbryter."""
+    admin_only()
+    if request.method == "GET": return json_response({k: {x: v for x, v in r.items() if x != "stop"} for k, r in replays.items()})
+    meter = meter_arg()
+    rid = meter["id"] + "-replay"
+    if request.method == "DELETE":
+        if rid in replays: replays[rid]["stop"] = True
+        return json_response({"stopped": rid in replays})
+    if replays.get(rid, {}).get("running"): abort(409)
+    if not os.path.exists(raw_path(meter)): return Response("Inget arkiv, sätt ARCHIVE_RAW = True", status=404)
+    start, end = _export_range()
+    target = replay_meters[rid] = {"id": rid, "ip": "-", "elomrade": meter["elomrade"], "db": os.path.splitext(meter["db"])[0] + "-replay.db", "mode": meter["mode"]}
+    init_db(target["db"])
+    total = store(meter).count(start, end, raw=True)
+    replays[rid] = {"meter": meter["id"], "from": start, "to": end, "speed": request.args.get("speed", 0, type=float), "db": target["db"], "total": total, "done": 0, "at": None, "running": True, "stop": False}
+    threading.Thread(target=replay, args=(meter, target, start, end, replays[rid]["speed"]), daemon=True).start()
+    return json_response({k: v for k, v in replays[rid].items() if k != "stop"})
+
+@app.route("/api/cache")
+def api_cache():
+    return json_response(dict(cache_stats, results=len(_results), bodies=len(_bodies)))
+
+def drop_cached(meter, first, last):
+    """Glömmer priser för first..last och alla färdiga svar och rapporter för mätaren."""
+    global current_prices
+    area, lo, hi = meter["elomrade"], first.isoformat(), last.isoformat()
+    prices = [k for k in list(price_cache) if k[0] == area and lo <= k[1] <= hi]
+    for k in prices: price_cache.pop(k, None)
+    bodies = [k for k in list(_bodies) if k[1] == meter["id"]]
+    for k in bodies: _bodies.pop(k, None)
+    with _job_lock:
+        done = [k for k, j in jobs.items() if j["meter"] == meter["id"] and j["status"] == "done"]
+        for k in done: del jobs[k]
+    invalidate(meter["id"])
+    today = datetime.now()
+    if lo <= today.strftime("%Y-%m-%d") <= hi: current_prices = {**current_prices, area: get_prices_for_date(today, meter)}
+    return {"prices": len(prices), "bodies": len(bodies), "reports": len(done)}
+
+@app.route("/admin/invalidate", methods=["POST"])
+def admin_invalidate():
+    """POST ?meter=&from=&to= efter rättade priser eller p1-rebuild.py."""
+    admin_only()
+    meter = meter_arg()
+    try: first, last = date.fromisoformat(request.args["from"]), date.fromisoformat(request.args.get("to") or request.args["from"])
+    except (KeyError, ValueError): abort(400)
+    return json_response(drop_cached(meter, first, last))
 
 @app.route("/api/history")
 def api_history():
+    meter = meter_arg()
     d_str = request.args.get("date")
     ld = datetime.strptime(d_str, '%Y-%m-%d')
-    prices = get_prices_for_date(ld)
-    day_cost, day_kwh = 0.0, 0.0
-    quarterly_kwh = {k: 0.0 for k in prices.keys()}
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        pts = conn.execute("SELECT * FROM p1_measurements WHERE measured_at BETWEEN ? AND ? ORDER BY measured_at ASC", (ld.strftime('%Y-%m-%dT00:00:00Z'), ld.strftime('%Y-%m-%dT23:59:59Z'))).fetchall()
-        for i in range(1, len(pts)):
-            v1, v2 = pts[i]['total_import_kwh'], pts[i-1]['total_import_kwh']
-            if v1 is not None and v2 is not None:
-                diff = v1 - v2
-                if 0 < diff < 50:
-                    dt = datetime.fromisoformat(pts[i]['measured_at'].replace("Z", "+00:00")).astimezone()
-                    pk = get_price_key(dt)
-                    day_cost += diff * prices.get(pk, 0)
-                    day_kwh += diff
-                    if pk in quarterly_kwh: quarterly_kwh[pk] += diff
-    mon_cost, mon_kwh = calculate_period_stats(ld.replace(day=1), ld)
-    return jsonify({"total_kwh": round(day_kwh, 2), "total_cost": round(day_cost, 2), "monthly_kwh": mon_kwh, "monthly_cost": mon_cost, "prices": prices, "quarterly_kwh": quarterly_kwh, "points": [dict(p) for p in pts]})
+    since = since_arg()
+    ttl, key = closed_ttl(ld.date()), ("history", meter["id"], d_str, since)
+    hit = ttl and cached_json(key)
+    if hit: return hit
+    def summary():
+        prices = get_prices_for_date(ld, meter)
+        day_cost, day_kwh = 0.0, 0.0
+        quarterly_kwh = {k: 0.0 for k in prices.keys()}
+        for pk, kwh in store(meter).day_energy(ld.date(), ld.date()).get(ld.date().isoformat(), {}).items():
+            day_cost += kwh * prices.get(pk, 0)
+            day_kwh += kwh
+            if pk in quarterly_kwh: quarterly_kwh[pk] += kwh
+        unsettled = set()
+        mon_cost, mon_kwh = calculate_period_stats(ld.replace(day=1), ld, meter, unsettled)
+        return {"total_kwh": round(day_kwh, 2), "total_cost": round(day_cost, 2), "monthly_kwh": mon_kwh, "monthly_cost": mon_cost, "prices": prices, "quarterly_kwh": quarterly_kwh, "final": not unsettled}
+    def build():
+        res = single_flight(("history-summary", meter["id"], d_str), meter["id"], summary)
+        start, end = day_bounds(ld)
+        pts = points_since(meter, start, end, since)
+        # Lång cache först när priserna är kompletta och månadens dygn finns i p1_daily
+        return json_entry(res | {"points": pts, "cursor": pts[-1]["measured_at"] if pts else since}, ttl if len(res["prices"]) >= 96 and res["final"] else None)
+    return send_entry(single_flight(key, meter["id"], build), key)
+
+BUCKETS = {"day": 10, "month": 7, "year": 4}  # hur mycket av datumsträngen som blir periodnyckeln
+
+def aggregate_rows(daily, bucket):
+    """daily_totals() -> rader med kWh, kostnad samt medel- och maxeffekt per period."""
+    out = {}
+    for ds, (kwh, cost, avg, mx) in daily.items():
+        b = out.setdefault(ds[:BUCKETS[bucket]], {"kwh": 0.0, "cost": 0.0, "days": 0, "avg_power_w": 0.0, "max_power_w": None})
+        b["kwh"] += kwh
+        b["cost"] += cost
+        if avg is not None:
+            b["avg_power_w"] += (avg - b["avg_power_w"]) / (b["days"] + 1)
+            b["days"] += 1
+            b["max_power_w"] = mx if b["max_power_w"] is None else max(b["max_power_w"], mx)
+    return [{"period": k, "kwh": round(v["kwh"], 2), "cost": round(v["cost"], 2), "avg_power_w": round(v["avg_power_w"], 1), "max_power_w": v["max_power_w"]} for k, v in out.items()]
+
+@app.route("/api/aggregate")
+def api_aggregate():
+    meter = meter_arg()
+    try:
+        first = date.fromisoformat(request.args["from"])
+        last = date.fromisoformat(request.args.get("to") or datetime.now(timezone.utc).date().isoformat())
+    except (KeyError, ValueError): abort(400)
+    bucket = request.args.get("bucket", "day")
+    if bucket not in BUCKETS or last < first: abort(400)
+    ttl, key = closed_ttl(last), ("aggregate", meter["id"], first, last, bucket)
+    hit = ttl and cached_json(key)
+    if hit: return hit
+    def build():
+        st, unsettled = stats_store(meter, (last - first).days + 1), set()
+        rows = aggregate_rows(daily_totals(meter, first, last, unsettled=unsettled), bucket)
+        return json_entry({"bucket": bucket, "backend": type(st).__name__, "rows": rows}, None if unsettled else ttl)
+    return send_entry(single_flight(key, meter["id"], build), key)
+
+# --- Rapportjobb ---
+# Långa statistikfrågor (t.ex. kWh och kostnad per månad i tre år) körs som jobb i en egen
+# begränsad trådpool i stället för i Flask-tråden. Köns ordning är prioritet och sedan ålder.
+# Jobbets id är en hash av parametrarna, så samma rapport beställd igen blir samma jobb, och
+# ett färdigt resultat återanvänds: för avslutade perioder så länge det finns kvar, annars
+# i RESULT_TTL sekunder.
+REPORT_WORKERS = 2
+REPORT_JOBS_MAX = 200
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+REPORT_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+jobs = {}  # id -> jobb
+_job_queue, _job_seq, _job_lock, _job_threads = queue.PriorityQueue(), count_from(), threading.Lock(), []
+
+def month_spans(first, last):
+    """(första, sista dygn) per kalendermånad i intervallet."""
+    out, d = [], first
+    while d <= last:
+        nxt = (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+        out.append((d, min(last, nxt - timedelta(days=1))))
+        d = nxt
+    return out
+
+def job_view(job):
+    return {k: v for k, v in job.items() if k not in ("result", "cancel")}
+
+def submit_report(meter, first, last, bucket, priority):
+    jid = hashlib.blake2b(f"{meter['id']}|{first}|{last}|{bucket}".encode(), digest_size=8).hexdigest()
+    prio = PRIORITIES[priority]
+    with _job_lock:
+        job = jobs.get(jid)
+        fresh = job and job["status"] == "done" and (job["ttl"] or time.time() - job["finished"] < RESULT_TTL)
+        if job and (fresh or job["status"] in ("queued", "running")):
+            count("p1_report_jobs_total", outcome="reused")
+            if job["status"] == "queued" and prio < job["priority"]:
+                job["priority"] = prio
+                _job_queue.put((prio, next(_job_seq), jid))  # den gamla köplatsen hoppas över
+            return job
+        job = jobs[jid] = {"id": jid, "meter": meter["id"], "from": first.isoformat(), "to": last.isoformat(), "bucket": bucket, "priority": prio, "status": "queued",
+                           "done": 0, "total": len(month_spans(first, last)), "created": to_utc_str(datetime.now(timezone.utc)), "seconds": None, "error": None,
+                           "ttl": closed_ttl(last), "finished": None, "result": None, "cancel": False}
+        old = [k for k, j in jobs.items() if j["status"] not in ("queued", "running")]
+        for k in old[:max(0, len(jobs) - REPORT_JOBS_MAX)]: del jobs[k]
+        while len(_job_threads) < REPORT_WORKERS:
+            _job_threads.append(threading.Thread(target=report_worker, daemon=True, name=f"p1-report-{len(_job_threads)}"))
+            _job_threads[-1].start()
+    count("p1_report_jobs_total", outcome="queued")
+    _job_queue.put((prio, next(_job_seq), jid))
+    return job
+
+def report_worker():
+    while True:
+        jid = _job_queue.get()[2]
+        job = jobs.get(jid)
+        with _job_lock:
+            if job is None or job["status"] != "queued": continue
+            job["status"] = "running"
+        t0 = time.perf_counter()
+        try:
+            meter, daily, unsettled = find_meter(job["meter"]), {}, set()
+            for a, b in month_spans(date.fromisoformat(job["from"]), date.fromisoformat(job["to"])):
+                if job["cancel"]: break
+                daily.update(daily_totals(meter, a, b, unsettled=unsettled))  # en månad i taget: förlopp och avbrott mellan stegen
+                job["done"] += 1
+            if job["cancel"]: job["status"] = "cancelled"
+            else:
+                if unsettled: job["ttl"] = None
+                job["result"] = json_entry({"id": jid, "meter": job["meter"], "from": job["from"], "to": job["to"], "bucket": job["bucket"], "rows": aggregate_rows(daily, job["bucket"])}, job["ttl"])
+                job["status"] = "done"
+        except Exception as e:
+            job["status"], job["error"] = "error", str(e)
+            swallowed("report")
+        job["seconds"], job["finished"] = round(time.perf_counter() - t0, 3), time.time()
+        count("p1_report_jobs_total", outcome=job["status"])
+        observe("p1_report_seconds", job["seconds"], REPORT_BUCKETS)
+
+@app.route("/api/reports", methods=["GET", "POST"])
+def api_reports():
+    """POST ?meter=&from=&to=&bucket=day|month|year&priority=high|normal|low -> 202 och jobbet
+    (200 om resultatet redan finns). GET listar jobben."""
+    if request.method == "GET": return json_response({"jobs": [job_view(j) for j in jobs.values()]})
+    meter = meter_arg()
+    try:
+        first = date.fromisoformat(request.args["from"])
+        last = date.fromisoformat(request.args.get("to") or datetime.now(timezone.utc).date().isoformat())
+    except (KeyError, ValueError): abort(400)
+    bucket, priority = request.args.get("bucket", "month"), request.args.get("priority", "normal")
+    if bucket not in BUCKETS or priority not in PRIORITIES or last < first: abort(400)
+    job = submit_report(meter, first, last, bucket, priority)
+    resp = json_response(job_view(job))
+    if job["status"] != "done": resp.status_code = 202
+    resp.headers["Location"] = f"/api/reports/{job['id']}"
+    return resp
+
+def _job(jid):
+    job = jobs.get(jid)
+    if job is None: abort(404)
+    return job
+
+@app.route("/api/reports/<jid>", methods=["GET", "DELETE"])
+def api_report(jid):
+    job = _job(jid)
+    if request.method == "DELETE": job["cancel"] = True
+    return json_response(job_view(job))
+
+@app.route("/api/reports/<jid>/result")
+def api_report_result(jid):
+    job = _job(jid)
+    if job["status"] != "done": return Response(json.dumps(job_view(job)), status=409, mimetype="application/json")
+    return send_entry(job["result"])
+
+@app.route("/api/reports/<jid>/events")
+def api_report_events(jid):
+    """Förloppet som Server-Sent Events, tills jobbet är klart."""
+    job = _job(jid)
+    def generate():
+        last = None
+        while True:
+            view = job_view(job)
+            if view != last: yield f"event: {view['status']}\ndata: {json.dumps(view)}\n\n"
+            last = view
+            if view["status"] not in ("queued", "running"): return
+            time.sleep(0.25)
+    return Response(generate(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.route("/api/series")
 def api_series():
+    meter = meter_arg()
     h = request.args.get("hours", 1, type=int)
     s = (datetime.now(timezone.utc) - timedelta(hours=h)).isoformat().replace("+00:00", "Z")
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        return jsonify({"points": [dict(r) for r in conn.execute("SELECT * FROM p1_measurements WHERE measured_at >= ? ORDER BY measured_at ASC", (s,)).fetchall()]})
+    since = since_arg()
+    def build():
+        pts = points_since(meter, s, None, since)
+        return json_entry({"points": pts, "cursor": pts[-1]["measured_at"] if pts else since})
+    return send_entry(single_flight(("series", meter["id"], h, since), meter["id"], build))
+
+# --- Export ---
+# Strömmas direkt från lagret ett dygn i taget, så även ett år går med konstant minne.
+# CSV har samma tillval som den gamla /api/export.csv; Parquet och Arrow kräver pyarrow.
+EXPORT_COLUMNS = ["measured_at"] + MEASUREMENT_COLUMNS
+
+class _Sink:
+    """Filobjekt som pyarrow skriver till; det skrivna hämtas ut mellan omgångarna."""
+    def __init__(self): self.parts, self.pos, self.closed = [], 0, False
+    def write(self, b): self.parts.append(bytes(b)); self.pos += len(b); return len(b)
+    def tell(self): return self.pos
+    def flush(self): pass
+    def close(self): self.closed = True
+    def take(self):
+        out, self.parts = b"".join(self.parts), []
+        return out
+
+def _export_range():
+    now = datetime.now(timezone.utc)
+    def parse(v, end):
+        if len(v) == 10: return day_bounds(date.fromisoformat(v))[1 if end else 0]
+        dt = datetime.fromisoformat(v.replace("Z", "+00:00"))
+        return to_utc_str(dt if dt.tzinfo else dt.astimezone())
+    try:
+        start = parse(request.args["from"], False) if request.args.get("from") else to_utc_str(now - timedelta(hours=request.args.get("hours", 24, type=int)))
+        end = parse(request.args["to"], True) if request.args.get("to") else to_utc_str(now)
+    except ValueError: abort(400)
+    return start, end
+
+def _ts_formatter(tz, timefmt):
+    if tz == "utc" and timefmt == "iso": return lambda ts: ts[:19] + "+00:00"
+    zone = timezone.utc
+    if tz != "utc":
+        try:
+            from zoneinfo import ZoneInfo
+            zone = ZoneInfo("Europe/Stockholm")
+        except Exception: zone = None  # systemets lokala tid
+    def fmt(ts):
+        dt = datetime.fromisoformat(ts[:19]).replace(tzinfo=timezone.utc).astimezone(zone)
+        return dt.strftime("%Y-%m-%d %H:%M:%S") if timefmt == "sv" else dt.isoformat()
+    return fmt
+
+@app.route("/api/export.<fmt>")
+def api_export(fmt):
+    """from/to (datum eller ISO 8601) eller hours=N, cols=kommalista, och för CSV
+    sep=','|';'|'\\t', decimal=dot|comma, tz=utc|stockholm, timefmt=iso|sv, bom=1."""
+    meter = meter_arg()
+    if fmt not in ("csv", "parquet", "arrow"): abort(404)
+    if fmt != "csv":
+        try: import pyarrow, pyarrow.parquet, pyarrow.ipc  # först här: pyarrow är tyngre att importera än requests
+        except ImportError: return Response("pyarrow saknas (pip install pyarrow)", status=501)
+    start, end = _export_range()
+    cols = [("measured_at" if c.strip() == "ts" else c.strip()) for c in request.args.get("cols", "").split(",") if c.strip()] or EXPORT_COLUMNS
+    if any(c not in EXPORT_COLUMNS for c in cols): abort(400)
+    rows = store(meter).iter_points(start, end, cols)
+    name = f"p1_{meter['id']}_{start[:10]}_{end[:10]}.{fmt}"
+    headers = {"Content-Disposition": f'attachment; filename="{name}"'}
+
+    if fmt == "csv":
+        sep = request.args.get("sep", ",").replace("\\t", "\t")
+        comma = request.args.get("decimal", "dot").lower() == "comma"
+        fmt_ts = _ts_formatter(request.args.get("tz", "utc").lower(), request.args.get("timefmt", "iso").lower())
+        def num(v):
+            if v is None: return ""
+            s = repr(v) if isinstance(v, float) else str(v)
+            if s.endswith(".0"): s = s[:-2]
+            return s.replace(".", ",") if comma else s
+        def generate():
+            yield ("\ufeff" if request.args.get("bom") == "1" else "") + sep.join("ts" if c == "measured_at" else c for c in cols) + "\n"
+            for batch in rows:
+                yield "".join(sep.join(fmt_ts(v) if c == "measured_at" else num(v) for c, v in zip(cols, map(r.get, cols))) + "\n" for r in batch)
+        return Response(stream_with_context(generate()), mimetype="text/csv", headers=headers)
+
+    schema = pyarrow.schema([pyarrow.field(c, pyarrow.timestamp("us", tz="UTC") if c == "measured_at" else pyarrow.float64()) for c in cols])
+    def generate():
+        sink = _Sink()
+        w = pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd") if fmt == "parquet" else pyarrow.ipc.new_stream(sink, schema)
+        for batch in rows:
+            arrays = [[parse_utc(r["measured_at"]) for r in batch] if c == "measured_at" else [None if r[c] is None else float(r[c]) for r in batch] for c in cols]
+            w.write_table(pyarrow.Table.from_arrays([pyarrow.array(a, f.type) for a, f in zip(arrays, schema)], schema=schema))
+            yield sink.take()
+        w.close()
+        yield sink.take()
+    return Response(stream_with_context(generate()), mimetype="application/vnd.apache.parquet" if fmt == "parquet" else "application/vnd.apache.arrow.stream", headers=headers)
+
+# --- Liveprenumerationer ---
+# En klient kan välja fält, högsta takt och format, antingen i URL:en (?fields=&interval=&format=)
+# eller med ett meddelande {"subscribe": {...}}. Med interval skickas bara senaste samplet
+# per period. Kodade ramar delas mellan klienter med samma val, så kostnaden per klient är
+# i stort sett bara att skicka. permessage-deflate förhandlas av simple-websocket när
+# webbläsaren erbjuder det.
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+LIVE_FIELDS = ["measured_at", "meter_id", "active_power_w", "voltage_l1_v", "voltage_l2_v", "voltage_l3_v", "active_current_l1_a", "active_current_l2_a", "active_current_l3_a", "total_current_a", "price_sek_kwh"]
+_frames, _frames_lock = {}, threading.Lock()
+
+def live_subscription(opts, cur=None):
+    """Validerad prenumeration ur {"fields", "interval", "format"}; ValueError vid fel."""
+    sub = dict(cur or {"fields": None, "interval": 0.0, "format": "json"})
+    if opts.get("fields"):
+        fields = opts["fields"].split(",") if isinstance(opts["fields"], str) else list(opts["fields"])
+        if any(f not in LIVE_FIELDS for f in fields): raise ValueError("okänt fält")
+        sub["fields"] = tuple(["measured_at"] + [f for f in fields if f != "measured_at"])
+    if opts.get("interval") is not None: sub["interval"] = max(0.0, float(opts["interval"]))
+    if opts.get("format"):
+        if opts["format"] not in ("json", "array", "msgpack"): raise ValueError("okänt format")
+        if opts["format"] == "msgpack" and msgpack is None: raise ValueError("msgpack saknas på servern")
+        sub["format"] = opts["format"]
+    if sub["format"] != "json" and not sub["fields"]: sub["fields"] = tuple(LIVE_FIELDS)
+    return sub
+
+def live_frame(p, sub):
+    key = (p["meter_id"], p["measured_at"], sub["fields"], sub["format"])
+    frame = _frames.get(key)
+    if frame is None:
+        fields, fmt = sub["fields"], sub["format"]
+        if fmt == "json": frame = json.dumps(p if fields is None else {f: p[f] for f in fields})
+        elif fmt == "array": frame = json.dumps([p[f] for f in fields])
+        else: frame = msgpack.packb([p[f] for f in fields])
+        with _frames_lock:
+            if len(_frames) > 4096: _frames.clear()
+            _frames[key] = frame
+    return frame
 
-@sock.route("/ws")
+def live_samples(q, interval):
+    """Sampel ur kön i högst den takt interval() anger (senaste vinner), och None ungefär
+    en gång i sekunden när inget skickas så att anroparen kan göra annat."""
+    pending, due = None, 0.0
+    while True:
+        wait = 1.0 if pending is None else due - time.monotonic()
+        try: pending = q.get(timeout=wait) if wait > 0 else q.get_nowait()
+        except queue.Empty: pass
+        if pending is not None and time.monotonic() >= due:
+            yield pending
+            pending, due = None, time.monotonic() + interval()
+        else: yield None
+
+@ws_route_lazy("/ws")
 def ws_route(ws):
-    q = queue.Queue(maxsize=100); subscribers.add(q)
+    from flask_sock import ConnectionClosed
+    mid = meter_arg()["id"]
+    since = request.args.get("since") or None
+    try: sub = live_subscription(request.args)
+    except ValueError as e: return ws.send(json.dumps({"type": "error", "error": str(e)}))
+    q = queue.Queue(maxsize=100)
+    missed, gap = subscribe(mid, q, since)
     try:
-        while True: ws.send(json.dumps(q.get()))
-    except: pass
-    finally: subscribers.discard(q)
+        if since: ws.send(json.dumps({"type": "resume", "replayed": len(missed), "gap": gap}))
+        for p in (missed[-1:] if sub["interval"] else missed): ws.send(live_frame(p, sub))
+        for p in live_samples(q, lambda: sub["interval"]):
+            msg = ws.receive(timeout=0)
+            while msg is not None:
+                try:
+                    sub = live_subscription(json.loads(msg).get("subscribe") or {}, sub)
+                    ws.send(json.dumps({"type": "subscribed", **sub}))
+                except (ValueError, TypeError, AttributeError) as e: ws.send(json.dumps({"type": "error", "error": str(e)}))
+                msg = ws.receive(timeout=0)
+            if p is not None: ws.send(live_frame(p, sub))
+    except ConnectionClosed: pass
+    except: swallowed("ws")
+    finally: subscribers[mid].discard(q)
+
+SSE_HEARTBEAT_S = 15
+
+@app.route("/api/stream")
+def api_stream():
+    """Server-Sent Events med samma sampel och tillval (fields, interval) som /ws. Händelsens id
+    är tidsstämpeln, så en EventSource som återansluter med Last-Event-ID får det den missat."""
+    mid = meter_arg()["id"]
+    since = request.headers.get("Last-Event-ID") or request.args.get("since") or None
+    try: sub = live_subscription(request.args)
+    except ValueError as e: return Response(str(e), status=400)
+    if sub["format"] != "json": return Response("SSE stöder bara format=json", status=400)
+    q = queue.Queue(maxsize=100)
+    missed, gap = subscribe(mid, q, since)
+    def event(p): return f"id: {p['measured_at']}\ndata: {live_frame(p, sub)}\n\n"
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            if since: yield f"event: resume\ndata: {json.dumps({'replayed': len(missed), 'gap': gap})}\n\n"
+            for p in (missed[-1:] if sub["interval"] else missed): yield event(p)
+            beat = time.monotonic() + SSE_HEARTBEAT_S
+            for p in live_samples(q, lambda: sub["interval"]):
+                if p is not None: yield event(p)
+                elif time.monotonic() < beat: continue
+                else: yield ": ping\n\n"  # håller proxyer vakna och upptäcker stängda klienter
+                beat = time.monotonic() + SSE_HEARTBEAT_S
+        finally: subscribers[mid].discard(q)
+    return Response(generate(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 INDEX_HTML = r"""<!doctype html>
 <html lang="sv">
 <head>
   <meta charset="utf-8"><title>P1 Monitor Pro</title>
-  <script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.1"></script>
-  <script src="https://cdn.jsdelivr.net/npm/date-fns@3.6.0"></script>
-  <script src="https://cdn.jsdelivr.net/npm/chartjs-adapter-date-fns@3.0.0"></script>
-  <script src="https://cdn.jsdelivr.net/npm/chartjs-plugin-zoom@2.0.1"></script>
-  <style>
-    :root { --bg: #f4f4f9; --card: #fff; --text: #333; --border: #ddd; --stat: #eee; }
-    body.dark { --bg: #121212; --card: #1e1e1e; --text: #e0e0e0; --border: #333; --stat: #2d2d2d; }
-    body { font-family: sans-serif; margin: 20px; background: var(--bg); color: var(--text); }
-    .container { max-width: 1400px; margin: 0 auto; display: flex; flex-direction: column; gap: 20px; }
-    .card { background: var(--card); padding: 20px; border-radius: 8px; border: 1px solid var(--border); }
-    .main-grid { display: grid; grid-template-columns: 1fr 350px; gap: 20px; }
-    .controls { display: flex; gap: 10px; align-items: center; }
-    .stats { display: grid; grid-template-columns: repeat(auto-fit, minmax(150px, 1fr)); gap: 10px; margin-top: 10px; }
-    .stat-card { background: var(--stat); padding: 15px; border-radius: 5px; text-align: center; }
-    .stat-val { font-size: 1.2em; font-weight: bold; display: block; }
-    .chart-container { height: 450px; position: relative; }
-    button, .btn { padding: 8px 12px; cursor: pointer; border: 1px solid var(--border); background: var(--card); color: var(--text); border-radius: 5px; }
-    button.active { background: #007bff; color: #fff; }
-    .footer-kred { margin-top: 20px; text-align: center; opacity: 0.8; font-size: 0.9em; }
-  </style>
+  <script src="/static/vendor/chart.js"></script>
+  <script src="/static/vendor/date-fns.js"></script>
+  <script src="/static/vendor/chartjs-adapter-date-fns.js"></script>
+  <script src="/static/vendor/chartjs-plugin-zoom.js"></script>
+  <link rel="stylesheet" href="/static/app.css">
 </head>
 <body>
   <div class="container">
     <div class="card" style="display:flex; justify-content:space-between; align-items:center;">
       <h2 style="margin:0">Energimonitor P1</h2>
       <div class="controls">
+        <select id="meterSel" onchange="location.search='?meter='+encodeURIComponent(this.value)" style="display:none"></select>
         <button onclick="toggleTheme()">🌓 Tema</button>
         <button onclick="changeRange(1, this)" class="active">1h</button>
         <button onclick="changeRange(24, this)">24h</button>
@@ -238,227 +2006,25 @@ INDEX_HTML = r"""<!doctype html>
       </div>
     </div>
   </div>
-  <script>
-    const timeFmt = new Intl.DateTimeFormat('sv-SE', { hour: '2-digit', minute: '2-digit', hour12: false });
-    const fullTimeFmt = new Intl.DateTimeFormat('sv-SE', { hour: '2-digit', minute: '2-digit', second: '2-digit', hour12: false });
-    let currentRangeHours = 1;
-
-    function parseToSve(s) {
-        if(!s) return null;
-        let d = new Date(s.endsWith('Z') ? s : s + 'Z');
-        return isNaN(d.getTime()) ? null : d;
-    }
-
-    let chart, pie, hChart, pChart;
-    let lastHistoryData = null;
-    let visibleSeries = {};
-
-    function toggleTheme() {
-      const isDark = document.body.classList.toggle('dark');
-      localStorage.setItem('theme', isDark ? 'dark' : 'light');
-    }
-
-    function applySavedTheme() {
-      if (localStorage.getItem('theme') === 'dark') document.body.classList.add('dark');
-    }
-
-    function savePNG(id) {
-      const canvas = document.getElementById(id);
-      const l = document.createElement('a');
-      l.download = id+'_'+new Date().toISOString().slice(0,19)+'.png';
-      l.href = canvas.toDataURL('image/png');
-      l.click();
-    }
-
-    function exportHistoryWattCSV() {
-      if (!lastHistoryData || !lastHistoryData.points.length) return alert('Ingen data');
-      let csv = '\ufeffTid;Effekt_Watt\n';
-      lastHistoryData.points.forEach(p => { csv += p.measured_at + ';' + p.active_power_w + '\n'; });
-      const blob = new Blob([csv], { type: 'text/csv;charset=utf-8;' });
-      const url = window.URL.createObjectURL(blob);
-      const a = document.createElement('a');
-      a.href = url; a.download = 'p1_effekt_' + document.getElementById('hDate').value + '.csv';
-      a.click();
-    }
-
-    function exportCSV() {
-      if (!lastHistoryData || !lastHistoryData.points.length) return alert('Ingen data');
-      let csv = '\ufeffTid;Effekt_W;Total_kWh;L1_V;L2_V;L3_V;L1_A;L2_A;L3_A\n';
-      lastHistoryData.points.forEach(p => { 
-          csv += p.measured_at + ';' + p.active_power_w + ';' + p.total_import_kwh + ';' + p.voltage_l1_v + ';' + p.voltage_l2_v + ';' + p.voltage_l3_v + ';' + p.active_current_l1_a + ';' + p.active_current_l2_a + ';' + p.active_current_l3_a + '\n'; 
-      });
-      const blob = new Blob([csv], { type: 'text/csv;charset=utf-8;' });
-      const url = window.URL.createObjectURL(blob);
-      const a = document.createElement('a');
-      a.href = url; a.download = 'p1_full_' + document.getElementById('hDate').value + '.csv';
-      a.click();
-    }
-
-    async function initChart(hours=1) {
-      currentRangeHours = hours;
-      try {
-        const res = await fetch('/api/series?hours=' + hours);
-        const data = await res.json();
-        if(chart) {
-            chart.data.datasets.forEach((ds, i) => visibleSeries[ds.label] = chart.isDatasetVisible(i));
-            chart.destroy();
-        }
-        
-        const chartData = data.points.map(p => ({ x: parseToSve(p.measured_at), p }));
-
-        chart = new Chart(document.getElementById('chart'), {
-            type: 'line',
-            data: { datasets: [
-                { label: 'Watt', data: chartData.map(d=>({x:d.x, y:d.p.active_power_w})), borderColor: '#2563eb', yAxisID: 'yW', pointRadius: 0, fill: true, backgroundColor: 'rgba(37,99,235,0.1)' },
-                { label: 'L1 (A)', data: chartData.map(d=>({x:d.x, y:d.p.active_current_l1_a})), borderColor: '#dc2626', yAxisID: 'yA', pointRadius: 0 },
-                { label: 'L2 (A)', data: chartData.map(d=>({x:d.x, y:d.p.active_current_l2_a})), borderColor: '#16a34a', yAxisID: 'yA', pointRadius: 0 },
-                { label: 'L3 (A)', data: chartData.map(d=>({x:d.x, y:d.p.active_current_l3_a})), borderColor: '#9333ea', yAxisID: 'yA', pointRadius: 0 },
-                { label: 'L1 (V)', data: chartData.map(d=>({x:d.x, y:d.p.voltage_l1_v})), borderColor: '#f87171', yAxisID: 'yV', pointRadius: 0, hidden: true },
-                { label: 'L2 (V)', data: chartData.map(d=>({x:d.x, y:d.p.voltage_l2_v})), borderColor: '#4ade80', yAxisID: 'yV', pointRadius: 0, hidden: true },
-                { label: 'L3 (V)', data: chartData.map(d=>({x:d.x, y:d.p.voltage_l3_v})), borderColor: '#c084fc', yAxisID: 'yV', pointRadius: 0, hidden: true }
-            ]},
-            options: { 
-                responsive: true, maintainAspectRatio: false, 
-                animation: false,
-                scales: { 
-                    x: { 
-                        type: 'time', 
-                        ticks: { callback: (val) => timeFmt.format(new Date(val)), autoSkip: true, maxTicksLimit: 12 } 
-                    }, 
-                    yW: { position: 'left', title: {display:true, text:'Watt'} }, 
-                    yA: { position: 'right', min: 0, title: {display:true, text:'Ampere'} },
-                    yV: { position: 'left', min: 200, max: 260, display: false }
-                },
-                plugins: { 
-                    zoom: { pan: { enabled: true }, zoom: { wheel: { enabled: true }, mode: 'x' } },
-                    tooltip: { callbacks: { title: (items) => fullTimeFmt.format(new Date(items[0].parsed.x)) } }
-                }
-            }
-        });
-        chart.data.datasets.forEach((ds, i) => { if(visibleSeries[ds.label] !== undefined) chart.setDatasetVisibility(i, visibleSeries[ds.label]); });
-        chart.update();
-      } catch(e) { console.error("Fel i initChart:", e); }
-    }
-
-    function updateChartsLive(m) {
-        const timestamp = parseToSve(m.measured_at);
-        if (!timestamp || !chart) return;
-
-        // Pusha nya data
-        chart.data.datasets[0].data.push({x: timestamp, y: m.active_power_w});
-        chart.data.datasets[1].data.push({x: timestamp, y: m.active_current_l1_a});
-        chart.data.datasets[2].data.push({x: timestamp, y: m.active_current_l2_a});
-        chart.data.datasets[3].data.push({x: timestamp, y: m.active_current_l3_a});
-        chart.data.datasets[4].data.push({x: timestamp, y: m.voltage_l1_v});
-        chart.data.datasets[5].data.push({x: timestamp, y: m.voltage_l2_v});
-        chart.data.datasets[6].data.push({x: timestamp, y: m.voltage_l3_v});
-
-        // Rensa gamla punkter utanför vyn (för prestanda)
-        const cutoff = new Date(timestamp.getTime() - (currentRangeHours * 3600000));
-        chart.data.datasets.forEach(ds => {
-            while (ds.data.length > 0 && ds.data[0].x < cutoff) ds.data.shift();
-        });
-        chart.update('none');
-
-        // Uppdatera historik-watt om vi tittar på idag
-        const todayStr = new Date().toISOString().split('T')[0];
-        if (document.getElementById('hDate').value === todayStr && hChart) {
-            hChart.data.datasets[0].data.push({x: timestamp, y: m.active_power_w});
-            hChart.update('none');
-        }
-    }
-
-    async function loadHistory() {
-      try {
-        const d = document.getElementById('hDate').value;
-        const res = await fetch('/api/history?date=' + d);
-        const data = await res.json();
-        lastHistoryData = data;
-        document.getElementById('hCost').innerText = data.total_cost.toFixed(2) + ' kr';
-        document.getElementById('hKwh').innerText = data.total_kwh.toFixed(2) + ' kWh';
-        document.getElementById('monKwh').innerText = data.monthly_kwh.toFixed(1) + ' kWh';
-        document.getElementById('monCost').innerText = data.monthly_cost.toFixed(2) + ' kr';
-        
-        if(hChart) hChart.destroy();
-        hChart = new Chart(document.getElementById('hChart'), {
-            type: 'line',
-            data: { datasets: [{ label: 'Effekt (Watt)', data: data.points.map(p=>({x:parseToSve(p.measured_at), y:p.active_power_w})), borderColor: '#2563eb', pointRadius: 0, fill: true, backgroundColor: 'rgba(37,99,235,0.05)' }]},
-            options: { 
-                responsive: true, maintainAspectRatio: false, 
-                scales: { x: { type: 'time', ticks: { callback: (v) => timeFmt.format(new Date(v)) } } },
-                plugins: { tooltip: { callbacks: { title: (it) => fullTimeFmt.format(new Date(it[0].parsed.x)) } } }
-            }
-        });
-
-        if(pChart) pChart.destroy();
-        const keys = Object.keys(data.prices).sort();
-        let roll = 0;
-        const rollData = keys.map(k => { roll += (data.quarterly_kwh[k] || 0) * data.prices[k]; return roll; });
-        pChart = new Chart(document.getElementById('pChart'), {
-            data: {
-                labels: keys,
-                datasets: [
-                    { type: 'bar', label: 'Spotpris', data: keys.map(k => data.prices[k]), backgroundColor: 'rgba(245, 158, 11, 0.4)', yAxisID: 'yP' },
-                    { type: 'line', label: 'Ack. Kostnad', data: rollData, borderColor: '#10b981', yAxisID: 'yC', pointRadius: 1 }
-                ]
-            },
-            options: { responsive: true, maintainAspectRatio: false, scales: { yP: { position: 'left' }, yC: { position: 'right' } } }
-        });
-      } catch(e) { console.error("Fel i loadHistory:", e); }
-    }
-
-    const ws = new WebSocket((location.protocol==='https:'?'wss':'ws')+'://'+location.host+'/ws');
-    ws.onmessage = e => {
-      try {
-          const m = JSON.parse(e.data);
-          document.getElementById('val-w').innerText = Math.round(m.active_power_w) + ' W';
-          document.getElementById('val-a').innerText = m.active_current_l1_a.toFixed(1) + ' / ' + m.active_current_l2_a.toFixed(1) + ' / ' + m.active_current_l3_a.toFixed(1) + ' A';
-          document.getElementById('val-v-multi').innerText = Math.round(m.voltage_l1_v) + ' / ' + Math.round(m.voltage_l2_v) + ' / ' + Math.round(m.voltage_l3_v) + ' V';
-          document.getElementById('val-price').innerText = m.price_sek_kwh.toFixed(2) + ' kr';
-          const currents = [m.active_current_l1_a, m.active_current_l2_a, m.active_current_l3_a];
-          document.getElementById('phase-l1').innerText = m.active_current_l1_a.toFixed(1) + ' A';
-          document.getElementById('phase-l2').innerText = m.active_current_l2_a.toFixed(1) + ' A';
-          document.getElementById('phase-l3').innerText = m.active_current_l3_a.toFixed(1) + ' A';
-          document.getElementById('total-a').innerText = 'Totalt: ' + m.total_current_a.toFixed(1) + ' A';
-          const imb = (Math.max(...currents) - Math.min(...currents)).toFixed(1);
-          document.getElementById('phase-imbalance').innerText = imb + ' A';
-          if(pie) { pie.data.datasets[0].data = currents; pie.update('none'); }
-          
-          updateChartsLive(m);
-      } catch(e) {}
-    };
-
-    window.onload = () => {
-      applySavedTheme();
-      init_db();
-      document.getElementById('hDate').value = new Date().toISOString().split('T')[0];
-      initChart(); loadHistory();
-      pie = new Chart(document.getElementById('pie'), { type: 'doughnut', data: { labels: ['L1','L2','L3'], datasets: [{data:[0,0,0], backgroundColor:['#dc2626','#16a34a','#9333ea']}]}, options: {responsive:true, maintainAspectRatio:false}});
-    };
-    function changeRange(h, b) { document.querySelectorAll('.controls button').forEach(x=>x.classList.remove('active')); b.classList.add('active'); initChart(h); }
-    function init_db() { /* Placeholder */ }
-  </script>
+  <script src="/static/app.js"></script>
 </body>
 </html>
 """
 
 if __name__ == "__main__":
-    init_db()
+    for m in METERS.values(): init_db(m["db"])
+    start_analytics()
     threading.Thread(target=collector_loop, daemon=True).start()
     threading.Thread(target=elpris_scheduler, daemon=True).start()
+    if CHUNK_AFTER_DAYS: threading.Thread(target=compaction_scheduler, daemon=True).start()
+    if ARCHIVE_RAW: threading.Thread(target=raw_scheduler, daemon=True).start()
+    if RETENTION_TIERS or PARTITION_KEEP_MONTHS: threading.Thread(target=retention_scheduler, daemon=True).start()
+    threading.Thread(target=warmup, daemon=True, name="p1-warmup").start()
 
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        local_ip = s.getsockname()[0]
-        s.close()
-    except:
-        local_ip = "127.0.0.1"
-
-    print(f" * Connecting to HomeWizard P1 at {P1_IP}...")
+    for m in METERS.values(): print(f" * Connecting to HomeWizard P1 '{m['id']}' at {m['ip']} ({m['elomrade']})...")
     print(" * Running on all addresses (0.0.0.0)")
     print(f" * Running on http://127.0.0.1:{PORT}")
-    print(f" * Running on http://{local_ip}:{PORT}")
+    print(f" * Running on http://{socket.gethostname()}:{PORT}")
     print("Press CTRL+C to quit")
 
     app.run(host="0.0.0.0", port=PORT, threaded=True, debug=False)
\ No newline at end of file
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""Simulerade HomeWizard P1-mätare och elpris-API för last- och uthållighetstester utan nätverk.
+
+    python p1-sim.py --meters 20 --port 9001 --price-port 9100 --write-meters meters.json
+    python p1-sim.py --meters 1 --profile solar --speed 720 --latency-ms 80 --error-rate 0.01 --timeout-rate 0.001
+
+Varje mätare lyssnar på en egen port (--port, --port+1, ...) och svarar på /api/v1/data och
+/api/v1/telegram. Prisservern svarar som elprisetjustnu.se; peka servern dit med
+PRICE_API_URL = "http://127.0.0.1:9100/api/v1/prices/{year}/{month_day}_{area}.json".
+--speed låter simulatorns klocka (dygnsprofil och mätarställning) gå fortare än verkligheten,
+så att månader av förbrukning går igenom på några timmar. Servern stämplar fortfarande
+samplen med sin egen klocka; kombinera med ett kort POLL_INTERVAL för fler sampel.
+"""
+import argparse, json, math, random, re, threading, time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from zoneinfo import ZoneInfo
+
+TZ = ZoneInfo("Europe/Stockholm")
+
+stats = {"requests": 0, "errors": 0, "timeouts": 0, "prices": 0}
+_stats_lock = threading.Lock()
+
+def bump(key):
+    with _stats_lock: stats[key] += 1
+
+class Clock:
+    def __init__(self, speed):
+        self.speed, self.t0, self.start = speed, time.monotonic(), datetime.now(timezone.utc)
+    def now(self): return self.start + timedelta(seconds=(time.monotonic() - self.t0) * self.speed)
+
+# --- Lastprofiler ---
+# Effekt i W per fas (positiv = import, negativ = export) vid en lokal tidpunkt.
+def _house(dt, rnd):
+    h = dt.hour + dt.minute / 60
+    w = 250 + 900 * (17 < h < 22) + 400 * (6 < h < 8) + rnd.randint(0, 250)
+    if rnd.random() < 0.02: w += rnd.choice((1800, 2200, 3000))  # vattenkokare, ugn, tvätt
+    return [w * 0.3, w * 0.2, w * 0.5]
+
+def _ev(dt, rnd):
+    base = _house(dt, rnd)
+    return [p + 3680 for p in base] if dt.hour >= 22 or dt.hour < 2 else base  # 16 A trefas
+
+def _solar(dt, rnd):
+    h = dt.hour + dt.minute / 60
+    sun = max(0.0, math.sin((h - 6) / 14 * math.pi)) * 5000 * rnd.uniform(0.7, 1.0) if 6 < h < 20 else 0.0
+    return [p - sun / 3 for p in _house(dt, rnd)]
+
+def _flat(dt, rnd): return [330.0, 330.0, 340.0]
+
+PROFILES = {"house": _house, "ev": _ev, "solar": _solar, "flat": _flat}
+
+class Meter:
+    def __init__(self, idx, profile, clock, seed):
+        self.idx, self.profile, self.clock = idx, profile, clock
+        self.rnd = random.Random(seed + idx)
+        self.imp, self.exp = 10000.0 + idx * 123.4, 0.0
+        self.last, self.phases = clock.now(), [0.0, 0.0, 0.0]
+        self.lock = threading.Lock()
+
+    def sample(self):
+        with self.lock:
+            now = self.clock.now()
+            dt_h = (now - self.last).total_seconds() / 3600
+            net = sum(self.phases)
+            if net > 0: self.imp += net * dt_h / 1000
+            else: self.exp -= net * dt_h / 1000
+            self.last, self.phases = now, PROFILES[self.profile](now.astimezone(TZ), self.rnd)
+            volts = [round(self.rnd.gauss(230, 1.5), 1) for _ in range(3)]
+            return now, self.phases, volts, round(self.imp, 3), round(self.exp, 3)
+
+    def data(self):
+        now, ph, v, imp, exp = self.sample()
+        return {"wifi_ssid": "sim", "wifi_strength": 100, "smr_version": 50, "meter_model": "p1-sim", "unique_id": f"sim{self.idx:06d}",
+                "active_tariff": tariff(now), "total_power_import_kwh": imp, "total_power_export_kwh": exp,
+                "active_power_w": round(sum(ph)), "active_power_l1_w": round(ph[0]), "active_power_l2_w": round(ph[1]), "active_power_l3_w": round(ph[2]),
+                "active_voltage_l1_v": v[0], "active_voltage_l2_v": v[1], "active_voltage_l3_v": v[2],
+                "active_current_l1_a": round(abs(ph[0]) / v[0], 3), "active_current_l2_a": round(abs(ph[1]) / v[1], 3), "active_current_l3_a": round(abs(ph[2]) / v[2], 3)}
+
+    def telegram(self):
+        now, ph, v, imp, exp = self.sample()
+        local = now.astimezone(TZ)
+        kw = lambda w: f"{max(w, 0) / 1000:08.3f}"
+        lines = [f"/SIM5 p1-sim-{self.idx}", "", f"0-0:1.0.0({local:%y%m%d%H%M%S}{'S' if local.dst() else 'W'})", f"0-0:96.14.0({tariff(now):04d})",
+                 f"1-0:1.8.0({imp:012.3f}*kWh)", f"1-0:2.8.0({exp:012.3f}*kWh)",
+                 f"1-0:1.7.0({kw(sum(ph))}*kW)", f"1-0:2.7.0({kw(-sum(ph))}*kW)"]
+        for i, (p_in, p_out) in enumerate(((21, 22), (41, 42), (61, 62))):
+            lines += [f"1-0:{p_in}.7.0({kw(ph[i])}*kW)", f"1-0:{p_out}.7.0({kw(-ph[i])}*kW)"]
+        lines += [f"1-0:{c}.7.0({v[i]:05.1f}*V)" for i, c in enumerate((32, 52, 72))]
+        lines += [f"1-0:{c}.7.0({abs(ph[i]) / v[i]:05.1f}*A)" for i, c in enumerate((31, 51, 71))]
+        body = ("\r\n".join(lines) + "\r\n!").encode()
+        return body + f"{crc16(body):04X}\r\n".encode()
+
+def tariff(now): return 1 if 6 <= now.astimezone(TZ).hour < 22 else 2
+
+def crc16(data):
+    crc = 0
+    for b in data:
+        crc ^= b
+        for _ in range(8): crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+# --- HTTP ---
+class Faults:
+    def __init__(self, args): self.latency, self.jitter, self.error, self.timeout, self.timeout_s = args.latency_ms / 1000, args.jitter_ms / 1000, args.error_rate, args.timeout_rate, args.timeout_s
+
+    def apply(self, handler, rnd):
+        """True om anropet redan besvarats med ett fel."""
+        if self.latency or self.jitter: time.sleep(max(0.0, rnd.gauss(self.latency, self.jitter)))
+        if self.timeout and rnd.random() < self.timeout:
+            bump("timeouts"); time.sleep(self.timeout_s)
+        if self.error and rnd.random() < self.error:
+            bump("errors"); handler.reply(503, b'{"error": "simulerat fel"}', "application/json")
+            return True
+        return False
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, som servern använder via requests.Session
+    def log_message(self, *a): pass
+    def handle(self):
+        try: super().handle()
+        except (BrokenPipeError, ConnectionResetError): pass  # klienten gav upp, t.ex. efter en simulerad timeout
+    def reply(self, code, body, ctype):
+        self.send_response(code); self.send_header("Content-Type", ctype); self.send_header("Content-Length", str(len(body))); self.end_headers(); self.wfile.write(body)
+
+class MeterHandler(Handler):
+    def do_GET(self):
+        bump("requests")
+        m = self.server.meter
+        if self.server.faults.apply(self, m.rnd): return
+        if self.path == "/api/v1/data": self.reply(200, json.dumps(m.data()).encode(), "application/json")
+        elif self.path == "/api/v1/telegram": self.reply(200, m.telegram(), "text/plain")
+        elif self.path == "/api": self.reply(200, b'{"product_type": "HWE-P1", "product_name": "P1 meter (sim)", "api_version": "v1"}', "application/json")
+        else: self.reply(404, b"", "text/plain")
+
+_PRICE_PATH = re.compile(r"/api/v1/prices/(\d{4})/(\d{2})-(\d{2})_(SE[1-4])\.json$")
+
+def price_day(day, area, resolution):
+    """Som elprisetjustnu.se: 24 timpriser före 2025-10-01, därefter 96 kvartspriser (resolution=auto)."""
+    rnd = random.Random(f"{day}{area}")
+    step = 60 if resolution == 24 or (resolution == "auto" and day < datetime(2025, 10, 1).date()) else 15
+    base, out = rnd.uniform(0.1, 1.5) * (1 + 0.3 * int(area[2]) / 4), []
+    t = datetime(day.year, day.month, day.day, tzinfo=TZ).astimezone(timezone.utc)
+    end = datetime(*(day + timedelta(days=1)).timetuple()[:3], tzinfo=TZ).astimezone(timezone.utc)
+    while t < end:  # i UTC, så att dygn med sommartidsomställning får 23 eller 25 timmar
+        local, nxt = t.astimezone(TZ), t + timedelta(minutes=step)
+        peak = 1.6 if local.hour in (7, 8, 17, 18, 19) else 0.6 if local.hour < 6 else 1.0
+        sek = round(base * peak + rnd.uniform(-0.05, 0.05), 5)
+        out.append({"SEK_per_kWh": sek, "EUR_per_kWh": round(sek / 11.2, 5), "EXR": 11.2, "time_start": local.isoformat(), "time_end": nxt.astimezone(TZ).isoformat()})
+        t = nxt
+    return out
+
+class PriceHandler(Handler):
+    def do_GET(self):
+        bump("prices")
+        m = _PRICE_PATH.search(self.path)
+        if self.server.faults.apply(self, self.server.rnd): return
+        if not m: return self.reply(404, b"[]", "application/json")
+        day = datetime(int(m[1]), int(m[2]), int(m[3])).date()
+        self.reply(200, json.dumps(price_day(day, m[4], self.server.resolution)).encode(), "application/json")
+
+def serve(port, handler, **attrs):
+    srv = ThreadingHTTPServer((args.host, port), handler)
+    srv.daemon_threads = True
+    for k, v in attrs.items(): setattr(srv, k, v)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Simulerade P1-mätare och elpris-API")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--meters", type=int, default=1)
+    ap.add_argument("--port", type=int, default=9001, help="första mätarens port; övriga får följande portar")
+    ap.add_argument("--profile", default="house", help="house, ev, solar, flat eller en kommalista som fördelas över mätarna")
+    ap.add_argument("--speed", type=float, default=1.0, help="hur mycket fortare simulatorns klocka går")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="andel anrop som får 503")
+    ap.add_argument("--timeout-rate", type=float, default=0.0, help="andel anrop som dröjer --timeout-s")
+    ap.add_argument("--timeout-s", type=float, default=6.0, help="servern ger upp efter 5 s")
+    ap.add_argument("--price-port", type=int, default=9100, help="0 stänger av prisservern")
+    ap.add_argument("--price-resolution", default="auto", help="24, 96 eller auto (som det riktiga API:et)")
+    ap.add_argument("--price-error-rate", type=float, default=0.0)
+    ap.add_argument("--elomrade", default="SE3")
+    ap.add_argument("--write-meters", help="skriv en meters.json för servern")
+    ap.add_argument("--report", type=float, default=10.0, help="sekunder mellan statusrader")
+    args = ap.parse_args()
+
+    clock, faults = Clock(args.speed), Faults(args)
+    profiles = args.profile.split(",")
+    if any(p not in PROFILES for p in profiles): ap.error(f"okänd profil, välj bland {', '.join(PROFILES)}")
+    for i in range(args.meters):
+        serve(args.port + i, MeterHandler, meter=Meter(i, profiles[i % len(profiles)], clock, args.seed), faults=faults)
+    if args.price_port:
+        res = args.price_resolution if args.price_resolution == "auto" else int(args.price_resolution)
+        pf = Faults(argparse.Namespace(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.price_error_rate, timeout_rate=0, timeout_s=0))
+        serve(args.price_port, PriceHandler, faults=pf, resolution=res, rnd=random.Random(args.seed))
+    if args.write_meters:
+        with open(args.write_meters, "w", encoding="utf-8") as f:
+            json.dump([{"id": f"sim{i}", "ip": f"{args.host}:{args.port + i}", "elomrade": args.elomrade} for i in range(args.meters)], f, indent=1)
+    print(f" * {args.meters} mätare på {args.host}:{args.port}-{args.port + args.meters - 1} ({args.profile}, {args.speed:g}x)")
+    if args.price_port: print(f' * Priser: PRICE_API_URL = "http://{args.host}:{args.price_port}/api/v1/prices/{{year}}/{{month_day}}_{{area}}.json"')
+    try:
+        while True:
+            time.sleep(args.report)
+            print(f"{clock.now().astimezone(TZ):%Y-%m-%d %H:%M}  " + "  ".join(f"{k} {v}" for k, v in stats.items()), flush=True)
+    except KeyboardInterrupt: pass
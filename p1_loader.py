@@ -0,0 +1,23 @@
+"""Laddar p1-server.py som modul åt verktygsskripten (filnamnet har bindestreck och kan inte importeras).
+
+    from p1_loader import load_server
+    srv = load_server()
+
+Modulen laddas en gång per process och läggs i sys.modules som p1_server. Den läser meters.json
+och övrig konfiguration relativt arbetskatalogen, precis som servern.
+"""
+import importlib.util, os, sys
+
+SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "p1-server.py")
+
+def load_server():
+    mod = sys.modules.get("p1_server")
+    if mod is None:
+        spec = importlib.util.spec_from_file_location("p1_server", SERVER_PATH)
+        mod = importlib.util.module_from_spec(spec)
+        sys.modules["p1_server"] = mod
+        try: spec.loader.exec_module(mod)
+        except BaseException:
+            del sys.modules["p1_server"]
+            raise
+    return mod
@@ -0,0 +1,237 @@
+const timeFmt = new Intl.DateTimeFormat('sv-SE', { hour: '2-digit', minute: '2-digit', hour12: false });
+const fullTimeFmt = new Intl.DateTimeFormat('sv-SE', { hour: '2-digit', minute: '2-digit', second: '2-digit', hour12: false });
+let currentRangeHours = 1;
+const METER = new URLSearchParams(location.search).get('meter') || '';
+const mq = METER ? '&meter=' + encodeURIComponent(METER) : '';
+
+function parseToSve(s) {
+    if(!s) return null;
+    let d = new Date(s.endsWith('Z') ? s : s + 'Z');
+    return isNaN(d.getTime()) ? null : d;
+}
+
+let chart, pie, hChart, pChart;
+let lastHistoryData = null;
+let visibleSeries = {};
+
+function toggleTheme() {
+  const isDark = document.body.classList.toggle('dark');
+  localStorage.setItem('theme', isDark ? 'dark' : 'light');
+}
+
+function applySavedTheme() {
+  if (localStorage.getItem('theme') === 'dark') document.body.classList.add('dark');
+}
+
+function savePNG(id) {
+  const canvas = document.getElementById(id);
+  const l = document.createElement('a');
+  l.download = id+'_'+new Date().toISOString().slice(0,19)+'.png';
+  l.href = canvas.toDataURL('image/png');
+  l.click();
+}
+
+function exportHistoryWattCSV() { exportDay('measured_at,active_power_w'); }
+function exportCSV() { exportDay(''); }
+function exportDay(cols) {
+  const d = document.getElementById('hDate').value;
+  location.href = '/api/export.csv?from=' + d + '&to=' + d + '&sep=%3B&decimal=comma&tz=stockholm&timefmt=sv&bom=1' + (cols ? '&cols=' + cols : '') + mq;
+}
+
+// Punkter som redan hämtats ligger kvar i IndexedDB; nästa gång hämtas bara det som
+// tillkommit efter cursor (since=).
+let dbReady = Promise.resolve(null);
+function init_db() {
+  dbReady = new Promise(res => {
+    try {
+      const req = indexedDB.open('p1-monitor', 1);
+      req.onupgradeneeded = () => req.result.createObjectStore('points');
+      req.onsuccess = () => res(req.result);
+      req.onerror = () => res(null);
+    } catch(e) { res(null); }
+  });
+}
+async function cacheGet(key) {
+  const db = await dbReady;
+  if (!db) return null;
+  return new Promise(res => {
+    const r = db.transaction('points').objectStore('points').get(key);
+    r.onsuccess = () => res(r.result || null); r.onerror = () => res(null);
+  });
+}
+async function cachePut(key, val) {
+  const db = await dbReady;
+  try { if (db) db.transaction('points', 'readwrite').objectStore('points').put(val, key); } catch(e) {}
+}
+async function fetchDelta(url, key, from) {
+  const c = await cacheGet(key);
+  const ok = c && c.cursor && c.from <= from;
+  const data = await (await fetch(url + (ok ? '&since=' + encodeURIComponent(c.cursor) : ''))).json();
+  if (ok) data.points = c.points.filter(p => p.measured_at >= from).concat(data.points);
+  cachePut(key, { from, cursor: data.cursor, points: data.points });
+  return data;
+}
+
+async function initChart(hours=1) {
+  currentRangeHours = hours;
+  try {
+    const data = await fetchDelta('/api/series?hours=' + hours + mq, 'series|' + METER, new Date(Date.now() - hours * 3600000).toISOString());
+    if(chart) {
+        chart.data.datasets.forEach((ds, i) => visibleSeries[ds.label] = chart.isDatasetVisible(i));
+        chart.destroy();
+    }
+
+    const chartData = data.points.map(p => ({ x: parseToSve(p.measured_at), p }));
+
+    chart = new Chart(document.getElementById('chart'), {
+        type: 'line',
+        data: { datasets: [
+            { label: 'Watt', data: chartData.map(d=>({x:d.x, y:d.p.active_power_w})), borderColor: '#2563eb', yAxisID: 'yW', pointRadius: 0, fill: true, backgroundColor: 'rgba(37,99,235,0.1)' },
+            { label: 'L1 (A)', data: chartData.map(d=>({x:d.x, y:d.p.active_current_l1_a})), borderColor: '#dc2626', yAxisID: 'yA', pointRadius: 0 },
+            { label: 'L2 (A)', data: chartData.map(d=>({x:d.x, y:d.p.active_current_l2_a})), borderColor: '#16a34a', yAxisID: 'yA', pointRadius: 0 },
+            { label: 'L3 (A)', data: chartData.map(d=>({x:d.x, y:d.p.active_current_l3_a})), borderColor: '#9333ea', yAxisID: 'yA', pointRadius: 0 },
+            { label: 'L1 (V)', data: chartData.map(d=>({x:d.x, y:d.p.voltage_l1_v})), borderColor: '#f87171', yAxisID: 'yV', pointRadius: 0, hidden: true },
+            { label: 'L2 (V)', data: chartData.map(d=>({x:d.x, y:d.p.voltage_l2_v})), borderColor: '#4ade80', yAxisID: 'yV', pointRadius: 0, hidden: true },
+            { label: 'L3 (V)', data: chartData.map(d=>({x:d.x, y:d.p.voltage_l3_v})), borderColor: '#c084fc', yAxisID: 'yV', pointRadius: 0, hidden: true }
+        ]},
+        options: { 
+            responsive: true, maintainAspectRatio: false, 
+            animation: false,
+            scales: { 
+                x: { 
+                    type: 'time', 
+                    ticks: { callback: (val) => timeFmt.format(new Date(val)), autoSkip: true, maxTicksLimit: 12 } 
+                }, 
+                yW: { position: 'left', title: {display:true, text:'Watt'} }, 
+                yA: { position: 'right', min: 0, title: {display:true, text:'Ampere'} },
+                yV: { position: 'left', min: 200, max: 260, display: false }
+            },
+            plugins: { 
+                zoom: { pan: { enabled: true }, zoom: { wheel: { enabled: true }, mode: 'x' } },
+                tooltip: { callbacks: { title: (items) => fullTimeFmt.format(new Date(items[0].parsed.x)) } }
+            }
+        }
+    });
+    chart.data.datasets.forEach((ds, i) => { if(visibleSeries[ds.label] !== undefined) chart.setDatasetVisibility(i, visibleSeries[ds.label]); });
+    chart.update();
+  } catch(e) { console.error("Fel i initChart:", e); }
+}
+
+function updateChartsLive(m) {
+    const timestamp = parseToSve(m.measured_at);
+    if (!timestamp || !chart) return;
+
+    // Pusha nya data
+    chart.data.datasets[0].data.push({x: timestamp, y: m.active_power_w});
+    chart.data.datasets[1].data.push({x: timestamp, y: m.active_current_l1_a});
+    chart.data.datasets[2].data.push({x: timestamp, y: m.active_current_l2_a});
+    chart.data.datasets[3].data.push({x: timestamp, y: m.active_current_l3_a});
+    chart.data.datasets[4].data.push({x: timestamp, y: m.voltage_l1_v});
+    chart.data.datasets[5].data.push({x: timestamp, y: m.voltage_l2_v});
+    chart.data.datasets[6].data.push({x: timestamp, y: m.voltage_l3_v});
+
+    // Rensa gamla punkter utanför vyn (för prestanda)
+    const cutoff = new Date(timestamp.getTime() - (currentRangeHours * 3600000));
+    chart.data.datasets.forEach(ds => {
+        while (ds.data.length > 0 && ds.data[0].x < cutoff) ds.data.shift();
+    });
+    chart.update('none');
+
+    // Uppdatera historik-watt om vi tittar på idag
+    const todayStr = new Date().toISOString().split('T')[0];
+    if (document.getElementById('hDate').value === todayStr && hChart) {
+        hChart.data.datasets[0].data.push({x: timestamp, y: m.active_power_w});
+        hChart.update('none');
+    }
+}
+
+async function loadHistory() {
+  try {
+    const d = document.getElementById('hDate').value;
+    const url = '/api/history?date=' + d + mq;
+    // avslutade dagar cachas av webbläsaren (immutable), dagens hålls i IndexedDB
+    const data = d === new Date().toISOString().split('T')[0] ? await fetchDelta(url, 'today|' + METER, d + 'T00:00:00') : await (await fetch(url)).json();
+    lastHistoryData = data;
+    document.getElementById('hCost').innerText = data.total_cost.toFixed(2) + ' kr';
+    document.getElementById('hKwh').innerText = data.total_kwh.toFixed(2) + ' kWh';
+    document.getElementById('monKwh').innerText = data.monthly_kwh.toFixed(1) + ' kWh';
+    document.getElementById('monCost').innerText = data.monthly_cost.toFixed(2) + ' kr';
+
+    if(hChart) hChart.destroy();
+    hChart = new Chart(document.getElementById('hChart'), {
+        type: 'line',
+        data: { datasets: [{ label: 'Effekt (Watt)', data: data.points.map(p=>({x:parseToSve(p.measured_at), y:p.active_power_w})), borderColor: '#2563eb', pointRadius: 0, fill: true, backgroundColor: 'rgba(37,99,235,0.05)' }]},
+        options: { 
+            responsive: true, maintainAspectRatio: false, 
+            scales: { x: { type: 'time', ticks: { callback: (v) => timeFmt.format(new Date(v)) } } },
+            plugins: { tooltip: { callbacks: { title: (it) => fullTimeFmt.format(new Date(it[0].parsed.x)) } } }
+        }
+    });
+
+    if(pChart) pChart.destroy();
+    const keys = Object.keys(data.prices).sort();
+    let roll = 0;
+    const rollData = keys.map(k => { roll += (data.quarterly_kwh[k] || 0) * data.prices[k]; return roll; });
+    pChart = new Chart(document.getElementById('pChart'), {
+        data: {
+            labels: keys,
+            datasets: [
+                { type: 'bar', label: 'Spotpris', data: keys.map(k => data.prices[k]), backgroundColor: 'rgba(245, 158, 11, 0.4)', yAxisID: 'yP' },
+                { type: 'line', label: 'Ack. Kostnad', data: rollData, borderColor: '#10b981', yAxisID: 'yC', pointRadius: 1 }
+            ]
+        },
+        options: { responsive: true, maintainAspectRatio: false, scales: { yP: { position: 'left' }, yC: { position: 'right' } } }
+    });
+  } catch(e) { console.error("Fel i loadHistory:", e); }
+}
+
+// Vid återanslutning skickas senast sedda tidsstämpel; servern spelar upp det som missats
+// ur minnet och säger till om luckan är större än vad den sparat.
+let lastSeen = null, wsRetry = 1000;
+function connectWS() {
+  const q = [METER ? 'meter=' + encodeURIComponent(METER) : '', lastSeen ? 'since=' + encodeURIComponent(lastSeen) : ''].filter(Boolean).join('&');
+  const ws = new WebSocket((location.protocol==='https:'?'wss':'ws')+'://'+location.host+'/ws'+(q ? '?' + q : ''));
+  ws.onopen = () => { wsRetry = 1000; };
+  ws.onclose = () => { setTimeout(connectWS, wsRetry); wsRetry = Math.min(wsRetry * 2, 30000); };
+  ws.onmessage = onLiveMessage;
+}
+function onLiveMessage(e) {
+  try {
+      const m = JSON.parse(e.data);
+      if (m.type === 'resume') { if (m.gap) initChart(currentRangeHours); return; }
+      lastSeen = m.measured_at;
+      document.getElementById('val-w').innerText = Math.round(m.active_power_w) + ' W';
+      document.getElementById('val-a').innerText = m.active_current_l1_a.toFixed(1) + ' / ' + m.active_current_l2_a.toFixed(1) + ' / ' + m.active_current_l3_a.toFixed(1) + ' A';
+      document.getElementById('val-v-multi').innerText = Math.round(m.voltage_l1_v) + ' / ' + Math.round(m.voltage_l2_v) + ' / ' + Math.round(m.voltage_l3_v) + ' V';
+      document.getElementById('val-price').innerText = m.price_sek_kwh.toFixed(2) + ' kr';
+      const currents = [m.active_current_l1_a, m.active_current_l2_a, m.active_current_l3_a];
+      document.getElementById('phase-l1').innerText = m.active_current_l1_a.toFixed(1) + ' A';
+      document.getElementById('phase-l2').innerText = m.active_current_l2_a.toFixed(1) + ' A';
+      document.getElementById('phase-l3').innerText = m.active_current_l3_a.toFixed(1) + ' A';
+      document.getElementById('total-a').innerText = 'Totalt: ' + m.total_current_a.toFixed(1) + ' A';
+      const imb = (Math.max(...currents) - Math.min(...currents)).toFixed(1);
+      document.getElementById('phase-imbalance').innerText = imb + ' A';
+      if(pie) { pie.data.datasets[0].data = currents; pie.update('none'); }
+
+      updateChartsLive(m);
+  } catch(e) {}
+}
+
+window.onload = () => {
+  applySavedTheme();
+  init_db();
+  document.getElementById('hDate').value = new Date().toISOString().split('T')[0];
+  initChart(); loadHistory(); loadMeters(); connectWS();
+  pie = new Chart(document.getElementById('pie'), { type: 'doughnut', data: { labels: ['L1','L2','L3'], datasets: [{data:[0,0,0], backgroundColor:['#dc2626','#16a34a','#9333ea']}]}, options: {responsive:true, maintainAspectRatio:false}});
+};
+function changeRange(h, b) { document.querySelectorAll('.controls button').forEach(x=>x.classList.remove('active')); b.classList.add('active'); initChart(h); }
+async function loadMeters() {
+  try {
+    const data = await (await fetch('/api/meters')).json();
+    if (data.meters.length < 2) return;
+    const sel = document.getElementById('meterSel');
+    data.meters.forEach(m => sel.add(new Option(m.id + ' (' + m.elomrade + ')', m.id)));
+    sel.value = METER || data.default;
+    sel.style.display = '';
+  } catch(e) { console.error("Fel i loadMeters:", e); }
+}
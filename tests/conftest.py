@@ -0,0 +1,61 @@
+"""Gemensamma fixturer. Servern laddas en gång, via p1_loader som verktygsskripten, i en tom
+katalog så att meters.json och databaser i arbetskatalogen inte påverkar testerna."""
+import os, random, sys
+from datetime import timedelta
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from p1_loader import load_server
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("server"))
+    try: return load_server()
+    finally: os.chdir(cwd)
+
+@pytest.fixture
+def srv(server, monkeypatch):
+    """Servermodulen med nollställt tillstånd per mätare; konfiguration ändras med monkeypatch."""
+    monkeypatch.setattr(server, "_deadband", {})
+    monkeypatch.setattr(server, "_stores", {})
+    monkeypatch.setattr(server, "_ready_dbs", set())
+    return server
+
+@pytest.fixture
+def make_meter(srv, tmp_path):
+    def make(name):
+        meter = {"id": name, "ip": "-", "elomrade": srv.ELOMRADE, "db": str(tmp_path / f"{name}.db"), "mode": "json"}
+        srv.init_db(meter["db"])
+        return meter
+    return make
+
+@pytest.fixture(params=["zstd", "zlib"])
+def codec(request, srv):
+    """Varje komprimering som finns installerad (zstd kräver pip install zstandard)."""
+    if request.param not in srv._CODECS: pytest.skip(f"{request.param} saknas")
+    return request.param
+
+@pytest.fixture
+def stream(srv):
+    """(dt, tidsstämpel, rad) var interval:e sekund, som insamlingen ser dem: effekten ligger still
+    en stund och hoppar sedan, mätarställningen har tre decimaler som i en riktig mätare."""
+    def gen(start, seconds, interval=10, seed=1):
+        rnd = random.Random(seed)
+        kwh, power, hold = 12345.678, 800.0, 0
+        for i in range(0, seconds, interval):
+            if hold <= 0: power, hold = rnd.choice([150.0, 400.0, 1200.0, 2500.0, 7400.0]), rnd.randrange(30, 900)
+            hold -= interval
+            w = power + rnd.choice([0, 0, 0, 1, -1, 3, -3])  # brus under deadbandet
+            kwh += w * interval / 3_600_000
+            dt = start + timedelta(seconds=i)
+            phase = round(w / 3, 1)
+            row = {"active_power_w": w, "total_import_kwh": round(kwh, 3),
+                   "voltage_l1_v": 230.1, "voltage_l2_v": 229.8, "voltage_l3_v": 231.0,
+                   "active_current_l1_a": round(phase / 230, 2), "active_current_l2_a": round(phase / 230, 2), "active_current_l3_a": round(phase / 230, 2),
+                   "total_export_kwh": 0.0, "active_tariff": 2,
+                   "active_power_l1_w": phase, "active_power_l2_w": phase, "active_power_l3_w": phase}
+            yield dt, srv.to_utc_str(dt), row
+    return gen
@@ -0,0 +1,25 @@
+"""p1-bench.py ws: tidsstämpeln ska läsas ur ramar i alla format som /ws kan skicka."""
+import importlib.util, json, os
+
+import pytest
+
+@pytest.fixture(scope="module")
+def bench():
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "p1-bench.py")
+    spec = importlib.util.spec_from_file_location("p1_bench", path)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+SAMPLE = {"meter_id": "hem", "measured_at": "2026-03-10T14:00:10Z", "active_power_w": 512, "voltage_l1_v": 230.1, "voltage_l2_v": 229.8, "voltage_l3_v": 231.0,
+          "active_current_l1_a": 1.0, "active_current_l2_a": 0.5, "active_current_l3_a": 0.7, "total_current_a": 2.2, "price_sek_kwh": 1.25}
+
+@pytest.mark.parametrize("fmt,fields", [("json", None), ("json", "active_power_w"), ("array", None), ("array", "price_sek_kwh,active_power_w"), ("msgpack", "active_power_w")])
+def test_frame_time_all_formats(srv, bench, fmt, fields):
+    if fmt == "msgpack" and srv.msgpack is None: pytest.skip("msgpack saknas")
+    sub = srv.live_subscription({"format": fmt, "fields": fields})
+    frame = srv.live_frame(dict(SAMPLE, meter_id=f"bench-{fmt}-{fields}"), sub)
+    at = bench._frame_time(fmt)
+    assert at(2 if isinstance(frame, bytes) else 1, frame) == SAMPLE["measured_at"]
+    # Kontrollmeddelanden är JSON-objekt utan measured_at, i alla format
+    assert at(1, json.dumps({"type": "resume", "replayed": 0, "gap": False})) is None
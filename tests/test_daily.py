@@ -0,0 +1,50 @@
+"""Avslutade dygn med kompletta priser sparas i p1_daily första gången de räknas."""
+from datetime import date, datetime, timezone
+
+import pytest
+
+PRICES = {f"{h:02d}:{m:02d}": 1.0 + h / 10 for h in range(24) for m in (0, 15, 30, 45)}
+
+@pytest.fixture
+def meter(srv, monkeypatch, make_meter, stream):
+    monkeypatch.setattr(srv, "price_cache", {})
+    monkeypatch.setattr(srv, "PRICE_API_URL", "http://127.0.0.1:9/{year}/{month_day}_{area}.json")  # inga riktiga prisanrop
+    m = make_meter("daily")
+    st = srv.store(m)
+    st.insert([(ts, row) for _, ts, row in stream(datetime(2026, 8, 31, tzinfo=timezone.utc), 2 * 86400, interval=60)])
+    st.save_prices("2026-08-31", PRICES)  # 2026-09-01 saknar priser
+    return m
+
+def test_closed_day_is_saved_and_settled(srv, meter):
+    unsettled = set()
+    days = srv.daily_totals(meter, date(2026, 8, 31), date(2026, 9, 1), unsettled=unsettled)
+    assert unsettled == {"2026-09-01"}
+    saved = srv.store(meter).daily_rows(date(2026, 8, 1), date(2026, 9, 30))
+    assert list(saved) == ["2026-08-31"]
+    assert saved["2026-08-31"] == pytest.approx(days["2026-08-31"])
+    assert days["2026-08-31"][1] > days["2026-08-31"][0]  # kostnaden räknad med priserna
+
+    unsettled = set()
+    assert srv.daily_totals(meter, date(2026, 8, 31), date(2026, 9, 1), unsettled=unsettled) == pytest.approx(days)
+    assert unsettled == {"2026-09-01"}
+
+def test_period_stats_settle_closed_days(srv, meter):
+    # Månadssumman i historiken räknas utan effekt, men dygnen sparas ändå med medel- och maxeffekt
+    unsettled = set()
+    srv.calculate_period_stats(datetime(2026, 8, 1), datetime(2026, 8, 31), meter, unsettled)
+    assert not unsettled
+    assert srv.store(meter).daily_rows(date(2026, 8, 31), date(2026, 8, 31))["2026-08-31"][2] is not None
+
+def test_open_day_is_not_saved(srv, meter, monkeypatch):
+    monkeypatch.setattr(srv, "last_closed_day", lambda: date(2026, 8, 30))
+    unsettled = set()
+    srv.daily_totals(meter, date(2026, 8, 31), date(2026, 8, 31), unsettled=unsettled)
+    assert unsettled == {"2026-08-31"}
+    assert srv.store(meter).daily_rows(date(2026, 8, 31), date(2026, 8, 31)) == {}
+
+def test_warmup_on_first_of_month_saves_last_day(srv, meter, monkeypatch):
+    monkeypatch.setattr(srv, "warm_status", {})
+    monkeypatch.setattr(srv, "last_closed_day", lambda: date(2026, 8, 31))  # det är den 1 september
+    srv.warm_meter(meter)
+    assert srv.warm_status["daily"]["saved_days"] == 1
+    assert list(srv.store(meter).daily_rows(date(2026, 8, 1), date(2026, 9, 30))) == ["2026-08-31"]
@@ -0,0 +1,45 @@
+"""Deadband-lagring ska ge exakt samma kWh per priskvart och dygn som full lagring."""
+import os
+from datetime import date, datetime, timezone
+
+import pytest
+
+def stored_rows(srv, meter):
+    rows = []
+    for path in srv.storage_paths(meter):
+        with srv.db_connect(path) as conn: rows += [(path, ts) for (ts,) in conn.execute("SELECT measured_at FROM p1_measurements")]
+    return rows
+
+@pytest.mark.parametrize("partition", [False, True], ids=["enfil", "manadsfiler"])
+def test_deadband_slot_energy_matches_full(srv, monkeypatch, make_meter, stream, partition):
+    monkeypatch.setattr(srv, "STORAGE_MODE", "deadband")
+    monkeypatch.setattr(srv, "PARTITION_MONTHLY", partition)
+    full, db = make_meter("full"), make_meter("deadband")
+    # Tre timmar över två timskiften och månadsskiftet i UTC
+    for dt, ts, row in stream(datetime(2026, 1, 31, 22, 30, tzinfo=timezone.utc), 3 * 3600):
+        srv.store(full).insert([(ts, row)])
+        srv.ingest(db, dt, ts, row)
+    assert len(stored_rows(srv, db)) < len(stored_rows(srv, full)) / 3
+
+    first, last = date(2026, 1, 31), date(2026, 2, 1)
+    want, got = srv.store(full).day_energy(first, last), srv.store(db).day_energy(first, last)
+    assert set(got) == set(want)
+    for ds in want:
+        assert set(got[ds]) == set(want[ds])
+        for k in want[ds]: assert got[ds][k] == pytest.approx(want[ds][k], abs=1e-9), (ds, k)
+    # Varje priskvart har data, annars säger jämförelsen inget om kvartsgränserna
+    assert sum(len(v) for v in want.values()) == 3 * 4
+
+    if partition:  # ett sparat sampel från januari får inte hamna i februarifilen
+        for path, ts in stored_rows(srv, db):
+            if path != db["db"]: assert os.path.basename(path).split(".")[1] == ts[:7]
+
+def test_deadband_keeps_slot_edges(srv, monkeypatch, make_meter, stream):
+    monkeypatch.setattr(srv, "STORAGE_MODE", "deadband")
+    meter = make_meter("edges")
+    samples = list(stream(datetime(2026, 3, 10, 13, 50, tzinfo=timezone.utc), 1800))
+    for dt, ts, row in samples: srv.ingest(meter, dt, ts, row)
+    saved = {ts for _, ts in stored_rows(srv, meter)}
+    edges = [(a, b) for (da, a, _), (db, b, _) in zip(samples, samples[1:]) if srv.price_slot(da) != srv.price_slot(db)]
+    assert len(edges) == 2
+    for a, b in edges: assert a in saved and b in saved
@@ -0,0 +1,50 @@
+"""ETag/304, Cache-Control och since= genom Flask-testklienten."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+PRICES = {f"{h:02d}:{m:02d}": 1.0 for h in range(24) for m in (0, 15, 30, 45)}
+
+@pytest.fixture
+def client(srv, monkeypatch, make_meter, stream):
+    meter = make_meter("http")
+    monkeypatch.setattr(srv, "METERS", {"http": meter})
+    monkeypatch.setattr(srv, "DEFAULT_METER", "http")
+    monkeypatch.setattr(srv, "price_cache", {})
+    for name in ("_results", "_bodies", "_generation"): monkeypatch.setattr(srv, name, {})
+    st = srv.store(meter)
+    st.insert([(ts, row) for _, ts, row in stream(datetime(2026, 3, 10, tzinfo=timezone.utc), 86400, interval=60)])
+    st.save_prices("2026-03-10", PRICES)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    st.insert([(ts, row) for _, ts, row in stream(now - timedelta(minutes=30), 1800)])
+    return srv.app.test_client()
+
+def test_closed_day_304(client):
+    r = client.get("/api/history?date=2026-03-10")
+    assert r.status_code == 200 and r.json["final"]
+    assert r.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    etag = r.headers["ETag"]
+    for tag in (etag, "W/" + etag, f'"other", {etag}'):
+        hit = client.get("/api/history?date=2026-03-10", headers={"If-None-Match": tag})
+        assert hit.status_code == 304 and hit.data == b"", tag
+        assert "immutable" in hit.headers["Cache-Control"]
+    assert client.get("/api/history?date=2026-03-10", headers={"If-None-Match": '"other"'}).status_code == 200
+
+def test_compressed_etag_304(client):
+    r = client.get("/api/history?date=2026-03-10", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["Content-Encoding"] == "gzip" and r.headers["ETag"].endswith('-gzip"')
+    # En proxy som packar upp svaret skickar tillbaka samma validator, ofta som svag
+    assert client.get("/api/history?date=2026-03-10", headers={"If-None-Match": "W/" + r.headers["ETag"]}).status_code == 304
+
+@pytest.mark.parametrize("url", ["/api/history?date=2026-03-10", "/api/series?hours=1"])
+def test_since_returns_only_newer_points(client, url):
+    full = client.get(url).json
+    pts = full["points"]
+    assert len(pts) > 20 and full["cursor"] == pts[-1]["measured_at"]
+    since = pts[len(pts) // 2]["measured_at"]
+    part = client.get(url + "&since=" + since).json
+    assert part["points"] == pts[len(pts) // 2 + 1:]
+    assert part["cursor"] == full["cursor"]
+    empty = client.get(url + "&since=" + full["cursor"]).json
+    assert empty["points"] == [] and empty["cursor"] == full["cursor"]
+    assert client.get(url + "&since=igår").status_code == 400
@@ -0,0 +1,51 @@
+"""p1-import.py ska aldrig skriva en tidsstämpel två gånger: inte inom eller mellan källorna,
+inte vid en ny körning och inte för timmar som redan packats eller dygn som nedsamplats."""
+import csv, os, sqlite3, subprocess, sys
+from datetime import datetime, timezone
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "p1-import.py")
+
+def run_import(cwd, *args):
+    res = subprocess.run([sys.executable, SCRIPT, "--tz", "utc", *map(str, args)], cwd=cwd, capture_output=True, text=True, check=True)
+    return res.stdout
+
+def write_csv(path, samples):
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["timestamp", "import_t1_kwh", "import_t2_kwh", "active_power_w"])
+        for _, ts, row in samples: w.writerow([ts.replace("Z", "+00:00"), row["total_import_kwh"], 0, row["active_power_w"]])
+
+def stamps(db):
+    with sqlite3.connect(db) as conn: return [ts for (ts,) in conn.execute("SELECT measured_at FROM p1_measurements ORDER BY measured_at")]
+
+def test_import_dedup(srv, stream, tmp_path):
+    samples = list(stream(datetime(2026, 3, 10, 10, tzinfo=timezone.utc), 4 * 3600))
+    write_csv(tmp_path / "a.csv", samples[:1000])
+    write_csv(tmp_path / "b.csv", samples[600:])  # överlappar a.csv
+    db = tmp_path / "import.db"
+    out = run_import(tmp_path, "--db", db, "a.csv", "b.csv", "a.csv")
+    read = 1000 + len(samples) - 600 + 1000
+    assert f"{read} rader lästa, {read - len(samples)} dubbletter i källorna, 0 fanns redan, {len(samples)} nya" in out
+    assert stamps(db) == [ts for _, ts, _ in samples]
+
+    # Samma källor igen, plus databasen själv som källa: inget nytt
+    copy = tmp_path / "copy.db"
+    copy.write_bytes(db.read_bytes())
+    out = run_import(tmp_path, "--db", db, "a.csv", "b.csv", copy)
+    assert f"{len(samples)} fanns redan, 0 nya" in out
+    assert len(stamps(db)) == len(samples)
+
+def test_import_skips_packed_and_downsampled(srv, stream, tmp_path):
+    samples = list(stream(datetime(2026, 3, 10, 10, tzinfo=timezone.utc), 3 * 3600))
+    write_csv(tmp_path / "a.csv", samples)
+    db = tmp_path / "import.db"
+    run_import(tmp_path, "--db", db, "a.csv")
+    with srv.db_connect(str(db)) as conn:
+        srv.compact_hour(conn, "2026-03-10T11")
+    assert ", 0 nya" in run_import(tmp_path, "--db", db, "a.csv")
+    with srv.db_connect(str(db)) as conn:
+        got = [p["measured_at"] for p in srv.read_points(conn, None, "2026-03-10", "2026-03-10T23:60", ["measured_at"], steps=False)]
+        assert got == [ts for _, ts, _ in samples]
+        srv.downsample_day(conn, "2026-03-10", 60)
+    assert ", 0 nya" in run_import(tmp_path, "--db", db, "a.csv")
+    assert stamps(db) == []
@@ -0,0 +1,12 @@
+"""Rådataarkivet (ARCHIVE_RAW) ska ge tillbaka exakt de svar som sparades."""
+
+def test_raw_chunk_round_trip(srv, codec):
+    items = [
+        ("2026-03-10T14:00:00Z", {"active_power_w": 512, "total_power_import_kwh": 12345.678, "wifi_ssid": "hem", "unique_id": "5c2f"}),
+        ("2026-03-10T14:00:10Z", {"active_power_w": 498, "total_power_import_kwh": 12345.679, "wifi_ssid": "hem", "external": [{"type": "gas"}]}),
+        ("2026-03-10T14:00:20.500000Z", {"active_power_w": None, "wifi_ssid": "hem"}),
+        ("2026-03-10T14:00:30Z", {"telegram": "/ADN9 6534\r\n!ABCD\r\n"}),
+    ]
+    out = srv.decode_raw_chunk(*srv.encode_raw_hour(items, codec))
+    assert out == items
+    assert [type(p.get("active_power_w")) for _, p in out] == [type(p.get("active_power_w")) for _, p in items]
@@ -0,0 +1,26 @@
+"""Uppspelning av rådataarkivet till en egen mätare utanför METERS."""
+import time
+from datetime import datetime, timezone
+
+def test_replay_meter_stays_out_of_meters(srv, monkeypatch, make_meter, stream):
+    src = make_meter("src")
+    monkeypatch.setattr(srv, "METERS", {"src": src})
+    monkeypatch.setattr(srv, "DEFAULT_METER", "src")
+    monkeypatch.setattr(srv, "replays", {})
+    monkeypatch.setattr(srv, "replay_meters", {})
+    samples = list(stream(datetime(2026, 3, 10, 10, tzinfo=timezone.utc), 600))
+    for _, ts, row in samples: srv.archive_raw(src, ts, {"active_power_w": row["active_power_w"], "total_power_import_kwh": row["total_import_kwh"]})
+
+    c = srv.app.test_client()
+    r = c.post("/admin/replay?meter=src&from=2026-03-10&to=2026-03-10&speed=0")
+    assert r.status_code == 200 and r.json["total"] == len(samples)
+    deadline = time.monotonic() + 10
+    while srv.replays["src-replay"]["running"] and time.monotonic() < deadline: time.sleep(0.05)
+    assert srv.replays["src-replay"]["done"] == len(samples)
+
+    assert list(srv.METERS) == ["src"]
+    assert [m["id"] for m in c.get("/api/meters").json["meters"]] == ["src"]
+    target = srv.replay_meters["src-replay"]
+    assert srv.store(target).count("2026-03-10", "2026-03-10T23:60") == len(samples)
+    assert c.get("/api/export.csv?meter=src-replay&from=2026-03-10&to=2026-03-10").status_code == 200
+    assert c.get("/api/export.csv?meter=nope").status_code == 404
@@ -0,0 +1,66 @@
+"""Nedsampling (RETENTION_TIERS) ska bevara dygnens kWh, kostnad och medeleffekt."""
+from datetime import date, datetime, timezone
+
+import pytest
+
+DAY = date(2026, 3, 10)
+
+def prices(ds):
+    return {f"{h:02d}:{m:02d}": 0.5 + h / 10 + m / 100 for h in range(24) for m in (0, 15, 30, 45)}
+
+def totals(srv, st):
+    energy, power = st.day_energy(DAY, DAY)[DAY.isoformat()], st.day_power(DAY, DAY)[DAY.isoformat()]
+    kwh, cost, avg, _ = srv.summarize_days(st, DAY, DAY, prices)[DAY.isoformat()]
+    return energy, kwh, cost, avg
+
+def assert_same(got, want):
+    energy, kwh, cost, avg = want
+    assert set(got[0]) == set(energy)
+    for k in energy: assert got[0][k] == pytest.approx(energy[k], abs=1e-9), k
+    assert got[1:] == pytest.approx((kwh, cost, avg), rel=1e-12)
+
+@pytest.fixture
+def day_meter(srv, make_meter, stream):
+    meter = make_meter("retention")
+    start = datetime(2026, 3, 10, tzinfo=timezone.utc)
+    # Ett avbrott och glesa sampel under en timme, så att hinkarna ersätter olika många sampel
+    keep = lambda i, ts: not "2026-03-10T03:00" <= ts < "2026-03-10T03:07:30" and (ts[11:13] != "08" or i % 7)
+    srv.store(meter).insert([(ts, row) for i, (_, ts, row) in enumerate(stream(start, 86400)) if keep(i, ts)])
+    return meter
+
+def test_downsample_keeps_day_totals(srv, day_meter):
+    st = srv.store(day_meter)
+    want = totals(srv, st)
+    with srv.db_connect(day_meter["db"]) as conn:
+        srv.compact_hour(conn, "2026-03-10T05")  # en packad timme ska räknas som rådatan
+        for bucket_s in (60, 900):  # två nivåer: minutvärden slås sedan ihop till kvartar
+            srv.downsample_day(conn, DAY.isoformat(), bucket_s)
+            assert conn.execute("SELECT COUNT(*) FROM p1_measurements").fetchone()[0] == 0
+            assert_same(totals(srv, st), want)
+        assert conn.execute("SELECT COUNT(*) FROM p1_rollups").fetchone()[0] == 96
+
+def test_downsample_partial_day(srv, day_meter, stream):
+    # Rader som kommer in efter nedsamplingen (t.ex. en import) slås ihop med befintliga hinkar
+    st = srv.store(day_meter)
+    with srv.db_connect(day_meter["db"]) as conn:
+        conn.execute("DELETE FROM p1_measurements WHERE measured_at >= '2026-03-10T12'")
+        conn.commit()
+        srv.downsample_day(conn, DAY.isoformat(), 60)
+    start = datetime(2026, 3, 10, 12, tzinfo=timezone.utc)
+    st.insert([(ts, row) for _, ts, row in stream(start, 12 * 3600) if ts >= "2026-03-10T12"])
+    want = totals(srv, st)
+    with srv.db_connect(day_meter["db"]) as conn: srv.downsample_day(conn, DAY.isoformat(), 900)
+    assert_same(totals(srv, st), want)
+
+def test_duckdb_copy_matches_after_downsample(srv, day_meter, tmp_path):
+    pytest.importorskip("duckdb")
+    want = totals(srv, srv.store(day_meter))
+    with srv.db_connect(day_meter["db"]) as conn: srv.downsample_day(conn, DAY.isoformat(), 60)
+    duck = srv.DuckStore(day_meter, srv.store(day_meter))
+    duck.catch_up()
+    assert_same(totals(srv, duck), want)
+
+def test_invalid_tier_rejected_at_run_time(srv, monkeypatch, day_meter):
+    monkeypatch.setattr(srv, "RETENTION_TIERS", [(30, 60), (365, 700)])
+    with pytest.raises(ValueError, match="700"): srv.apply_retention(day_meter, pause=0)
+    with srv.db_connect(day_meter["db"]) as conn: assert conn.execute("SELECT COUNT(*) FROM p1_rollups").fetchone()[0] == 0
@@ -0,0 +1,40 @@
+"""Samtidiga likadana förfrågningar räknas en gång; ett nytt sampel gör resultatet inaktuellt."""
+import threading
+
+import pytest
+
+@pytest.fixture
+def flight(srv, monkeypatch):
+    for name in ("_results", "_inflight", "_generation"): monkeypatch.setattr(srv, name, {})
+    monkeypatch.setattr(srv, "cache_stats", {"hit": 0, "miss": 0, "shared": 0, "http_hit": 0})
+    return srv
+
+def test_concurrent_calls_share_one_result(flight):
+    gate, calls = threading.Event(), []
+    def fn():
+        calls.append(1)
+        gate.wait(5)
+        return {"n": len(calls)}
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(flight.single_flight("k", "m", fn))) for _ in range(8)]
+    for t in threads: t.start()
+    while flight.cache_stats["miss"] + flight.cache_stats["shared"] < 8: threading.Event().wait(0.01)
+    gate.set()
+    for t in threads: t.join()
+    assert len(calls) == 1 and out == [{"n": 1}] * 8
+    assert all(o is out[0] for o in out)
+    assert flight.single_flight("k", "m", fn) is out[0] and flight.cache_stats["hit"] == 1
+
+def test_invalidate_recomputes(flight):
+    n = iter(range(10))
+    assert flight.single_flight("k", "m", lambda: next(n)) == 0
+    assert flight.single_flight("k", "m", lambda: next(n)) == 0
+    flight.invalidate("other")
+    assert flight.single_flight("k", "m", lambda: next(n)) == 0
+    flight.invalidate("m")
+    assert flight.single_flight("k", "m", lambda: next(n)) == 1
+
+def test_error_is_not_cached(flight):
+    def boom(): raise RuntimeError("fel")
+    with pytest.raises(RuntimeError): flight.single_flight("k", "m", boom)
+    assert flight.single_flight("k", "m", lambda: "ok") == "ok"
@@ -0,0 +1,30 @@
+"""Lagerklassernas gemensamma metoder: dygnssammanfattningar och antal punkter."""
+from datetime import date, datetime, timezone
+
+import pytest
+
+def test_daily_rows_round_trip(srv, make_meter):
+    st = srv.store(make_meter("daily"))
+    st.save_daily([("2026-03-10", 12.5, 20.25, 520.0, 7400.0, "2026-03-11T00:05:00Z")])
+    st.save_daily([("2026-03-10", 99.0, 99.0, 99.0, 99.0, "2026-03-12T00:05:00Z"), ("2026-03-11", 0.5, 1.0, 20.0, 150.0, "2026-03-12T00:05:00Z")])
+    assert st.daily_rows(date(2026, 3, 1), date(2026, 3, 31)) == {"2026-03-10": (12.5, 20.25, 520.0, 7400.0), "2026-03-11": (0.5, 1.0, 20.0, 150.0)}
+    assert st.daily_rows(date(2026, 3, 11), date(2026, 3, 11)) == {"2026-03-11": (0.5, 1.0, 20.0, 150.0)}
+
+def test_count_matches_points(srv, make_meter, stream):
+    meter = make_meter("count")
+    st = srv.store(meter)
+    st.insert([(ts, row) for _, ts, row in stream(datetime(2026, 3, 10, 10, tzinfo=timezone.utc), 3 * 3600)])
+    with srv.db_connect(meter["db"]) as conn: srv.compact_hour(conn, "2026-03-10T11")
+    lo, hi = "2026-03-10T10:30:00Z", "2026-03-10T11:30:00Z"
+    assert st.count(lo, hi) == len(st.points(lo, hi, ["measured_at"], steps=False)) == 361
+
+def test_duckdb_count_and_daily(srv, make_meter, stream):
+    pytest.importorskip("duckdb")
+    meter = make_meter("duckcount")
+    st = srv.store(meter)
+    st.insert([(ts, row) for _, ts, row in stream(datetime(2026, 3, 10, 10, tzinfo=timezone.utc), 3600)])
+    st.save_daily([("2026-03-10", 1.0, 2.0, 3.0, 4.0, "2026-03-11T00:05:00Z")])
+    duck = srv.DuckStore(meter, st)
+    duck.catch_up()
+    assert duck.count("2026-03-10", "2026-03-10T23:60") == st.count("2026-03-10", "2026-03-10T23:60") == 360
+    assert duck.daily_rows(date(2026, 3, 10), date(2026, 3, 10)) == st.daily_rows(date(2026, 3, 10), date(2026, 3, 10))